@@ -0,0 +1,9 @@
+"""Benchmarks.
+
+modules
+-------
+boards
+harness
+render
+
+"""
@@ -0,0 +1,266 @@
+"""Time the operations of every board.
+
+Each board is set up in an opening, a middle game and an endgame position,
+made by playing seeded random moves, and `set_square`, `is_valid_square`,
+`check_win`, `to_emojis` and `generate_diagonals` are timed in each of them.
+On weiqi boards, the liberty check that runs after every move and the scoring
+at the end of a game are timed as well. The board is put back into its
+position after every run, since most of these change it.
+
+`SingleBattleshipBoardAdapter` is left out, it only forwards to two
+`BattleshipBoard`s.
+
+Results can be written as JSON with `--json`, and compared to the results of
+another commit with `--compare`.
+
+usage: python -m benchmarks.boards [--json path] [--compare path] [--budget seconds]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from copy import copy
+from random import Random
+from statistics import mean, median
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Optional
+
+from extensions.utils import justice
+from games import (
+    BaseBoard,
+    BattleshipBoard,
+    ConnectFourBoard,
+    GomokuBoard,
+    ReversiBoard,
+    Square,
+    TicTacToeBoard,
+    WeiqiBoard,
+)
+
+BOARDS: dict[type[BaseBoard], Callable[[], BaseBoard]] = {
+    TicTacToeBoard: TicTacToeBoard,
+    ConnectFourBoard: ConnectFourBoard,
+    ReversiBoard: ReversiBoard,
+    GomokuBoard: GomokuBoard,
+    WeiqiBoard: WeiqiBoard,
+    BattleshipBoard: lambda: BattleshipBoard(None),  # type: ignore
+}
+"""Boards to time, and how to make them."""
+
+DIAGONALS = {ConnectFourBoard: 4, ReversiBoard: 3, GomokuBoard: 5}
+"""`min_length` that boards with diagonals call `generate_diagonals` with."""
+
+POSITIONS = {'opening': 0.1, 'midgame': 0.4, 'endgame': 0.85}
+"""Part of the squares that are filled in each position."""
+
+
+def squares_of(board: BaseBoard) -> list[Square]:
+    if isinstance(board, WeiqiBoard):
+        return [square for row in board._rows for square in row]
+    return board._all_squares
+
+
+def spots_of(board: BaseBoard) -> list[tuple[int, int]]:
+    """Every spot a move can be played on."""
+    if isinstance(board, ConnectFourBoard):
+        return [(x, 0) for x in range(1, board.length + 1)]
+    return [
+        (x, y) for x in range(1, board.length + 1) for y in range(1, board.length + 1)
+    ]
+
+
+def checkpoint(board: BaseBoard) -> Callable[[], None]:
+    """Save the position of `board`, and return a function that restores it."""
+    squares = squares_of(board)
+    occupiers = [square.occupier for square in squares]
+    attributes = {
+        name: copy(value)
+        for name, value in vars(board).items()
+        if isinstance(value, (int, float, str, set, list))
+    }
+
+    def restore() -> None:
+        for square, occupier in zip(squares, occupiers):
+            square.occupier = occupier
+        for name, value in attributes.items():
+            setattr(board, name, copy(value))
+
+    return restore
+
+
+async def position(
+    board: BaseBoard, fill: float, random: Random
+) -> list[tuple[int, int, str]]:
+    """Play random valid moves on `board` until `fill` of its squares are taken.
+
+    Weiqi stones are mostly played next to stones of the same color, so that the
+    board has long groups and enclosed territory like a real game. Returns the
+    next valid move of each player.
+    """
+    spots = spots_of(board)
+    target = int(fill * len(squares_of(board)))
+    value = '1'
+    passes = 0
+    while sum(s.occupier != '0' for s in squares_of(board)) < target and passes < 2:
+        candidates = spots.copy()
+        random.shuffle(candidates)
+        if isinstance(board, WeiqiBoard) and random.random() < 0.75:
+            candidates.sort(key=lambda spot: not _touches(board, *spot, value))
+        for x, y in candidates:
+            if await board.is_valid_square(x, y, value):  # type: ignore
+                await board.set_square(x, y, value)  # type: ignore
+                passes = 0
+                break
+        else:
+            passes += 1
+        value = '2' if value == '1' else '1'
+
+    moves = []
+    for value in ('1', '2'):
+        restore = checkpoint(board)
+        for x, y in spots:
+            if await board.is_valid_square(x, y, value):  # type: ignore
+                moves.append((x, y, value))
+                break
+        restore()
+    return moves
+
+
+def _touches(board: WeiqiBoard, x: int, y: int, value: str) -> bool:
+    return any(sq.occupier == value for sq in board._columns[x - 1][y - 1].neighbors)
+
+
+async def measure(
+    board: BaseBoard, op: Callable[[BaseBoard], Awaitable[Any]], budget: float
+) -> list[float]:
+    """Run `op` until `budget` seconds have been spent, at least 5 times."""
+    restore = checkpoint(board)
+    times: list[float] = []
+    while len(times) < 5 or (sum(times) < budget and len(times) < 10_000):
+        start = perf_counter()
+        await op(board)
+        times.append(perf_counter() - start)
+        restore()
+    return times
+
+
+def operations(
+    board: BaseBoard, moves: list[tuple[int, int, str]]
+) -> dict[str, Callable[[BaseBoard], Awaitable[Any]]]:
+    """What to time on `board`, by name."""
+    ops: dict[str, Callable[[BaseBoard], Awaitable[Any]]] = {
+        'check_win': lambda b: b.check_win(),
+        'to_emojis': lambda b: b.to_emojis(),
+    }
+    if moves:
+        x, y, value = moves[0]
+        ops['set_square'] = lambda b: b.set_square(x, y, value)  # type: ignore
+        ops['is_valid_square'] = lambda b: b.is_valid_square(x, y, value)  # type: ignore
+    taken = next(
+        (
+            (x, y)
+            for x, y in spots_of(board)
+            if not isinstance(board, ConnectFourBoard)
+            and squares_of(board)[board.length * (y - 1) + x - 1].occupier != '0'
+        ),
+        None,
+    )
+    if taken is not None:
+        ops['is_valid_square_taken'] = lambda b: b.is_valid_square(*taken, '1')
+    if type(board) in DIAGONALS:
+        min_length = DIAGONALS[type(board)]
+
+        async def generate_diagonals(b: BaseBoard) -> None:
+            b.generate_diagonals(min_length)
+
+        ops['generate_diagonals'] = generate_diagonals
+    if isinstance(board, WeiqiBoard):
+        ops['liberties'] = lambda b: b._all_liberties()  # type: ignore
+        ops['scoring'] = ops.pop('check_win')
+    return ops
+
+
+async def bench(budget: float) -> dict[str, dict[str, float]]:
+    """Time every operation of every board in every position."""
+    results: dict[str, dict[str, float]] = {}
+    for board_type, make in BOARDS.items():
+        for name, fill in POSITIONS.items():
+            board = make()
+            moves = await position(board, fill, Random(f'{board_type.__name__}{name}'))
+            for op_name, op in operations(board, moves).items():
+                times = await measure(board, op, budget)
+                results[f'{board_type.__name__}.{op_name}[{name}]'] = {
+                    'runs': len(times),
+                    'median_us': median(times) * 1e6,
+                    'mean_us': mean(times) * 1e6,
+                    'min_us': min(times) * 1e6,
+                }
+    return results
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', 'HEAD'), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(budget: float, json_path: Optional[str], compare: Optional[str]):
+    # boards print while they work
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = await bench(budget)
+
+    previous: dict[str, dict[str, float]] = {}
+    if compare is not None:
+        with open(compare) as f:
+            previous = json.load(f)['results']
+    rows = [('operation', 'runs', 'median us', 'min us', 'previous us', 'ratio')]
+    for name, result in results.items():
+        old = previous.get(name)
+        rows.append(
+            (
+                name,
+                str(result['runs']),
+                f'{result["median_us"]:.1f}',
+                f'{result["min_us"]:.1f}',
+                f'{old["median_us"]:.1f}' if old else '',
+                f'{result["median_us"] / old["median_us"]:.2f}' if old else '',
+            )
+        )
+    for row in justice(*rows):
+        print('  '.join(row))
+
+    if json_path is not None:
+        with open(json_path, 'w') as f:
+            json.dump(
+                {
+                    'commit': commit(),
+                    'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'budget': budget,
+                    'results': results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results of an earlier run to compare to')
+    parser.add_argument(
+        '--budget', type=float, default=0.2, help='seconds to spend on each operation'
+    )
+    args = parser.parse_args(sys.argv[1:])
+    asyncio.run(main(args.budget, args.json, args.compare))
@@ -0,0 +1,414 @@
+"""Play games without a discord connection.
+
+`Simulation` runs `BaseGame.start` against fake players, channels and messages.
+Every call that would go to the discord REST API is counted and takes
+`latency` seconds, and the players answer every prompt with moves from a
+strategy, either random valid moves or a script. Each game reports the moves
+per second, REST calls per move, and event loop time per move, which is the
+CPU time of the thread running the event loop. Neither includes the time the
+players took to pick their moves.
+
+Battleship is not simulated, its ships are placed through ephemeral button
+interactions.
+
+usage: python -m benchmarks.harness [--latency ms] [--moves n] [--games n] [--image]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import os
+import sys
+from collections import Counter
+from copy import deepcopy
+from random import Random
+from statistics import mean
+from time import perf_counter, thread_time
+from typing import Any, AsyncIterator, Callable, Optional
+
+import discord
+
+from extensions.clocks import TimerScheduler
+from extensions.janitor import MessageJanitor
+from extensions.router import InputRouter
+from extensions.utils import NUM_EMOTES, justice
+from games import (
+    BaseBoard,
+    BaseGame,
+    ConnectFourBoard,
+    ConnectFourGame,
+    GomukuGame,
+    InteractionContextAdapter,
+    ReversiBoard,
+    ReversiGame,
+    TicTacToeGame,
+    WeiqiGame,
+    play_move,
+)
+
+GAMES: dict[str, Callable[..., BaseGame]] = {
+    'tictactoe': TicTacToeGame,
+    'connectfour': ConnectFourGame,
+    'reversi': ReversiGame,
+    'gomoku': GomukuGame,
+    'weiqi': WeiqiGame,
+}
+"""Games that can be simulated, by name."""
+
+_snowflakes = itertools.count(discord.utils.time_snowflake(discord.utils.utcnow()))
+
+
+class FakeMember:
+    def __init__(self, id: int, name: str) -> None:
+        self.id = id
+        self.name = self.display_name = name
+        self.mention = f'<@{id}>'
+
+    def __str__(self) -> str:
+        return self.display_name
+
+    def __eq__(self, other: object) -> bool:
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self) -> int:
+        return self.id
+
+
+class FakeMessage(discord.Message):
+    """A message that only keeps what games read from it."""
+
+    def __init__(
+        self, channel: FakeChannel, author: FakeMember, content: str = '', **fields
+    ) -> None:
+        self.id = next(_snowflakes)
+        self.channel = channel  # type: ignore
+        self.author = author  # type: ignore
+        self.content = content
+        self.fields = fields
+
+    async def edit(self, **fields: Any) -> FakeMessage:
+        await self.channel.rest('edit')  # type: ignore
+        self.content = fields.pop('content', self.content)
+        self.fields.update(fields)
+        return self
+
+    async def delete(self, **_) -> None:
+        await self.channel.rest('delete')  # type: ignore
+
+    async def add_reaction(self, emoji: Any) -> None:
+        await self.channel.rest('add_reaction')  # type: ignore
+
+
+class FakeReaction:
+    def __init__(self, message: FakeMessage, emoji: str) -> None:
+        self.message = message
+        self.emoji = emoji
+
+    async def remove(self, user: Any) -> None:
+        await self.message.channel.rest('remove_reaction')  # type: ignore
+
+
+class FakeChannel:
+    """A channel that counts REST calls, each of which takes `latency` seconds."""
+
+    def __init__(self, bot_user: FakeMember, latency: float = 0.0) -> None:
+        self.id = next(_snowflakes)
+        self.guild = None
+        self.bot_user = bot_user
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.messages: dict[int, FakeMessage] = {}
+
+    async def rest(self, route: str) -> None:
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+
+    async def send(self, content: Optional[str] = None, **fields: Any) -> FakeMessage:
+        await self.rest('send')
+        message = FakeMessage(self, self.bot_user, content or '', **fields)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, id: int) -> FakeMessage:
+        await self.rest('fetch_message')
+        return self.messages[id]
+
+    async def history(self, **_) -> AsyncIterator[FakeMessage]:
+        await self.rest('history')
+        for message in ():
+            yield message
+
+    async def delete_messages(self, messages: Any) -> None:
+        await self.rest('bulk_delete')
+
+    def get_partial_message(self, id: int) -> FakeMessage:
+        return self.messages.get(id) or FakeMessage(self, self.bot_user)
+
+
+class FakeInteraction:
+    """What `InteractionContextAdapter` reads from an interaction."""
+
+    def __init__(self, user: FakeMember, channel: FakeChannel) -> None:
+        self.user = user
+        self.channel = channel
+
+
+class RandomMoves:
+    """Pick random valid moves, checked on a copy of the board."""
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.random = Random(seed)
+        self._board: Optional[BaseBoard] = None
+        self._played = 0
+
+    async def __call__(self, game: BaseGame) -> Optional[tuple[int, int]]:
+        if self._board is None:
+            self._board = type(game._board)()  # type: ignore
+        for k, (x, y) in enumerate(game.moves[self._played :], self._played):
+            await play_move(self._board, x, y, '1' if k % 2 == 0 else '2')
+        self._played = len(game.moves)
+
+        value = '1' if self._played % 2 == 0 else '2'
+        spots = spots_of(self._board)
+        self.random.shuffle(spots)
+        for x, y in spots:
+            board = self._board
+            if isinstance(board, ReversiBoard):
+                # flips pieces in is_valid_square
+                board = deepcopy(board)
+            if await board.is_valid_square(x, y, value):  # type: ignore
+                return x, y
+        return None
+
+
+class ScriptedMoves:
+    """Play `moves` in order, and ask to end the game when there are none left."""
+
+    def __init__(self, moves: list[tuple[int, int]]) -> None:
+        self.moves = moves
+
+    async def __call__(self, game: BaseGame) -> Optional[tuple[int, int]]:
+        if len(game.moves) < len(self.moves):
+            return self.moves[len(game.moves)]
+        return None
+
+
+def spots_of(board: BaseBoard) -> list[tuple[int, int]]:
+    """Every spot that can be sent as a move on `board`."""
+    if isinstance(board, ConnectFourBoard):
+        return [(x, 0) for x in range(1, board.length + 1)]
+    return [
+        (x, y) for x in range(1, board.length + 1) for y in range(1, board.length + 1)
+    ]
+
+
+class Simulation:
+    """One game between two fake players.
+
+    Stands in for the bot, with a real `InputRouter`, `TimerScheduler` and
+    `MessageJanitor`. Whenever the game waits for input, the player whose turn it
+    is sends the move from `strategy`. When the strategy has no move, or after
+    `max_moves`, the player asks to end the game and the opponent agrees. Games
+    played with reactions can not be ended, and go on past `max_moves`.
+    """
+
+    def __init__(
+        self,
+        game: str,
+        strategy: Callable[[BaseGame], Any],
+        *,
+        latency: float = 0.0,
+        max_moves: Optional[int] = None,
+        seed: Optional[int] = None,
+        **options: Any,
+    ) -> None:
+        self.strategy = strategy
+        self.max_moves = max_moves
+        self.user = FakeMember(1, 'vesuvius')
+        self.players = FakeMember(2, 'alice'), FakeMember(3, 'bob')
+        self.channel = FakeChannel(self.user, latency)
+        self.timers = TimerScheduler()
+        self.router = _SimulationRouter(self)
+        self.janitor = MessageJanitor(delay=0.05)
+
+        self.inputs = 0
+        self.strategy_time = 0.0
+        self._end_requested = False
+        self._task: Optional[asyncio.Task[None]] = None
+        self._error: Optional[BaseException] = None
+        self._reactions: list[tuple[asyncio.Future[Any], Callable[..., bool]]] = []
+
+        ctx = InteractionContextAdapter(
+            FakeInteraction(self.players[0], self.channel)  # type: ignore
+        )
+        self.game = GAMES[game](ctx, self, self.players[1], **options)
+        if seed is not None:
+            Random(seed).shuffle(players := [self.game._player1, self.game._player2])
+            self.game._seat_players(*players)
+
+    async def run(self) -> dict[str, Any]:
+        """Play the game to the end and return its measurements."""
+        start, loop_start = perf_counter(), thread_time()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            self._task = asyncio.create_task(self.game.start())
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                if self._error is None:
+                    raise
+            await self.janitor.close()
+        if self._error is not None:
+            raise self._error
+        wall = perf_counter() - start - self.strategy_time
+        loop_time = thread_time() - loop_start - self.strategy_time
+        moves = max(len(self.game.moves), 1)
+        return {
+            'game': self.game.name,
+            'moves': len(self.game.moves),
+            'inputs': self.inputs,
+            'seconds': wall,
+            'moves_per_second': len(self.game.moves) / wall,
+            'rest_per_move': sum(self.channel.calls.values()) / moves,
+            'rest_calls': dict(self.channel.calls),
+            'loop_ms_per_move': loop_time * 1000 / moves,
+            'winner': self.game.winner and str(self.game.winner),
+            'tie': self.game.tie,
+        }
+
+    async def wait_for(
+        self,
+        event: str,
+        *,
+        check: Callable[..., bool],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Used by connect four, which takes moves as reactions."""
+        assert event == 'reaction_add'
+        future = asyncio.get_running_loop().create_future()
+        self._reactions.append((future, check))
+        self._input_later()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._reactions.remove((future, check))
+
+    def _input_later(self) -> None:
+        asyncio.create_task(self._send_input()).add_done_callback(self._input_sent)
+
+    def _input_sent(self, task: asyncio.Task[None]) -> None:
+        """Stop the game if a player failed, instead of waiting for its timeout."""
+        if not task.cancelled() and task.exception() is not None:
+            self._error = task.exception()
+            if self._task is not None:
+                self._task.cancel()
+
+    async def _send_input(self) -> None:
+        game = self.game
+        this_turn, next_turn = game._player1, game._player2
+        if len(game.moves) % 2:
+            this_turn, next_turn = next_turn, this_turn
+        self.inputs += 1
+
+        if self._end_requested:
+            self._end_requested = False
+            self._dispatch(next_turn.member, 'yes')
+            return
+        move = None
+        if (
+            self._reactions
+            or self.max_moves is None
+            or len(game.moves) < self.max_moves
+        ):
+            start = thread_time()
+            move = await self.strategy(game)
+            self.strategy_time += thread_time() - start
+        if move is None:
+            if not self._reactions:
+                self._end_requested = True
+                self._dispatch(this_turn.member, 'end')
+            return
+
+        x, y = move
+        if self._reactions:
+            board_message = game._board_msg.message[1]  # type: ignore
+            reaction = FakeReaction(board_message, NUM_EMOTES[x - 1])
+            for future, check in self._reactions:
+                if not future.done() and check(reaction, this_turn.member):
+                    future.set_result((reaction, this_turn.member))
+            return
+        self._dispatch(this_turn.member, f'{x} {y}')
+
+    def _dispatch(self, author: discord.Member, content: str) -> None:
+        self.router.dispatch(FakeMessage(self.channel, author, content))  # type: ignore
+
+
+class _SimulationRouter(InputRouter):
+    """Has the simulation send input every time a game waits for it."""
+
+    def __init__(self, simulation: Simulation) -> None:
+        super().__init__(simulation.timers)
+        self.simulation = simulation
+
+    async def wait(self, *args: Any, **kwargs: Any) -> discord.Message:
+        self.simulation._input_later()
+        return await super().wait(*args, **kwargs)
+
+
+async def simulate(
+    game: str,
+    strategy: Optional[Callable[[BaseGame], Any]] = None,
+    **options: Any,
+) -> dict[str, Any]:
+    """Play one game of `game` with random moves, or moves from `strategy`.
+
+    `options` are passed to `Simulation`, and from there to the game.
+    """
+    return await Simulation(
+        game, strategy or RandomMoves(options.get('seed')), **options
+    ).run()
+
+
+async def main(latency: float, moves: Optional[int], games: int, image: bool) -> None:
+    rows = [
+        (
+            'game',
+            'moves',
+            'inputs',
+            'moves/s',
+            'rest/move',
+            'loop ms/move',
+        )
+    ]
+    for name in GAMES:
+        options: dict[str, Any] = {'latency': latency, 'max_moves': moves}
+        if image and name not in ('tictactoe', 'connectfour'):
+            options['image'] = True
+        runs = [await simulate(name, seed=k, **options) for k in range(games)]
+        rows.append(
+            (
+                name,
+                f'{mean(r["moves"] for r in runs):.0f}',
+                f'{mean(r["inputs"] for r in runs):.0f}',
+                f'{mean(r["moves_per_second"] for r in runs):.1f}',
+                f'{mean(r["rest_per_move"] for r in runs):.2f}',
+                f'{mean(r["loop_ms_per_move"] for r in runs):.3f}',
+            )
+        )
+    for row in justice(*rows):
+        print('  '.join(row))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0, help='ms per REST call')
+    parser.add_argument('--moves', type=int, help='end games after this many moves')
+    parser.add_argument('--games', type=int, default=3, help='games of each type')
+    parser.add_argument('--image', action='store_true', help='render boards as images')
+    args = parser.parse_args(sys.argv[1:])
+    asyncio.run(main(args.latency / 1000, args.moves, args.games, args.image))
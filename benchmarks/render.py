@@ -0,0 +1,116 @@
+"""Compare rendering boards as emojis and as images.
+
+Plays random moves on each board and reports the time taken to render every
+move, and the size of what would be sent to discord.
+
+usage: python -m benchmarks.render [moves]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from random import seed, shuffle
+from statistics import mean
+from time import perf_counter
+
+import discord
+
+from extensions.utils import justice
+from games import BaseBoard, GomokuBoard, ReversiBoard, TicTacToeBoard, WeiqiBoard
+
+
+def payload_size(
+    rendered: str | tuple[str, ...] | discord.Embed | list[discord.Embed],
+) -> int:
+    """Size in bytes of the text that is sent for an emoji board."""
+    if isinstance(rendered, str):
+        return len(rendered.encode())
+    if isinstance(rendered, discord.Embed):
+        rendered = [rendered]
+    return sum(
+        len((part if isinstance(part, str) else part.description or '').encode())
+        for part in rendered
+    )
+
+
+async def play(board: BaseBoard, moves: int) -> list[tuple[int, int, str]]:
+    """Play up to `moves` random valid moves, returning them."""
+    spots = [
+        (x, y) for x in range(1, board.length + 1) for y in range(1, board.length + 1)
+    ]
+    shuffle(spots)
+    played: list[tuple[int, int, str]] = []
+    value = '1'
+    for x, y in spots:
+        if len(played) == moves:
+            break
+        if not await board.is_valid_square(x, y, value):  # type: ignore
+            continue
+        played.append((x, y, value))
+        value = '2' if value == '1' else '1'
+    return played
+
+
+async def bench(board_type: type[BaseBoard], moves: int) -> tuple[str, ...]:
+    """Render `board_type` after every move, both ways."""
+    played = await play(board_type(), moves)  # type: ignore
+
+    emoji_board: BaseBoard = board_type()  # type: ignore
+    image_board: BaseBoard = board_type()  # type: ignore
+    emoji_times: list[float] = []
+    image_times: list[float] = []
+    emoji_sizes: list[int] = []
+    image_sizes: list[int] = []
+    first_image = 0.0
+    for k, (x, y, value) in enumerate(played):
+        for board in (emoji_board, image_board):
+            if await board.is_valid_square(x, y, value):  # type: ignore
+                await board.set_square(x, y, value)  # type: ignore
+
+        start = perf_counter()
+        rendered = await emoji_board.to_emojis()
+        emoji_times.append(perf_counter() - start)
+        emoji_sizes.append(payload_size(rendered))
+
+        start = perf_counter()
+        file = await image_board.to_image()
+        elapsed = perf_counter() - start
+        if k == 0:
+            first_image = elapsed
+        else:
+            image_times.append(elapsed)
+        image_sizes.append(len(file.fp.read()))
+
+    return (
+        board_type.__name__,
+        str(len(played)),
+        f'{mean(emoji_times) * 1000:.3f}',
+        f'{mean(emoji_sizes):.0f}',
+        f'{first_image * 1000:.3f}',
+        f'{mean(image_times or [first_image]) * 1000:.3f}',
+        f'{mean(image_sizes):.0f}',
+    )
+
+
+async def main(moves: int) -> None:
+    seed(0)
+    rows = [
+        (
+            'board',
+            'moves',
+            'emoji ms',
+            'emoji bytes',
+            'first image ms',
+            'image ms',
+            'image bytes',
+        )
+    ]
+    for board_type in (TicTacToeBoard, ReversiBoard, GomokuBoard, WeiqiBoard):
+        rows.append(await bench(board_type, moves))
+    for row in justice(*rows):
+        print('  '.join(row))
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100))
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import asyncio
+import csv
+import sqlite3
 from datetime import datetime
-from io import BytesIO
+from io import BytesIO, StringIO
 from time import time
 from typing import TYPE_CHECKING, Literal, Optional, TypeGuard
 
+import config
 import discord
-from discord import app_commands
+from discord import app_commands, ui
 from discord.ext import commands
 from PIL import Image
 
@@ -18,6 +21,54 @@ if TYPE_CHECKING:
     from vesuvius import Vesuvius
 
 
+DBEXEC_CHUNK = 500
+"""Rows fetched at once by dbexec."""
+DBEXEC_MAX_ROWS = 100_000
+DBEXEC_PAGES = 10
+"""Pages of rows shown with buttons, more are sent as a csv file."""
+PAGE_LENGTH = 1900
+
+
+class PagesView(ui.View):
+    """buttons to turn the pages of a message, for the user that asked for it"""
+
+    def __init__(self, pages: list[str], user: int):
+        super().__init__(timeout=300)
+        self.pages = pages
+        self.user = user
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = self.page == 0  # type: ignore
+        self.next_page.disabled = self.page == len(self.pages) - 1  # type: ignore
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user:
+            await interaction.response.send_message(
+                f'{C.B}{C.RED}these are not your pages.{C.E}', ephemeral=True
+            )
+            return False
+        return True
+
+    async def turn(self, interaction: discord.Interaction, page: int) -> None:
+        self.page = page
+        self.update_buttons()
+        await interaction.response.edit_message(content=self.pages[page], view=self)
+
+    @ui.button(label='previous')
+    async def previous_page(
+        self, interaction: discord.Interaction, button: ui.Button[PagesView]
+    ):
+        await self.turn(interaction, self.page - 1)
+
+    @ui.button(label='next')
+    async def next_page(
+        self, interaction: discord.Interaction, button: ui.Button[PagesView]
+    ):
+        await self.turn(interaction, self.page + 1)
+
+
 class OwnerCommands(commands.Cog):
     """commands for owner to use"""
 
@@ -164,15 +215,196 @@ class OwnerCommands(commands.Cog):
 
     @commands.command(name='dbexec')
     @commands.is_owner()
-    async def dbexec(self, ctx: commands.Context[Vesuvius], *, query: str):
+    async def dbexec(
+        self,
+        ctx: commands.Context[Vesuvius],
+        write: Optional[Literal['write']] = None,
+        *,
+        query: str,
+    ):
+        """run a query that cannot change the database, unless it starts with
+        write. usage: `dbexec [write] query"""
         query = query.replace('`', '')
-        if await self.confirm(ctx, f'execute the query  "{query}" in the database'):
+        if write and await self.confirm(
+            ctx, f'execute the query  "{query}" in the database'
+        ):
             return
-        await self.bot.database.cursor.execute(query)
-        data = await self.bot.database.cursor.fetchall()
-        datastr = '\n'.join([str(d) for d in data])
-        await ctx.send(f'```py\n\u200b{datastr}```')
-        await self.bot.database.connection.commit()
+        database = self.bot.database
+        budget = getattr(config, 'dbexec_budget', 10.0)
+        pages: list[str] = []
+        page: list[str] = []
+        length = 0
+        table = StringIO()
+        writer = csv.writer(table)
+        numof_rows = 0
+        more = False
+        start = time()
+        try:
+            with database.query_stats.operation('dbexec'):
+                async with database.raw_query(
+                    query, write=bool(write), budget=budget
+                ) as cursor:
+                    writer.writerow(c[0] for c in cursor.description or ())
+                    while rows := await cursor.fetchmany(
+                        min(DBEXEC_CHUNK, DBEXEC_MAX_ROWS - numof_rows)
+                    ):
+                        writer.writerows(rows)
+                        numof_rows += len(rows)
+                        for row in rows:
+                            line = str(row)[:PAGE_LENGTH]
+                            if length + len(line) > PAGE_LENGTH:
+                                pages.append('\n'.join(page))
+                                page, length = [], 0
+                            page.append(line)
+                            length += len(line) + 1
+                        if numof_rows == DBEXEC_MAX_ROWS:
+                            more = await cursor.fetchone() is not None
+                            break
+                    changed = cursor.rowcount
+        except sqlite3.Error as e:
+            reason = 'over budget' if 'interrupted' in str(e) else e
+            await ctx.send(f'{C.B}{C.RED}query failed: {reason}{C.E}')
+            return
+        if page:
+            pages.append('\n'.join(page))
+        summary = (
+            f'{numof_rows}{"+" if more else ""} rows in {time() - start:.2f}s'
+            if numof_rows or not write
+            else f'{max(changed, 0)} rows changed in {time() - start:.2f}s'
+        )
+        if len(pages) > DBEXEC_PAGES:
+            await ctx.send(
+                f'{C.B}{C.GREEN}{summary}, in the attached file.{C.E}',
+                file=discord.File(
+                    BytesIO(table.getvalue().encode()),
+                    filename=f'dbexec-{datetime.now().strftime("%m_%d_%H_%M_%S")}.csv',
+                ),
+            )
+            return
+        pages = [
+            f'```py\n\u200b{content}```{summary}, page {k}/{len(pages)}'
+            for k, content in enumerate(pages, 1)
+        ] or [f'{C.B}{C.GREEN}{summary}.{C.E}']
+        view = PagesView(pages, ctx.author.id) if len(pages) > 1 else None
+        await ctx.send(pages[0], view=view)  # type: ignore
+
+    @commands.command(name='write-queue')
+    @commands.is_owner()
+    async def write_queue(self, ctx: commands.Context[Vesuvius]):
+        writer = self.bot.writer
+        average = writer.flush_time / writer.flushes * 1000 if writer.flushes else 0
+        await ctx.send(
+            f'{C.B}{C.CYAN}queued: {C.WHITE}{len(writer)}{C.CYAN}, most queued: '
+            f'{C.WHITE}{writer.high_water}{C.CYAN}, batches written: '
+            f'{C.WHITE}{writer.flushes}{C.CYAN}, average write: '
+            f'{C.WHITE}{average:.1f}ms{C.CYAN}, dropped: '
+            f'{C.WHITE}{writer.dropped}{C.E}'
+        )
+
+    @commands.command(name='maintenance')
+    @commands.is_owner()
+    async def maintenance(
+        self,
+        ctx: commands.Context[Vesuvius],
+        job: Optional[Literal['backup', 'optimize', 'vacuum']] = None,
+    ):
+        """show the last database backups, optimizations and vacuums, or run one
+        now. usage: `maintenance [backup, optimize, vacuum]"""
+        maintenance = self.bot.maintenance
+        if job is not None:
+            if job == 'vacuum' and await self.confirm(
+                ctx, 'vacuum the database, stopping writes until it is done'
+            ):
+                return
+            await ctx.send(f'{C.B}{C.BOLD_YELLOW}running {job}...{C.E}')
+            run = await maintenance.run(job, force=True)
+            await ctx.send(
+                f'{C.B}{C.BOLD_GREEN}{job}: {C.WHITE}{run.result}{C.BOLD_GREEN} in '
+                f'{C.WHITE}{run.seconds:.2f}s{C.BOLD_GREEN}.{C.E}'
+            )
+            return
+        lines = [
+            f'{C.PINK}{run.job:<9}{C.CYAN}'
+            f'{datetime.fromtimestamp(run.started).strftime("%m/%d %H:%M")}'
+            f'{C.WHITE}{run.seconds:>8.2f}s {C.NCLR}{run.result}'
+            for run in list(maintenance.runs)[-15:]
+        ]
+        due = ', '.join(
+            f'{name} {datetime.fromtimestamp(last).strftime("%m/%d %H:%M")}'
+            for name, last in maintenance.last.items()
+            if last
+        )
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}database maintenance:\n'
+            + ('\n'.join(lines) or f'{C.CYAN}nothing has run yet.')
+            + f'\n{C.YELLOW}last runs: {due or "none"}{C.E}'
+        )
+
+    @commands.command(name='query-stats')
+    @commands.is_owner()
+    async def query_stats(
+        self, ctx: commands.Context[Vesuvius], reset: Optional[Literal['reset']] = None
+    ):
+        """show the database operations that took the most time, or start
+        counting again. usage: `query-stats [reset]"""
+        stats = self.bot.database.query_stats
+        if reset:
+            stats.reset()
+            await ctx.send(f'{C.B}{C.BOLD_GREEN}query stats reset.{C.E}')
+            return
+        lines = [
+            f'{C.CYAN}{name[:24]:<24}{C.WHITE}{t.calls:>7}{t.time * 1000:>9.0f}'
+            f'{t.time / t.calls * 1000:>8.1f}{t.percentile(0.5) * 1000:>6.0f}'
+            f'{t.percentile(0.99) * 1000:>6.0f}{t.statements:>8}{t.rows:>9}'
+            for name, t in sorted(
+                stats.timings.items(), key=lambda item: item[1].time, reverse=True
+            )[:20]
+            if t.calls
+        ]
+        since = datetime.fromtimestamp(stats.since).strftime('%m/%d %H:%M')
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}database operations since {since}:\n'
+            f'{C.NCLR}{"":<24}{"calls":>7}{"ms":>9}{"avg":>8}{"p50":>6}{"p99":>6}'
+            f'{"stmts":>8}{"rows":>9}\n'
+            + ('\n'.join(lines) or f'{C.CYAN}nothing yet.')
+            + C.E
+        )
+
+    @commands.command(name='slow-queries')
+    @commands.is_owner()
+    async def slow_queries(self, ctx: commands.Context[Vesuvius], count: int = 5):
+        """show the last statements that took longer than the threshold, and
+        their query plans. usage: `slow-queries [count]"""
+        stats = self.bot.database.query_stats
+        entries = []
+        for slow in list(stats.slow)[-count:]:
+            plan = '\n'.join(f'    {step}' for step in slow.plan)
+            entries.append(
+                f'{C.PINK}{slow.name} {C.WHITE}{slow.seconds * 1000:.0f}ms '
+                f'{C.NCLR}{datetime.fromtimestamp(slow.when).strftime("%H:%M:%S")}\n'
+                f'{C.CYAN}{" ".join(slow.sql.split())[:300]}\n{C.YELLOW}{plan}'
+            )
+        message = (
+            f'{C.B}{C.BOLD_GREEN}statements slower than '
+            f'{stats.threshold * 1000:.0f}ms:\n'
+            + ('\n'.join(entries) or f'{C.CYAN}none.')
+        )
+        await ctx.send(message[:1990] + C.E)
+
+    @commands.command(name='recompute-ratings')
+    @commands.is_owner()
+    async def recompute_ratings(self, ctx: commands.Context[Vesuvius]):
+        """compute every rating again from the match history"""
+        if await self.confirm(ctx, 'recompute every rating'):
+            return
+        await self.bot.writer.flush()
+        start = time()
+        numof_matches, numof_ratings = await self.bot.database.recompute_ratings()
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}recomputed {C.WHITE}{numof_ratings}{C.BOLD_GREEN} '
+            f'ratings from {C.WHITE}{numof_matches}{C.BOLD_GREEN} matches in '
+            f'{C.WHITE}{time() - start:.2f}s{C.BOLD_GREEN}.{C.E}'
+        )
 
     @commands.command(name='webhook')
     @commands.has_guild_permissions(manage_webhooks=True)
@@ -343,14 +575,13 @@ class OwnerCommands(commands.Cog):
         await ctx.send(embed=ebd)
 
     async def confirm(self, ctx_info: commands.Context[Vesuvius], action: str) -> int:
-        def chk(msg: discord.Message) -> bool:
-            return msg.author == ctx_info.author and msg.channel == ctx_info.channel
-
         await ctx_info.send(
             f'{C.B}{C.RED}are you sure you want to{C.BOLD_RED} {action}? {C.E}'
         )
         try:
-            m = await self.bot.wait_for('message', check=chk, timeout=10)
+            m = await self.bot.router.wait(
+                ctx_info.channel.id, (ctx_info.author.id,), timeout=10
+            )
         except asyncio.TimeoutError:
             await ctx_info.send(f'{C.B}{C.RED}cancelled.{C.E}')
             return 1
@@ -427,9 +658,11 @@ class ServerCommands(commands.Cog):
     @commands.has_guild_permissions(administrator=True)
     async def get_channels(self, ctx: commands.Context[Vesuvius]):
         assert ctx.guild is not None
-        guild, option, general, announcements = await self.bot.database.get_channel(
-            ctx.guild.id
-        )
+        channels = self.bot.database.get_channel(ctx.guild.id)
+        if channels is None:
+            await ctx.send(f'{C.B}{C.RED}no channels are set, use `set-channels`.{C.E}')
+            return
+        guild, option, general, announcements = channels
         await ctx.send(
             f'```apache\nguild: {self.bot.get_guild(guild)}\noption: {option}\n'
             f'general: {self.bot.get_channel(general)}\n'
@@ -439,9 +672,9 @@ class ServerCommands(commands.Cog):
     @commands.command(name='flush')
     @commands.has_guild_permissions(manage_messages=True)
     async def flush_channel(self, ctx: commands.Context[Vesuvius], number: int):
-        async for message in ctx.channel.history(limit=number):
-            await message.delete()
-            await asyncio.sleep(0.3)
+        self.bot.janitor.delete_ids(
+            ctx.channel, [m.id async for m in ctx.channel.history(limit=number)]
+        )
 
 
 class GeneralCommands(commands.Cog):
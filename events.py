@@ -122,17 +122,9 @@ class Tasks(commands.Cog):
             ebd, img = res
             assert ebd.title is not None
 
-            all_channels = await self.bot.database.get_all_channels()
             print("HOLIDAY", ebd.title)
-            for channel, option in zip(
-                [
-                    self.bot.get_channel(id)
-                    for id in [
-                        row[3] for row in [guild_info for guild_info in all_channels]
-                    ]
-                ],
-                [row[1] for row in [guild_info for guild_info in all_channels]],
-            ):
+            for _, option, _, announcements in self.bot.database.get_all_channels():
+                channel = self.bot.get_channel(announcements)
                 assert isinstance(channel, discord.TextChannel)
                 msg = await channel.send(embed=ebd)
                 self.holiday_messages.append(msg)
@@ -182,7 +174,7 @@ class Tasks(commands.Cog):
         print("WOTD started")
         self.wotd_messages.clear()
         ebd = await self.get_wotd()
-        for channel_id in await self.bot.database.all_general_channels():
+        for channel_id in self.bot.database.all_general_channels():
             channel = self.bot.get_channel(channel_id)
             assert isinstance(channel, discord.TextChannel)
 
@@ -217,7 +209,7 @@ class Tasks(commands.Cog):
         self.wotd_messages.clear()
         await ctx.send(f'{C.B}{C.RED}wotd manual start. DO THE DB{C.E}')
         ebd = await self.get_wotd()
-        for channel_id in await self.bot.database.all_general_channels():
+        for channel_id in self.bot.database.all_general_channels():
             channel = self.bot.get_channel(channel_id)
             assert isinstance(channel, discord.TextChannel)
 
@@ -229,22 +221,17 @@ class Tasks(commands.Cog):
     @commands.is_owner()
     @commands.guild_only()
     async def wotdnew(self, ctx: commands.Context[Vesuvius]):
-        def chk(m: discord.Message):
-            return m.author == ctx.author and m.channel == ctx.channel
-
         await ctx.send(
             f"{C.B}{C.BOLD_RED}are you sure you want to change today's wotd?{C.E}"
         )
         try:
-            m = await self.bot.wait_for('message', check=chk, timeout=10)
+            m = await self.bot.router.wait(ctx.channel.id, (ctx.author.id,), timeout=10)
         except asyncio.TimeoutError:
             await ctx.send(f'{C.B}{C.RED}wotd redo cancelled.{C.E}')
             return
         if m.content == 'yes':
             ebd = await self.get_wotd(True)
-            for k, channel_id in enumerate(
-                await self.bot.database.all_general_channels()
-            ):
+            for k, channel_id in enumerate(self.bot.database.all_general_channels()):
                 channel = self.bot.get_channel(channel_id)
                 assert isinstance(channel, discord.TextChannel)
 
@@ -4,17 +4,59 @@ modules
 -------
 ansicolors
 
+archive
+
+boardimage
+
+clocks
+
+janitor
+
+maintenance
+
+matchmaking
+
+querystats
+
+ratings
+
+router
+
+sessions
+
+stats
+
+tournaments
+
 transformations
 
 trianglecenters
 
 utils
 
+workers
+
 wotd
 
+writebehind
+
 """
 from . import ansicolors
+from . import archive
+from . import boardimage
+from . import clocks
+from . import janitor
+from . import maintenance
+from . import matchmaking
+from . import querystats
+from . import ratings
+from . import router
+from . import sessions
+from . import stats
+from . import tournaments
 from . import transformations
 from . import trianglecenters
 from . import utils
+from . import workers
 from . import wotd
+from . import writebehind
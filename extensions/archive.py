@@ -0,0 +1,220 @@
+"""Compact storage for the moves of every game.
+
+A move `(x, y)` on a board `length` squares wide is packed as the number
+`y * length + x - 1`, in one byte if every move on that board fits in one
+byte and two bytes otherwise. `y` starts at 0, so games that only use `x`,
+like connect four, pack the same way.
+
+Running games are also kept as a `GameSnapshot`, so they can be resumed after
+a restart.
+"""
+from __future__ import annotations
+
+import math
+import struct
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from .utils import Database
+    from .writebehind import WriteBehindQueue
+
+__all__ = ('move_width', 'pack_moves', 'unpack_moves', 'GameSnapshot', 'MoveLog')
+
+
+def move_width(length: int) -> int:
+    """Number of bytes used for one move on a board `length` squares wide."""
+    return 1 if length * (length + 1) <= 256 else 2
+
+
+def pack_moves(moves: list[tuple[int, int]], length: int) -> bytes:
+    width = move_width(length)
+    return b''.join((y * length + x - 1).to_bytes(width, 'big') for x, y in moves)
+
+
+def unpack_moves(data: bytes, length: int) -> list[tuple[int, int]]:
+    width = move_width(length)
+    moves: list[tuple[int, int]] = []
+    for k in range(0, len(data), width):
+        y, x = divmod(int.from_bytes(data[k : k + width], 'big'), length)
+        moves.append((x + 1, y))
+    return moves
+
+
+class GameSnapshot:
+    """The state needed to resume a running game.
+
+    Packs to a few dozen bytes plus the packed moves. `clocks` is the main time
+    and byo-yomi periods left for each player, if the game has a clock.
+    """
+
+    _headers = {
+        1: struct.Struct('<BBBQQQQdB'),
+        2: struct.Struct('<BBBQQQQddBBB'),
+    }
+    _version = 2
+
+    def __init__(
+        self,
+        length: int,
+        player1: int,
+        player2: int,
+        channel: int,
+        prompt_message: int,
+        board_messages: list[int],
+        moves: list[tuple[int, int]],
+        *,
+        image: bool = False,
+        clocks: tuple[tuple[float, int], tuple[float, int]] | None = None,
+    ) -> None:
+        self.length = length
+        self.player1 = player1
+        self.player2 = player2
+        self.channel = channel
+        self.prompt_message = prompt_message
+        self.board_messages = board_messages
+        self.moves = moves
+        self.image = image
+        self.clocks = clocks
+
+    def pack(self) -> bytes:
+        (time1, periods1), (time2, periods2) = self.clocks or ((math.nan, 0),) * 2
+        return (
+            self._headers[self._version].pack(
+                self._version,
+                self.image,
+                self.length,
+                self.player1,
+                self.player2,
+                self.channel,
+                self.prompt_message,
+                time1,
+                time2,
+                periods1,
+                periods2,
+                len(self.board_messages),
+            )
+            + b''.join(m.to_bytes(8, 'little') for m in self.board_messages)
+            + pack_moves(self.moves, self.length)
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> GameSnapshot:
+        """Unpack a snapshot. Version 1 snapshots had the time since the start of
+        the game instead of clocks, which is dropped."""
+        if data[0] not in cls._headers:
+            raise ValueError(f'unknown snapshot version {data[0]}')
+        header = cls._headers[data[0]]
+        _, image, length, player1, player2, channel, prompt_message, *rest = (
+            header.unpack_from(data)
+        )
+        clocks = None
+        if data[0] == 1:
+            _, numof_board_messages = rest
+        else:
+            time1, time2, periods1, periods2, numof_board_messages = rest
+            if not math.isnan(time1):
+                clocks = (time1, periods1), (time2, periods2)
+        offset = header.size
+        board_messages = [
+            int.from_bytes(data[k : k + 8], 'little')
+            for k in range(offset, offset + numof_board_messages * 8, 8)
+        ]
+        offset += numof_board_messages * 8
+        return cls(
+            length,
+            player1,
+            player2,
+            channel,
+            prompt_message,
+            board_messages,
+            unpack_moves(data[offset:], length),
+            image=bool(image),
+            clocks=clocks,
+        )
+
+
+class MoveLog:
+    """Appends the moves of one running game to the archive.
+
+    Moves are buffered and written as one row every `batch_size` moves, and
+    the rest are written by `close`. The log also keeps the latest snapshot of
+    the game until it ends, written in the background by `writer` if it has one.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        game_id: int,
+        length: int,
+        batch_size: int = 16,
+        *,
+        writer: Optional[WriteBehindQueue] = None,
+    ) -> None:
+        self.database = database
+        self.writer = writer
+        self.game_id = game_id
+        self.length = length
+        self.batch_size = batch_size
+
+        self.numof_moves = 0
+        self._batch = 0
+        self._pending: list[tuple[int, int]] = []
+
+    @classmethod
+    async def resume(
+        cls,
+        database: Database,
+        game_id: int,
+        moves: list[tuple[int, int]],
+        *,
+        writer: Optional[WriteBehindQueue] = None,
+    ) -> MoveLog:
+        """Continue the log of a resumed game.
+
+        `moves` are all the moves of the game, including any that were not
+        written before it stopped.
+        """
+        length, numof_batches, archived = await database.get_archived_progress(game_id)
+        log = cls(database, game_id, length, writer=writer)
+        log._batch = numof_batches
+        log._pending = moves[archived:]
+        log.numof_moves = len(moves)
+        return log
+
+    async def append(self, x: int, y: int) -> None:
+        self._pending.append((x, y))
+        self.numof_moves += 1
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        data = pack_moves(self._pending, self.length)
+        self._pending.clear()
+        await self.database.add_archived_moves(self.game_id, self._batch, data)
+        self._batch += 1
+
+    async def save_snapshot(
+        self, snapshot: GameSnapshot, *, wait: bool = False
+    ) -> None:
+        """Save the snapshot of the game. It is queued in `writer` if there is one,
+        unless `wait`, which writes it before returning."""
+        if self.writer is not None:
+            if not wait:
+                self.writer.save_snapshot(self.game_id, snapshot)
+                return
+            self.writer.drop_snapshot(self.game_id)
+        await self.database.set_snapshot(self.game_id, snapshot.pack())
+
+    async def close(self, *, ended: bool = True) -> None:
+        """Write the remaining moves.
+
+        If the game `ended`, it is marked as ended and its snapshot is removed,
+        otherwise the snapshot is kept so the game can be resumed.
+        """
+        await self.flush()
+        if ended:
+            if self.writer is not None:
+                self.writer.drop_snapshot(self.game_id)
+            await self.database.end_archived_game(self.game_id, self.numof_moves)
@@ -0,0 +1,188 @@
+"""Draw game boards as images.
+
+Every square is drawn from a tile that is rasterised once and cached, so a
+frame is built by pasting tiles instead of drawing shapes. A `BoardRenderer`
+remembers the last frame it produced and only pastes the tiles of squares
+that changed since then.
+
+Frames are palette images with one entry per style color, which keeps PNG
+encoding fast and the files small.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from io import BytesIO
+from typing import Literal, Sequence
+
+from PIL import Image, ImageDraw
+
+__all__ = ('RGB', 'BoardStyle', 'BoardRenderer', 'CELL_SIZE', 'MARGIN')
+
+RGB = tuple[int, int, int]
+
+CELL_SIZE = 28
+MARGIN = 20
+
+
+class BoardStyle:
+    """Colors and shapes used to draw one kind of board.
+
+    `pieces` maps a square occupier to a shape and a color. Occupiers that are
+    not in `pieces` are drawn as empty squares.
+
+    With `intersections`, pieces sit on grid line crossings like a go board,
+    otherwise every square is a bordered cell.
+    """
+
+    def __init__(
+        self,
+        background: RGB,
+        line: RGB,
+        pieces: dict[str, tuple[Literal['stone', 'mark'], RGB]],
+        *,
+        intersections: bool = False,
+    ) -> None:
+        self.background = background
+        self.line = line
+        self.pieces = pieces
+        self.intersections = intersections
+
+        self.colors: list[RGB] = [background, line]
+        for _, color in pieces.values():
+            for c in (color, self.outline(color)):
+                if c not in self.colors:
+                    self.colors.append(c)
+
+    @staticmethod
+    def outline(color: RGB) -> RGB:
+        r, g, b = color
+        return max(r - 60, 0), max(g - 60, 0), max(b - 60, 0)
+
+    def index(self, color: RGB) -> int:
+        """Palette index of a style color."""
+        return self.colors.index(color)
+
+    def new_image(self, size: tuple[int, int]) -> Image.Image:
+        image = Image.new('P', size, 0)
+        image.putpalette([c for color in self.colors for c in color])
+        return image
+
+
+@lru_cache(maxsize=None)
+def _cell_tile(
+    style: BoardStyle, size: int, arms: tuple[bool, bool, bool, bool]
+) -> Image.Image:
+    """Rasterise an empty square.
+
+    `arms` are the up, down, left, right grid lines of an intersection,
+    or all False for a plain bordered cell.
+    """
+    tile = style.new_image((size, size))
+    draw = ImageDraw.Draw(tile)
+    line = style.index(style.line)
+    mid = size // 2
+    if not any(arms):
+        draw.rectangle((0, 0, size - 1, size - 1), outline=line)
+        return tile
+    up, down, left, right = arms
+    draw.line((mid, 0 if up else mid, mid, size - 1 if down else mid), fill=line)
+    draw.line((0 if left else mid, mid, size - 1 if right else mid, mid), fill=line)
+    return tile
+
+
+@lru_cache(maxsize=None)
+def _piece_tile(
+    style: BoardStyle, size: int, arms: tuple[bool, bool, bool, bool], occupier: str
+) -> Image.Image:
+    """Rasterise a piece on top of its empty square."""
+    shape, color = style.pieces[occupier]
+    tile = _cell_tile(style, size, arms).copy()
+    draw = ImageDraw.Draw(tile)
+    if shape == 'stone':
+        pad = max(size // 12, 1)
+        draw.ellipse(
+            (pad, pad, size - pad - 1, size - pad - 1),
+            fill=style.index(color),
+            outline=style.index(style.outline(color)),
+        )
+    else:
+        pad = size // 3
+        draw.rectangle(
+            (pad, pad, size - pad - 1, size - pad - 1), fill=style.index(color)
+        )
+    return tile
+
+
+class BoardRenderer:
+    """Renders one board, reusing the previous frame.
+
+    The renderer is not thread safe, but it is safe to call from an executor
+    as long as one game does not render two frames at the same time.
+    """
+
+    def __init__(
+        self, style: BoardStyle, width: int, height: int, *, cell: int = CELL_SIZE
+    ) -> None:
+        self.style = style
+        self.width = width
+        self.height = height
+        self.cell = cell
+        self._frame: Image.Image | None = None
+        self._last: list[str] = []
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width * self.cell + MARGIN, self.height * self.cell + MARGIN
+
+    def position(self, index: int) -> tuple[int, int]:
+        """Pixel position of the top left corner of a square.
+
+        Squares are indexed bottom row first, like `BaseBoard._all_squares`.
+        """
+        x, y = index % self.width, index // self.width
+        return MARGIN + x * self.cell, (self.height - 1 - y) * self.cell
+
+    def tile(self, index: int, occupier: str) -> Image.Image:
+        arms = (False, False, False, False)
+        if self.style.intersections:
+            x, y = index % self.width, index // self.width
+            arms = (y < self.height - 1, y > 0, x > 0, x < self.width - 1)
+        if occupier in self.style.pieces:
+            return _piece_tile(self.style, self.cell, arms, occupier)
+        return _cell_tile(self.style, self.cell, arms)
+
+    def _blank_frame(self) -> Image.Image:
+        frame = self.style.new_image(self.size)
+        draw = ImageDraw.Draw(frame)
+        line = self.style.index(self.style.line)
+        for n in range(self.height):
+            _, top = self.position(n * self.width)
+            draw.text((2, top + self.cell // 3), str(n + 1), fill=line)
+        for n in range(self.width):
+            left, _ = self.position(n)
+            draw.text(
+                (left + self.cell // 3, self.height * self.cell + 4),
+                str(n + 1),
+                fill=line,
+            )
+        return frame
+
+    def draw(self, squares: Sequence[str]) -> Image.Image:
+        """Bring the frame up to date with `squares` and return it.
+
+        Only squares whose occupier differs from the last call are pasted.
+        """
+        if self._frame is None or len(squares) != len(self._last):
+            self._frame = self._blank_frame()
+            self._last = [''] * len(squares)
+        for k, occupier in enumerate(squares):
+            if self._last[k] != occupier:
+                self._frame.paste(self.tile(k, occupier), self.position(k))
+                self._last[k] = occupier
+        return self._frame
+
+    def render(self, squares: Sequence[str]) -> bytes:
+        """Draw `squares` and encode the frame as PNG."""
+        buffer = BytesIO()
+        self.draw(squares).save(buffer, 'png')
+        return buffer.getvalue()
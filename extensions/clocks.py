@@ -0,0 +1,204 @@
+"""Game clocks and the timers behind them.
+
+Every time is taken from `time.monotonic`, so clocks are not affected by
+changes to the system time. Timers from every game and prompt share one
+`TimerScheduler`, which keeps them in a heap and sleeps until the earliest one.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import time
+import traceback
+from functools import partial
+from typing import Any, Callable, Optional
+
+__all__ = ('TimerHandle', 'TimerScheduler', 'GameClock')
+
+
+class TimerHandle:
+    """A callback scheduled in a `TimerScheduler`."""
+
+    __slots__ = ('deadline', 'callback', 'cancelled', '_scheduler')
+
+    def __init__(
+        self, deadline: float, callback: Callable[[], Any], scheduler: TimerScheduler
+    ) -> None:
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def __lt__(self, other: TimerHandle) -> bool:
+        return self.deadline < other.deadline
+
+    def cancel(self) -> None:
+        if not self.cancelled:
+            self.cancelled = True
+            self._scheduler._cancelled += 1
+
+
+class TimerScheduler:
+    """Runs callbacks at monotonic deadlines from a single task.
+
+    The task is started by the first timer and stops once there are none left.
+    Cancelled timers stay in the heap until they are due, unless they make up
+    most of it, then the heap is rebuilt without them.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[TimerHandle] = []
+        self._cancelled = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def call_at(
+        self, deadline: float, callback: Callable[..., Any], *args: Any
+    ) -> TimerHandle:
+        """Call `callback` once `time.monotonic()` reaches `deadline`."""
+        handle = TimerHandle(deadline, partial(callback, *args), self)
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._heap = [h for h in self._heap if not h.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        heapq.heappush(self._heap, handle)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._heap[0] is handle:
+            self._wakeup.set()
+        return handle
+
+    def call_later(
+        self, delay: float, callback: Callable[..., Any], *args: Any
+    ) -> TimerHandle:
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    async def _run(self) -> None:
+        while self._heap:
+            head = self._heap[0]
+            if head.cancelled:
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+                continue
+            delay = head.deadline - time.monotonic()
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                head.cancelled = True
+                try:
+                    head.callback()
+                except Exception:
+                    traceback.print_exc()
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+class GameClock:
+    """The remaining time of the two players of a game.
+
+    Each player has `main` seconds, and gains `increment` seconds after every
+    move made in main time. Once main time runs out, the player has `periods`
+    byo-yomi periods of `period` seconds. A move made within a period keeps
+    it, and every period that runs out is lost. A player whose time runs out
+    with no periods left has lost on time.
+
+    Players are 0 and 1.
+    """
+
+    def __init__(
+        self,
+        main: float,
+        *,
+        increment: float = 0,
+        periods: int = 0,
+        period: float = 0,
+    ) -> None:
+        self.increment = increment
+        self.period = period
+        self.main = [float(main), float(main)]
+        self.periods = [periods, periods] if period else [0, 0]
+        self.turn: Optional[int] = None
+        self._turn_start = 0.0
+
+    def start(self, player: int) -> None:
+        """Start the clock of `player`."""
+        self.turn = player
+        self._turn_start = time.monotonic()
+
+    def stop(self) -> bool:
+        """Stop the running clock after a move.
+
+        Returns False if the player ran out of time before the move.
+        """
+        if self.turn is None:
+            return True
+        player, self.turn = self.turn, None
+        main, periods, flagged = self._spend(
+            player, time.monotonic() - self._turn_start
+        )
+        if main > 0:
+            main += self.increment
+        self.main[player], self.periods[player] = main, periods
+        return not flagged
+
+    def remaining(self, player: int) -> tuple[float, int]:
+        """Main time and byo-yomi periods that `player` has left right now."""
+        if player != self.turn:
+            return self.main[player], self.periods[player]
+        main, periods, _ = self._spend(player, time.monotonic() - self._turn_start)
+        return main, periods
+
+    def time_left(self) -> float:
+        """Seconds until the running clock runs out."""
+        if self.turn is None:
+            return float('inf')
+        return (
+            self.main[self.turn]
+            + self.periods[self.turn] * self.period
+            - (time.monotonic() - self._turn_start)
+        )
+
+    def refresh_interval(self) -> float:
+        """Seconds between updates of a displayed clock, less often the more time
+        is left."""
+        left = self.time_left()
+        if left > 600:
+            return 60
+        if left > 60:
+            return 30
+        return 10
+
+    def format(self, player: int) -> str:
+        main, periods = self.remaining(player)
+        if main > 0 or not periods:
+            return f'{int(main) // 60}:{int(main) % 60:02}'
+        left = self.period
+        if player == self.turn:
+            left -= (time.monotonic() - self._turn_start - self.main[player]) % (
+                self.period
+            )
+        return f'{periods}×{int(left)}s'
+
+    def state(self) -> tuple[tuple[float, int], tuple[float, int]]:
+        """Remaining time of both players, for snapshots."""
+        return self.remaining(0), self.remaining(1)
+
+    def set_state(self, state: tuple[tuple[float, int], tuple[float, int]]) -> None:
+        for player, (main, periods) in enumerate(state):
+            self.main[player], self.periods[player] = main, periods
+
+    def _spend(self, player: int, elapsed: float) -> tuple[float, int, bool]:
+        main, periods = self.main[player], self.periods[player]
+        if elapsed <= main:
+            return main - elapsed, periods, False
+        if self.period:
+            lost = int((elapsed - main) // self.period)
+            if lost < periods:
+                return 0.0, periods - lost, False
+        return 0.0, 0, True
@@ -0,0 +1,88 @@
+"""Delete messages in batches, in the background.
+
+Messages queued in a channel are deleted together a moment later, with one
+bulk delete call per 100 messages. Discord only bulk deletes messages younger
+than 14 days, older ones are deleted one at a time.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+from typing import Iterable
+
+import discord
+
+__all__ = ('MessageJanitor',)
+
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14, minutes=-5)
+
+
+class MessageJanitor:
+    """Queues of messages to delete, per channel.
+
+    `delay` is the number of seconds messages are collected for before they are
+    deleted.
+    """
+
+    def __init__(self, *, delay: float = 2.0) -> None:
+        self.delay = delay
+        self._pending: dict[int, tuple[discord.abc.Messageable, set[int]]] = {}
+        self._tasks: dict[int, asyncio.Task[None]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(ids) for _, ids in self._pending.values())
+
+    def delete(self, message: discord.Message) -> None:
+        """Queue a message to be deleted."""
+        self.delete_ids(message.channel, (message.id,))
+
+    def delete_ids(
+        self, channel: discord.abc.Messageable, message_ids: Iterable[int]
+    ) -> None:
+        """Queue messages of a channel to be deleted by id."""
+        channel_id = channel.id  # type: ignore
+        _, ids = self._pending.setdefault(channel_id, (channel, set()))
+        ids.update(message_ids)
+        if ids and channel_id not in self._tasks:
+            self._tasks[channel_id] = asyncio.create_task(self._drain(channel_id))
+
+    async def close(self) -> None:
+        """Delete everything that is queued right away."""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        for channel_id in list(self._pending):
+            await self._delete(*self._pending.pop(channel_id))
+
+    async def _drain(self, channel_id: int) -> None:
+        await asyncio.sleep(self.delay)
+        channel, ids = self._pending.pop(channel_id)
+        # messages queued from now on are deleted by another task
+        del self._tasks[channel_id]
+        await self._delete(channel, ids)
+
+    @staticmethod
+    async def _delete(channel: discord.abc.Messageable, ids: set[int]) -> None:
+        oldest = discord.utils.time_snowflake(
+            discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        )
+        recent = sorted(i for i in ids if i >= oldest)
+        old = [i for i in ids if i < oldest]
+        if not hasattr(channel, 'delete_messages'):
+            recent, old = [], recent + old
+        for k in range(0, len(recent), 100):
+            chunk = [discord.Object(i) for i in recent[k : k + 100]]
+            try:
+                await channel.delete_messages(chunk)  # type: ignore
+            except discord.NotFound:
+                old.extend(m.id for m in chunk)
+            except discord.HTTPException as e:
+                print(f'CANNOT DELETE {len(chunk)} messages in {channel}:', e)
+        for i in old:
+            try:
+                await channel.get_partial_message(i).delete()  # type: ignore
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                print(f'CANNOT DELETE message {i} in {channel}:', e)
@@ -0,0 +1,234 @@
+"""Back up and tidy the database in the background.
+
+`DatabaseMaintenance` checks every `interval` seconds whether one of its jobs
+is due, and runs it:
+
+backup: every `backup_every` seconds, the database is copied with the sqlite
+backup API, `backup_pages` pages per step with a pause between steps, on a
+connection of its own. Between steps nothing is locked, so writes carry on.
+A write makes sqlite start the copy over, so after `backup_restarts` of those
+the rest is copied in one step, which in WAL mode still only holds a read
+snapshot. The copy is made next to the backup and replaces it when complete.
+
+optimize: every `optimize_every` seconds, `PRAGMA optimize` updates the
+statistics the query planner uses where they are out of date, or `ANALYZE`
+gathers them if there are none yet.
+
+vacuum: at most once a day, during `quiet_hours` and while `quiet()` is true,
+VACUUM rebuilds the database if at least `vacuum_free` of its pages are free.
+
+Every run is recorded, with how long it took, in `runs`.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+import aiosqlite
+
+if TYPE_CHECKING:
+    from .utils import Database
+
+__all__ = ('MaintenanceRun', 'DatabaseMaintenance')
+
+VACUUM_EVERY = 20 * 3600
+"""Seconds after a vacuum before the next, so there is at most one a day."""
+
+
+class MaintenanceRun:
+    """One run of a job, and what it did."""
+
+    __slots__ = ('job', 'started', 'seconds', 'result')
+
+    def __init__(self, job: str, started: float, seconds: float, result: str) -> None:
+        self.job = job
+        self.started = started
+        self.seconds = seconds
+        self.result = result
+
+    def __repr__(self) -> str:
+        return f'<MaintenanceRun job={self.job} seconds={self.seconds:.2f}>'
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+class _BackupStopped(Exception):
+    pass
+
+
+class DatabaseMaintenance:
+    """The maintenance jobs of one database. `quiet` says whether the bot is
+    idle enough to vacuum. Jobs never run at the same time."""
+
+    def __init__(
+        self,
+        database: Database,
+        path: str | os.PathLike[str],
+        backup_path: str | os.PathLike[str],
+        *,
+        quiet: Callable[[], bool] = lambda: True,
+        interval: float = 60.0,
+        backup_every: float = 6 * 3600,
+        backup_pages: int = 256,
+        backup_sleep: float = 0.05,
+        backup_restarts: int = 5,
+        optimize_every: float = 6 * 3600,
+        vacuum_free: float = 0.1,
+        quiet_hours: tuple[int, int] = (4, 6),
+    ) -> None:
+        self.database = database
+        self.path = path
+        self.backup_path = backup_path
+        self.quiet = quiet
+        self.interval = interval
+        self.backup_every = backup_every
+        self.backup_pages = backup_pages
+        self.backup_sleep = backup_sleep
+        self.backup_restarts = backup_restarts
+        self.optimize_every = optimize_every
+        self.vacuum_free = vacuum_free
+        self.quiet_hours = quiet_hours
+        self.runs: deque[MaintenanceRun] = deque(maxlen=30)
+        self.last = {
+            'backup': (
+                os.path.getmtime(backup_path) if os.path.exists(backup_path) else 0.0
+            ),
+            'optimize': 0.0,
+            'vacuum': 0.0,
+        }
+        self._lock = asyncio.Lock()
+        self._closing = False
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        """Stop, interrupting a backup that is being made."""
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def due(self, now: float) -> list[str]:
+        """The jobs that should run now."""
+        jobs = []
+        if now - self.last['backup'] >= self.backup_every:
+            jobs.append('backup')
+        if now - self.last['optimize'] >= self.optimize_every:
+            jobs.append('optimize')
+        start, end = self.quiet_hours
+        if (
+            now - self.last['vacuum'] >= VACUUM_EVERY
+            and start <= datetime.fromtimestamp(now).hour < end
+            and self.quiet()
+        ):
+            jobs.append('vacuum')
+        return jobs
+
+    async def run(self, job: str, *, force: bool = False) -> MaintenanceRun:
+        """Run a job now. A forced vacuum runs however few pages are free."""
+        jobs: dict[str, Callable[[], Awaitable[str]]] = {
+            'backup': self.backup,
+            'optimize': self.optimize,
+            'vacuum': lambda: self.vacuum(force=force),
+        }
+        async with self._lock:
+            started = time.time()
+            start = time.perf_counter()
+            try:
+                result = await jobs[job]()
+            except (sqlite3.Error, OSError) as e:
+                result = f'failed: {e}'
+                print(f'CANNOT {job.upper()} the database:', e)
+            run = MaintenanceRun(job, started, time.perf_counter() - start, result)
+            self.last[job] = started
+            self.runs.append(run)
+            return run
+
+    async def backup(self) -> str:
+        partial = f'{os.fspath(self.backup_path)}.partial'
+        source = await aiosqlite.connect(self.path)
+        # used on the thread of the source, only while this waits for it
+        target = sqlite3.connect(partial, check_same_thread=False)
+        steps = restarts = 0
+        remaining = -1
+
+        def progress(status: int, left: int, total: int) -> None:
+            nonlocal steps, restarts, remaining
+            if self._closing:
+                raise _BackupStopped
+            steps += 1
+            if 0 <= remaining < left:
+                restarts += 1
+                if restarts > self.backup_restarts:
+                    raise _BackupRestarted
+            remaining = left
+            # sqlite3 only sleeps between steps when the database is busy. this
+            # runs on the thread of the source, so the bot carries on
+            if left:
+                time.sleep(self.backup_sleep)
+
+        try:
+            try:
+                await source.backup(target, pages=self.backup_pages, progress=progress)
+            except _BackupRestarted:
+                await source.backup(target, pages=-1)
+                steps += 1
+            async with source.execute('PRAGMA page_count') as cursor:
+                pages = (await cursor.fetchone())[0]  # type: ignore
+        except BaseException:
+            # the backup may still be running if this was cancelled, it stops
+            # at its next step and the source closes after it
+            await source.close()
+            target.close()
+            os.remove(partial)
+            raise
+        await source.close()
+        target.close()
+        os.replace(partial, self.backup_path)
+        return f'{pages} pages in {steps} steps, {restarts} restarts'
+
+    async def optimize(self) -> str:
+        with self.database.query_stats.operation('maintenance-optimize'):
+            async with self.database.transaction() as cursor:
+                await cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'"
+                )
+                if await cursor.fetchone() is None:
+                    await cursor.execute('ANALYZE')
+                    return 'analyzed every table'
+                await cursor.execute('PRAGMA optimize')
+                return 'optimized'
+
+    async def vacuum(self, *, force: bool = False) -> str:
+        with self.database.query_stats.operation('maintenance-vacuum'):
+            async with self.database.transaction() as cursor:
+                await cursor.execute('PRAGMA page_count')
+                pages = (await cursor.fetchone())[0]
+                await cursor.execute('PRAGMA freelist_count')
+                free = (await cursor.fetchone())[0]
+                if not force and free < self.vacuum_free * pages:
+                    return f'skipped, {free} of {pages} pages free'
+                await cursor.execute('VACUUM')
+                # the whole database went through the log, empty it again
+                await cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                await cursor.fetchall()
+                await cursor.execute('PRAGMA page_count')
+                after = (await cursor.fetchone())[0]
+        return f'{pages} pages to {after}'
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            for job in self.due(time.time()):
+                await self.run(job)
@@ -0,0 +1,125 @@
+"""Pair players that wait for a game by rating.
+
+A `MatchQueue` keeps the players waiting for one game sorted by rating, so the
+closest rated opponents of a player are its neighbors in the queue, found with
+a binary search. Two players are matched if their ratings are within the search
+window of either of them, which widens the longer they wait, so players with
+an unusual rating still find a game eventually.
+"""
+from __future__ import annotations
+
+import bisect
+from typing import Iterator, Optional
+
+__all__ = ('DEFAULT_RATING', 'Waiting', 'MatchQueue')
+
+DEFAULT_RATING = 1500.0
+"""Rating of players that have not played a rated game."""
+
+
+class Waiting:
+    """A player in a `MatchQueue`, and the channel they queued in."""
+
+    __slots__ = ('user', 'rating', 'joined', 'channel')
+
+    def __init__(self, user: int, rating: float, joined: float, channel: int) -> None:
+        self.user = user
+        self.rating = rating
+        self.joined = joined
+        self.channel = channel
+
+    def __repr__(self) -> str:
+        return f'<Waiting user={self.user} rating={self.rating} joined={self.joined}>'
+
+    @property
+    def key(self) -> tuple[float, float, int]:
+        return self.rating, self.joined, self.user
+
+
+class MatchQueue:
+    """The players waiting for one game, sorted by rating.
+
+    The search window of a player is `window` rating points, plus `widen`
+    points for every second they have waited, up to `max_window`.
+    """
+
+    def __init__(
+        self, *, window: float = 50.0, widen: float = 5.0, max_window: float = 400.0
+    ) -> None:
+        self.window = window
+        self.widen = widen
+        self.max_window = max_window
+        self._keys: list[tuple[float, float, int]] = []
+        self._by_user: dict[int, Waiting] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user: int) -> bool:
+        return user in self._by_user
+
+    def __iter__(self) -> Iterator[Waiting]:
+        """Players by rating."""
+        return (self._by_user[user] for _, _, user in self._keys)
+
+    def window_of(self, waiting: Waiting, now: float) -> float:
+        return min(
+            self.max_window,
+            self.window + self.widen * max(0.0, now - waiting.joined),
+        )
+
+    def add(self, waiting: Waiting, now: float) -> Optional[tuple[Waiting, Waiting]]:
+        """Queue a player, and match them right away if an opponent is in their
+        window. Returns the match, the player that waited longer first."""
+        if waiting.user in self._by_user:
+            return None
+        index = bisect.bisect_left(self._keys, waiting.key)
+        self._keys.insert(index, waiting.key)
+        self._by_user[waiting.user] = waiting
+
+        best: Optional[int] = None
+        for other in (index - 1, index + 1):
+            if 0 <= other < len(self._keys) and self._matches(index, other, now):
+                if best is None or self._distance(index, other) < self._distance(
+                    index, best
+                ):
+                    best = other
+        if best is None:
+            return None
+        return self._pop_match(index, best)
+
+    def remove(self, user: int) -> Optional[Waiting]:
+        """Take a player out of the queue. Returns None if they are not in it."""
+        waiting = self._by_user.pop(user, None)
+        if waiting is not None:
+            del self._keys[bisect.bisect_left(self._keys, waiting.key)]
+        return waiting
+
+    def sweep(self, now: float) -> list[tuple[Waiting, Waiting]]:
+        """Match every pair of neighbors whose windows have grown enough since
+        they were queued."""
+        matches = []
+        k = 0
+        while k < len(self._keys) - 1:
+            if self._matches(k, k + 1, now):
+                matches.append(self._pop_match(k, k + 1))
+            else:
+                k += 1
+        return matches
+
+    def _distance(self, a: int, b: int) -> float:
+        return abs(self._keys[a][0] - self._keys[b][0])
+
+    def _matches(self, a: int, b: int, now: float) -> bool:
+        first, second = self._by_user[self._keys[a][2]], self._by_user[self._keys[b][2]]
+        return self._distance(a, b) <= max(
+            self.window_of(first, now), self.window_of(second, now)
+        )
+
+    def _pop_match(self, a: int, b: int) -> tuple[Waiting, Waiting]:
+        a, b = sorted((a, b))
+        second = self._by_user.pop(self._keys.pop(b)[2])
+        first = self._by_user.pop(self._keys.pop(a)[2])
+        if second.joined < first.joined:
+            first, second = second, first
+        return first, second
@@ -0,0 +1,236 @@
+"""Time the operations of the database and the statements they run.
+
+Every operation of the database is timed under a name, the name of its method,
+and `QueryStats` keeps for each name the number of calls, a histogram of how
+long they took, the number of statements they ran and the rows those read or
+changed. A statement lasts from when it is executed until the next statement
+on the same cursor, or until the cursor is closed, so the time to fetch its
+rows is included. Statements slower than `threshold` seconds are printed and
+kept in `slow` with their query plan.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Iterable, Iterator, Optional, TypeVar
+
+import aiosqlite
+
+__all__ = ('BUCKETS', 'Timing', 'SlowStatement', 'QueryStats', 'TimedCursor', 'timed')
+
+BUCKETS = (0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0, 3.0)
+"""Upper bounds in seconds of the buckets of the histograms. One more bucket
+holds everything slower."""
+
+_operation: contextvars.ContextVar[str] = contextvars.ContextVar(
+    '_operation', default='other'
+)
+
+_T = TypeVar('_T', bound=type)
+
+
+class Timing:
+    """The calls of one operation."""
+
+    __slots__ = ('calls', 'time', 'statements', 'rows', 'buckets')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.calls += 1
+        self.time += seconds
+        self.buckets[next((k for k, b in enumerate(BUCKETS) if seconds <= b), -1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """The upper bound of the bucket of the call at `fraction` of the calls,
+        by time. Infinite if that call was slower than every bucket."""
+        count = 0
+        for bound, calls in zip(BUCKETS, self.buckets):
+            count += calls
+            if count >= fraction * self.calls:
+                return bound
+        return float('inf')
+
+
+class SlowStatement:
+    """A statement that took longer than the threshold."""
+
+    __slots__ = ('name', 'sql', 'seconds', 'plan', 'when')
+
+    def __init__(
+        self, name: str, sql: str, seconds: float, plan: list[str], when: float
+    ) -> None:
+        self.name = name
+        self.sql = sql
+        self.seconds = seconds
+        self.plan = plan
+        self.when = when
+
+    def __repr__(self) -> str:
+        return f'<SlowStatement name={self.name} seconds={self.seconds:.3f}>'
+
+
+class QueryStats:
+    """Timings of operations by name, and the last `keep` slow statements."""
+
+    def __init__(self, *, threshold: float = 0.1, keep: int = 50) -> None:
+        self.threshold = threshold
+        self.timings: dict[str, Timing] = {}
+        self.slow: deque[SlowStatement] = deque(maxlen=keep)
+        self.since = time.time()
+
+    def reset(self) -> None:
+        self.timings.clear()
+        self.slow.clear()
+        self.since = time.time()
+
+    def timing(self, name: str) -> Timing:
+        if name not in self.timings:
+            self.timings[name] = Timing()
+        return self.timings[name]
+
+    @contextlib.contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        """Time the block, and count the statements run in it, under `name`."""
+        token = _operation.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing(name).add(time.perf_counter() - start)
+            _operation.reset(token)
+
+
+class TimedCursor:
+    """A cursor that counts its statements and their rows in a `QueryStats`,
+    under the name of the operation it is used in."""
+
+    def __init__(
+        self,
+        connection: aiosqlite.Connection,
+        cursor: aiosqlite.Cursor,
+        stats: QueryStats,
+    ) -> None:
+        self.connection = connection
+        self.cursor = cursor
+        self.stats = stats
+        self.name = _operation.get()
+        self._statement: Optional[tuple[str, Any]] = None
+        self._elapsed = 0.0
+
+    @property
+    def rowcount(self) -> int:
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self.cursor.lastrowid
+
+    @property
+    def description(self) -> Any:
+        return self.cursor.description
+
+    async def execute(
+        self, sql: str, parameters: Optional[Iterable[Any]] = None
+    ) -> TimedCursor:
+        await self._finish()
+        self._statement = (sql, parameters or ())
+        start = time.perf_counter()
+        await self.cursor.execute(sql, parameters)
+        self._elapsed += time.perf_counter() - start
+        self._count(max(self.cursor.rowcount, 0))
+        return self
+
+    async def executemany(
+        self, sql: str, parameters: Iterable[Iterable[Any]]
+    ) -> TimedCursor:
+        await self._finish()
+        parameters = list(parameters)
+        self._statement = (sql, parameters[0] if parameters else None)
+        start = time.perf_counter()
+        await self.cursor.executemany(sql, parameters)
+        self._elapsed += time.perf_counter() - start
+        self._count(max(self.cursor.rowcount, 0))
+        return self
+
+    async def fetchone(self) -> Any:
+        start = time.perf_counter()
+        row = await self.cursor.fetchone()
+        self._elapsed += time.perf_counter() - start
+        self._count(row is not None)
+        return row
+
+    async def fetchmany(self, size: Optional[int] = None) -> list[Any]:
+        start = time.perf_counter()
+        rows = list(await self.cursor.fetchmany(size))
+        self._elapsed += time.perf_counter() - start
+        self._count(len(rows))
+        return rows
+
+    async def fetchall(self) -> list[Any]:
+        start = time.perf_counter()
+        rows = list(await self.cursor.fetchall())
+        self._elapsed += time.perf_counter() - start
+        self._count(len(rows))
+        return rows
+
+    async def close(self) -> None:
+        await self._finish()
+        await self.cursor.close()
+
+    def _count(self, rows: int) -> None:
+        self.stats.timing(self.name).rows += rows
+
+    async def _finish(self) -> None:
+        """Count the last statement, and keep it if it was slow."""
+        if self._statement is None:
+            return
+        (sql, parameters), self._statement = self._statement, None
+        elapsed, self._elapsed = self._elapsed, 0.0
+        self.stats.timing(self.name).statements += 1
+        if elapsed < self.stats.threshold:
+            return
+        plan = []
+        if parameters is not None:
+            try:
+                async with self.connection.execute(
+                    f'EXPLAIN QUERY PLAN {sql}', parameters
+                ) as explain:
+                    plan = [row[3] for row in await explain.fetchall()]
+            except sqlite3.Error as e:
+                plan = [f'no plan: {e}']
+        print(
+            f'SLOW QUERY in {self.name}, {elapsed * 1000:.0f}ms:', ' '.join(sql.split())
+        )
+        self.stats.slow.append(
+            SlowStatement(self.name, sql, elapsed, plan, time.time())
+        )
+
+
+def timed(cls: _T) -> _T:
+    """Time every public coroutine method of a class that has a `query_stats`,
+    under the name of the method."""
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.iscoroutinefunction(method):
+            continue
+
+        def wrap(method: Any, name: str = name) -> Any:
+            @functools.wraps(method)
+            async def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+                with self.query_stats.operation(name):
+                    return await method(self, *args, **kwargs)
+
+            return wrapper
+
+        setattr(cls, name, wrap(method))
+    return cls
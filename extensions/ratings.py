@@ -0,0 +1,70 @@
+"""Elo ratings of players, per game.
+
+A player starts at `DEFAULT_RATING`. After every game both players move
+towards the result by `k_factor` times the difference between the result and
+the expected result, so beating a stronger player gains more. New players have
+a larger factor, so their rating settles quickly.
+
+`RatingBook` holds the ratings of many players in memory while a batch of
+results is applied, either the results written together by
+`Database.add_matches` or the whole match history when ratings are recomputed.
+"""
+from __future__ import annotations
+
+from typing import Iterator
+
+from .matchmaking import DEFAULT_RATING
+
+__all__ = ('expected_score', 'k_factor', 'RatingBook')
+
+PROVISIONAL_GAMES = 30
+"""Games a player plays with the larger factor."""
+
+
+def expected_score(rating: float, opponent: float) -> float:
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+def k_factor(games: int) -> float:
+    return 40.0 if games < PROVISIONAL_GAMES else 20.0
+
+
+class RatingBook:
+    """Ratings and numbers of games of players, by player and game."""
+
+    def __init__(self) -> None:
+        self._ratings: dict[tuple[int, str], tuple[float, int]] = {}
+        self.changed: set[tuple[int, str]] = set()
+
+    def __len__(self) -> int:
+        return len(self._ratings)
+
+    def __contains__(self, key: tuple[int, str]) -> bool:
+        return key in self._ratings
+
+    def __iter__(self) -> Iterator[tuple[int, str, float, int]]:
+        """The id, game, rating and number of games of every player."""
+        for (user, game), (rating, games) in self._ratings.items():
+            yield user, game, rating, games
+
+    def set(self, user: int, game: str, rating: float, games: int) -> None:
+        self._ratings[user, game] = rating, games
+
+    def get(self, user: int, game: str) -> tuple[float, int]:
+        return self._ratings.get((user, game), (DEFAULT_RATING, 0))
+
+    def play(self, game: str, winner: int, loser: int, tie: bool = False) -> None:
+        """Apply the result of a game."""
+        winner_rating, winner_games = self.get(winner, game)
+        loser_rating, loser_games = self.get(loser, game)
+        score = 0.5 if tie else 1.0
+        change = score - expected_score(winner_rating, loser_rating)
+        self._ratings[winner, game] = (
+            winner_rating + k_factor(winner_games) * change,
+            winner_games + 1,
+        )
+        self._ratings[loser, game] = (
+            loser_rating - k_factor(loser_games) * change,
+            loser_games + 1,
+        )
+        self.changed.update(((winner, game), (loser, game)))
@@ -0,0 +1,97 @@
+"""Route incoming messages to the coroutines waiting for them.
+
+`bot.wait_for('message', check=...)` runs every pending check on every message
+the bot receives. Waiters here are indexed by `(channel_id, author_id)`, so a
+message is only checked against the waiters in its own channel from its own
+author, and is given to the first of them that accepts it. Timeouts are
+timers in a shared `TimerScheduler` instead of one `asyncio.wait_for` each.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, Iterable, Optional
+
+import discord
+
+from .clocks import TimerScheduler
+
+__all__ = ('InputRouter',)
+
+_Check = Callable[[discord.Message], bool]
+
+
+class InputRouter:
+    """Waiters for messages, keyed by channel and author.
+
+    Unlike `wait_for`, a message is consumed by one waiter only, so two games
+    or prompts that wait in the same channel do not both receive it.
+    """
+
+    def __init__(self, timers: Optional[TimerScheduler] = None) -> None:
+        self.timers = timers or TimerScheduler()
+        self._waiters: dict[
+            tuple[int, int], list[tuple[asyncio.Future[discord.Message], _Check]]
+        ] = {}
+
+    def __len__(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def wait(
+        self,
+        channel_id: int,
+        authors: Iterable[int],
+        *,
+        check: Optional[_Check] = None,
+        timeout: Optional[float] = None,
+    ) -> discord.Message:
+        """Wait for a message from one of `authors` in a channel.
+
+        `check` can reject a message, which is then offered to the next waiter.
+        Raises `asyncio.TimeoutError` after `timeout` seconds.
+        """
+        future: asyncio.Future[discord.Message] = (
+            asyncio.get_running_loop().create_future()
+        )
+        waiter = (future, check or (lambda _: True))
+        keys = [(channel_id, author) for author in set(authors)]
+        for key in keys:
+            self._waiters.setdefault(key, []).append(waiter)
+        timer = None
+        if timeout is not None:
+            timer = self.timers.call_later(timeout, self._expire, future)
+        try:
+            return await future
+        finally:
+            if timer is not None:
+                timer.cancel()
+            for key in keys:
+                waiters = self._waiters[key]
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[key]
+
+    @staticmethod
+    def _expire(future: asyncio.Future[discord.Message]) -> None:
+        if not future.done():
+            future.set_exception(asyncio.TimeoutError())
+
+    def dispatch(self, message: discord.Message) -> bool:
+        """Give `message` to the first waiter that accepts it.
+
+        Returns whether a waiter took the message.
+        """
+        waiters = self._waiters.get((message.channel.id, message.author.id))
+        if not waiters:
+            return False
+        for future, check in tuple(waiters):
+            if future.done():
+                continue
+            try:
+                accepted = check(message)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if accepted:
+                future.set_result(message)
+                return True
+        return False
@@ -0,0 +1,284 @@
+"""Keep track of who is playing what, and where.
+
+A `Session` is reserved for the players of a game before it starts, from the
+challenge until the game ends. Reserving and releasing never await, so they
+are atomic on the event loop, and a session used as a context manager is
+released even if the game raises.
+
+Before a game starts, its session is admitted by the registry, which limits
+how many games run at once in total, per guild and per game. Games that are
+heavy on the CPU also share a weighted budget. Sessions that do not fit wait
+in a queue until enough running games end.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+__all__ = ('Session', 'SessionRegistry')
+
+
+class Session:
+    """The players of one game, reserved in a `SessionRegistry`."""
+
+    def __init__(
+        self,
+        registry: SessionRegistry,
+        game: str,
+        guild_id: Optional[int],
+        channel_id: int,
+    ) -> None:
+        self.registry = registry
+        self.game = game
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.players: list[int] = []
+        self.game_id: Optional[int] = None
+        self.started = time.time()
+        self.weight = 0
+        self.admitted = False
+
+    def __enter__(self) -> Session:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.release()
+
+    def __repr__(self) -> str:
+        return (
+            f'<Session game={self.game!r} game_id={self.game_id} '
+            f'channel={self.channel_id} players={self.players}>'
+        )
+
+    @property
+    def active(self) -> bool:
+        return self in self.registry.in_channel(self.channel_id)
+
+    def add(self, user_id: int) -> bool:
+        """Reserve another player, returns False if they are already playing."""
+        return self.registry._add_player(self, user_id)
+
+    def release(self) -> None:
+        """Free every player of the session. Releasing twice does nothing."""
+        self.registry._release(self)
+
+
+class SessionRegistry:
+    """Running sessions, indexed by user, channel and guild.
+
+    Limits that are None are not enforced. `per_game` maps game names to the
+    number of those games that may run at once, and `heavy_budget` is the total
+    weight of the admitted sessions that have a weight.
+    """
+
+    default_duration = 900.0
+    """Seconds a game is assumed to last before any of its kind has ended."""
+
+    def __init__(
+        self,
+        *,
+        total: Optional[int] = None,
+        per_guild: Optional[int] = None,
+        per_game: Optional[dict[str, int]] = None,
+        heavy_budget: Optional[int] = None,
+    ) -> None:
+        self.total = total
+        self.per_guild = per_guild
+        self.per_game = per_game or {}
+        self.heavy_budget = heavy_budget
+
+        self._by_user: dict[int, Session] = {}
+        self._by_channel: dict[int, set[Session]] = {}
+        self._by_guild: dict[Optional[int], set[Session]] = {}
+
+        self._admitted = 0
+        self._admitted_by_guild: dict[Optional[int], int] = {}
+        self._admitted_by_game: dict[str, int] = {}
+        self._weight = 0
+        self._queue: list[tuple[Session, asyncio.Future[bool]]] = []
+        self._durations: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return sum(len(sessions) for sessions in self._by_channel.values())
+
+    def __iter__(self) -> Iterator[Session]:
+        for sessions in self._by_channel.values():
+            yield from sessions
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._by_user
+
+    def get(self, user_id: int) -> Optional[Session]:
+        """The session a user is playing in."""
+        return self._by_user.get(user_id)
+
+    def in_channel(self, channel_id: int) -> set[Session]:
+        return self._by_channel.get(channel_id, set())
+
+    def in_guild(self, guild_id: Optional[int]) -> set[Session]:
+        return self._by_guild.get(guild_id, set())
+
+    def count(self, guild_id: Optional[int]) -> int:
+        """Number of sessions in a guild."""
+        return len(self._by_guild.get(guild_id, ()))
+
+    def reserve(
+        self,
+        players: Iterable[int],
+        *,
+        game: str,
+        guild_id: Optional[int],
+        channel_id: int,
+    ) -> Optional[Session]:
+        """Reserve a session for `players`.
+
+        Returns None, reserving nobody, if any of them is already playing.
+        """
+        players = list(players)
+        if any(p in self._by_user for p in players):
+            return None
+        session = Session(self, game, guild_id, channel_id)
+        self._by_channel.setdefault(channel_id, set()).add(session)
+        self._by_guild.setdefault(guild_id, set()).add(session)
+        for player in players:
+            self._add_player(session, player)
+        return session
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def weight(self) -> int:
+        """Weight of the admitted sessions."""
+        return self._weight
+
+    def fits(self, session: Session) -> bool:
+        """Whether `session` can be admitted without going over a limit."""
+        return not (
+            (self.total is not None and self._admitted >= self.total)
+            or (
+                self.per_guild is not None
+                and self._admitted_by_guild.get(session.guild_id, 0) >= self.per_guild
+            )
+            or (
+                session.game in self.per_game
+                and self._admitted_by_game.get(session.game, 0)
+                >= self.per_game[session.game]
+            )
+            or (
+                self.heavy_budget is not None
+                and session.weight
+                and self._weight
+                and self._weight + session.weight > self.heavy_budget
+            )
+        )
+
+    def estimated_wait(self, position: int, game: str) -> float:
+        """Seconds until the session at `position` in the queue is admitted,
+        assuming running games end at the usual rate."""
+        duration = self._durations.get(game, self.default_duration)
+        return duration * position / max(self._admitted, 1)
+
+    async def admit(
+        self,
+        session: Session,
+        weight: int = 0,
+        *,
+        on_queued: Optional[Callable[[int, float], object]] = None,
+        force: bool = False,
+    ) -> bool:
+        """Admit `session`, waiting in the queue while it does not fit.
+
+        `on_queued` is called with the queue position and estimated wait in
+        seconds if the session has to wait. With `force`, the session is admitted
+        even if it goes over the limits, like games that are resumed.
+
+        Returns False if the session was released while it waited.
+        """
+        session.weight = weight
+        if force or (not self._queue and self.fits(session)):
+            self._admit(session)
+            return True
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self._queue.append((session, future))
+        if on_queued is not None:
+            result = on_queued(
+                len(self._queue), self.estimated_wait(len(self._queue), session.game)
+            )
+            if asyncio.iscoroutine(result):
+                await result
+        try:
+            return await future
+        finally:
+            if (session, future) in self._queue:
+                self._queue.remove((session, future))
+
+    def _admit(self, session: Session) -> None:
+        session.admitted = True
+        session.started = time.time()
+        self._admitted += 1
+        self._admitted_by_guild[session.guild_id] = (
+            self._admitted_by_guild.get(session.guild_id, 0) + 1
+        )
+        self._admitted_by_game[session.game] = (
+            self._admitted_by_game.get(session.game, 0) + 1
+        )
+        self._weight += session.weight
+
+    def _unadmit(self, session: Session) -> None:
+        session.admitted = False
+        self._admitted -= 1
+        self._admitted_by_guild[session.guild_id] -= 1
+        self._admitted_by_game[session.game] -= 1
+        self._weight -= session.weight
+        elapsed = time.time() - session.started
+        previous = self._durations.get(session.game)
+        self._durations[session.game] = (
+            elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+        )
+        self._wake()
+
+    def _wake(self) -> None:
+        """Admit the queued sessions that fit, in queue order."""
+        for session, future in tuple(self._queue):
+            if future.done():
+                continue
+            if self.fits(session):
+                self._queue.remove((session, future))
+                self._admit(session)
+                future.set_result(True)
+
+    def clear(self) -> None:
+        for session in list(self):
+            session.release()
+
+    def _add_player(self, session: Session, user_id: int) -> bool:
+        if user_id in self._by_user or not session.active:
+            return False
+        self._by_user[user_id] = session
+        session.players.append(user_id)
+        return True
+
+    def _release(self, session: Session) -> None:
+        sessions = self._by_channel.get(session.channel_id)
+        if not sessions or session not in sessions:
+            return
+        sessions.discard(session)
+        if not sessions:
+            del self._by_channel[session.channel_id]
+        guild_sessions = self._by_guild[session.guild_id]
+        guild_sessions.discard(session)
+        if not guild_sessions:
+            del self._by_guild[session.guild_id]
+        for player in session.players:
+            if self._by_user.get(player) is session:
+                del self._by_user[player]
+        if session.admitted:
+            self._unadmit(session)
+        for queued, future in tuple(self._queue):
+            if queued is session:
+                self._queue.remove((queued, future))
+                if not future.done():
+                    future.set_result(False)
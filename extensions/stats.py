@@ -0,0 +1,145 @@
+"""Statistics of players, per game, kept up to date as results are written.
+
+Besides wins, losses and ties, every player has a streak for each game, which
+is the number of games won in a row, or lost in a row if it is negative, and
+the longest winning streak so far. The total length of the games that have a
+known start is kept to average it, and the most played opponents are kept with
+the number of games against each.
+
+The number of games against every opponent is kept as well, so the most played
+opponents stay exact: a count only grows, so an opponent can only enter the
+most played when their count grows, which is when they are checked.
+
+`StatsBook` holds the statistics of many players in memory while a batch of
+results is applied, like `RatingBook`.
+"""
+from __future__ import annotations
+
+from typing import Iterator, Optional
+
+__all__ = ('TOP_OPPONENTS', 'PlayerStats', 'StatsBook')
+
+TOP_OPPONENTS = 3
+"""Most played opponents kept for every player and game."""
+
+
+class PlayerStats:
+    """The streaks, game lengths and most played opponents of a player in one
+    game. `opponents` are pairs of the id of an opponent and the number of games
+    against them, most games first."""
+
+    __slots__ = ('streak', 'best_streak', 'timed', 'time', 'opponents')
+
+    def __init__(
+        self,
+        streak: int = 0,
+        best_streak: int = 0,
+        timed: int = 0,
+        time: float = 0.0,
+        opponents: str = '',
+    ) -> None:
+        self.streak = streak
+        self.best_streak = best_streak
+        self.timed = timed
+        self.time = time
+        self.opponents = self.decode(opponents)
+
+    def __repr__(self) -> str:
+        return (
+            f'<PlayerStats streak={self.streak} best_streak={self.best_streak} '
+            f'timed={self.timed} opponents={self.opponents}>'
+        )
+
+    @property
+    def average_time(self) -> Optional[float]:
+        return self.time / self.timed if self.timed else None
+
+    @staticmethod
+    def decode(opponents: str) -> list[tuple[int, int]]:
+        """Read the opponents as saved, like '42:10,7:3'."""
+        return [
+            (int(user), int(games))
+            for user, games in (
+                pair.split(':') for pair in opponents.split(',') if pair
+            )
+        ]
+
+    def encode(self) -> str:
+        return ','.join(f'{user}:{games}' for user, games in self.opponents)
+
+    def record(
+        self, score: int, length: Optional[float], opponent: int, against: int
+    ) -> None:
+        """Add a game to the statistics. `score` is 1 for a win, -1 for a loss and
+        0 for a tie, `length` is in seconds, and `against` is the number of games
+        against the opponent, this one included."""
+        if score > 0:
+            self.streak = self.streak + 1 if self.streak > 0 else 1
+            self.best_streak = max(self.best_streak, self.streak)
+        elif score < 0:
+            self.streak = self.streak - 1 if self.streak < 0 else -1
+        else:
+            self.streak = 0
+        if length is not None:
+            self.timed += 1
+            self.time += length
+        others = [pair for pair in self.opponents if pair[0] != opponent]
+        others.append((opponent, against))
+        others.sort(key=lambda pair: (-pair[1], pair[0]))
+        self.opponents = others[:TOP_OPPONENTS]
+
+
+class StatsBook:
+    """Statistics of players by player and game, and the number of games between
+    every two players."""
+
+    def __init__(self) -> None:
+        self._stats: dict[tuple[int, str], PlayerStats] = {}
+        self._against: dict[tuple[int, str, int], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def __iter__(self) -> Iterator[tuple[int, str, int, int, int, float, str]]:
+        """The id, game, streak, best streak, number of timed games, their total
+        length and the most played opponents of every player."""
+        for (user, game), stats in self._stats.items():
+            yield (
+                user,
+                game,
+                stats.streak,
+                stats.best_streak,
+                stats.timed,
+                stats.time,
+                stats.encode(),
+            )
+
+    def against(self) -> Iterator[tuple[int, str, int, int]]:
+        """The id, game, opponent and number of games of every pair of players."""
+        for (user, game, opponent), games in self._against.items():
+            yield user, game, opponent, games
+
+    def set(self, user: int, game: str, stats: PlayerStats) -> None:
+        self._stats[user, game] = stats
+
+    def set_against(self, user: int, game: str, opponent: int, games: int) -> None:
+        self._against[user, game, opponent] = games
+
+    def get(self, user: int, game: str) -> PlayerStats:
+        return self._stats.setdefault((user, game), PlayerStats())
+
+    def play(
+        self,
+        game: str,
+        winner: int,
+        loser: int,
+        tie: bool = False,
+        length: Optional[float] = None,
+    ) -> None:
+        """Apply the result of a game."""
+        for user, opponent, score in ((winner, loser, 1), (loser, winner, -1)):
+            key = (user, game, opponent)
+            self._against[key] = self._against.get(key, 0) + 1
+            self.get(user, game).record(
+                0 if tie else score, length, opponent, self._against[key]
+            )
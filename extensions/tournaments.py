@@ -0,0 +1,263 @@
+"""Pair the players of Swiss and round-robin tournaments.
+
+`Standings` holds the players of a tournament and every pairing with its
+result, which is all that is needed to rank players and pair the next round.
+It is saved as one database row per player and per pairing, and built again
+from those rows when a tournament is loaded.
+
+Results of a pairing are '1' if the first player won, '2' if the second won,
+'=' for a draw, and '0' if both lost, like when neither showed up. The first
+player moves first. A pairing without a second player is a bye, worth a win.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+from typing import Iterable, Iterator, Optional, cast
+
+__all__ = ('Pairing', 'Standings', 'round_robin_schedule')
+
+POINTS = {'1': (1.0, 0.0), '2': (0.0, 1.0), '=': (0.5, 0.5), '0': (0.0, 0.0)}
+
+
+class Pairing:
+    """Two players in a round, or one player with a bye."""
+
+    __slots__ = ('round', 'first', 'second', 'result', 'game_id')
+
+    def __init__(
+        self,
+        round: int,
+        first: int,
+        second: Optional[int],
+        result: Optional[str] = None,
+        game_id: Optional[int] = None,
+    ) -> None:
+        self.round = round
+        self.first = first
+        self.second = second
+        self.result = result
+        self.game_id = game_id
+
+    def __repr__(self) -> str:
+        return (
+            f'<Pairing round={self.round} first={self.first} '
+            f'second={self.second} result={self.result}>'
+        )
+
+    @property
+    def players(self) -> tuple[int, ...]:
+        return (self.first,) if self.second is None else (self.first, self.second)
+
+    def opponent(self, player: int) -> Optional[int]:
+        return self.second if player == self.first else self.first
+
+    def points(self, player: int) -> float:
+        if self.result is None:
+            return 0.0
+        return POINTS[self.result][player != self.first]
+
+
+class Standings:
+    """The players and pairings of a tournament.
+
+    Scores and the rounds each player still has to play are updated as results
+    are recorded, so checking whether a pairing can start is cheap even with
+    thousands of pairings.
+    """
+
+    def __init__(self, players: Iterable[int] = ()) -> None:
+        self.players: list[int] = []
+        self.withdrawn: set[int] = set()
+        self.pairings: list[Pairing] = []
+        self._by_player: dict[int, list[Pairing]] = {}
+        self._scores: dict[int, float] = {}
+        self._pending: dict[int, list[int]] = {}
+        self._met: set[frozenset[int]] = set()
+        for player in players:
+            self.add_player(player)
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def __contains__(self, player: int) -> bool:
+        return player in self._scores
+
+    @property
+    def active(self) -> list[int]:
+        """Players that have not withdrawn."""
+        return [p for p in self.players if p not in self.withdrawn]
+
+    @property
+    def round(self) -> int:
+        """The last round that has been paired."""
+        return self.pairings[-1].round if self.pairings else 0
+
+    def add_player(self, player: int) -> bool:
+        """Returns False if the player is already registered."""
+        if player in self._scores:
+            self.withdrawn.discard(player)
+            return False
+        self.players.append(player)
+        self._by_player[player] = []
+        self._scores[player] = 0.0
+        self._pending[player] = []
+        return True
+
+    def withdraw(self, player: int) -> None:
+        self.withdrawn.add(player)
+
+    def add_pairing(self, pairing: Pairing) -> None:
+        self.pairings.append(pairing)
+        for player in pairing.players:
+            self._by_player[player].append(pairing)
+            if pairing.result is None:
+                bisect.insort(self._pending[player], pairing.round)
+            else:
+                self._scores[player] += pairing.points(player)
+        if pairing.second is not None:
+            self._met.add(frozenset(pairing.players))
+
+    def record(self, pairing: Pairing, result: str) -> None:
+        """Set the result of a pairing that has none yet."""
+        assert pairing.result is None
+        pairing.result = result
+        for player in pairing.players:
+            self._scores[player] += pairing.points(player)
+            self._pending[player].remove(pairing.round)
+
+    def in_round(self, round: int) -> list[Pairing]:
+        return [p for p in self.pairings if p.round == round]
+
+    def of(self, player: int) -> list[Pairing]:
+        return self._by_player[player]
+
+    def score(self, player: int) -> float:
+        return self._scores[player]
+
+    def buchholz(self, player: int) -> float:
+        """Sum of the scores of the opponents of a player."""
+        return sum(
+            self._scores[opponent]
+            for p in self._by_player[player]
+            if (opponent := p.opponent(player)) is not None
+        )
+
+    def sonneborn_berger(self, player: int) -> float:
+        """Sum of the scores of the opponents of a player, weighted by the
+        points the player took from each."""
+        return sum(
+            self._scores[opponent] * p.points(player)
+            for p in self._by_player[player]
+            if (opponent := p.opponent(player)) is not None
+        )
+
+    def ranking(self) -> list[int]:
+        """Players by score, then Buchholz, then Sonneborn-Berger."""
+        return sorted(
+            self.players,
+            key=lambda p: (self.score(p), self.buchholz(p), self.sonneborn_berger(p)),
+            reverse=True,
+        )
+
+    def ready(self, pairing: Pairing) -> bool:
+        """Whether both players of a pairing have played every earlier round."""
+        return all(self._pending[p][0] >= pairing.round for p in pairing.players)
+
+    def firsts(self, player: int) -> int:
+        """Number of games a player moved first in, minus the games they moved
+        second in."""
+        return sum(
+            1 if p.first == player else -1
+            for p in self._by_player[player]
+            if p.second is not None
+        )
+
+    def swiss_rounds(self) -> int:
+        """Rounds needed to find a single winner."""
+        return max(1, math.ceil(math.log2(max(len(self.active), 2))))
+
+    def pair_swiss(self, round: int, *, budget: int = 20_000) -> list[Pairing]:
+        """Pair the next Swiss round.
+
+        Players are paired within their score group, the top half against the
+        bottom half, and never against someone they already played, unless
+        `budget` tries of the search run out first. If there is an odd number of
+        players, the lowest ranked player that has not had a bye gets one.
+        """
+        players = [p for p in self.ranking() if p not in self.withdrawn]
+        byes: list[Pairing] = []
+        if len(players) % 2:
+            had_bye = {p.first for p in self.pairings if p.second is None}
+            bye = next((p for p in reversed(players) if p not in had_bye), players[-1])
+            players.remove(bye)
+            byes.append(Pairing(round, bye, None, '1'))
+
+        pairs = self._pair(players, [budget])
+        if pairs is None:
+            pairs = list(zip(players[::2], players[1::2]))
+        return [self._colored(round, a, b) for a, b in pairs] + byes
+
+    def _pair(
+        self, players: list[int], tries: list[int]
+    ) -> Optional[list[tuple[int, int]]]:
+        if not players:
+            return []
+        tries[0] -= 1
+        if tries[0] < 0:
+            return None
+        top, rest = players[0], players[1:]
+        for k in self._candidates(top, rest):
+            other = rest[k]
+            if frozenset((top, other)) in self._met:
+                continue
+            pairs = self._pair(rest[:k] + rest[k + 1 :], tries)
+            if pairs is not None:
+                return [(top, other), *pairs]
+            if tries[0] < 0:
+                return None
+        return None
+
+    def _candidates(self, top: int, rest: list[int]) -> Iterator[int]:
+        """Indexes of `rest` to try as the opponent of `top`, the player half way
+        down the score group of `top` first."""
+        group = 0
+        while group < len(rest) and self.score(rest[group]) == self.score(top):
+            group += 1
+        half = group // 2
+        yield from range(half, group)
+        yield from range(half - 1, -1, -1)
+        yield from range(group, len(rest))
+
+    def _colored(self, round: int, a: int, b: int) -> Pairing:
+        """Pair two players, the one that moved first less often moving first."""
+        if self.firsts(a) > self.firsts(b):
+            a, b = b, a
+        return Pairing(round, a, b)
+
+
+def round_robin_schedule(players: list[int]) -> list[Pairing]:
+    """Pair every player against every other, one game per round.
+
+    Uses the circle method. In each pairing, the player that moved first less
+    often so far moves first.
+    """
+    seats: list[Optional[int]] = list(players)
+    if len(seats) % 2:
+        seats.append(None)
+    n = len(seats)
+    firsts = dict.fromkeys(players, 0)
+    pairings: list[Pairing] = []
+    for round in range(1, n):
+        for k in range(n // 2):
+            a, b = seats[k], seats[n - 1 - k]
+            if a is None or b is None:
+                pairings.append(Pairing(round, cast(int, a or b), None, '1'))
+                continue
+            if firsts[a] > firsts[b] or firsts[a] == firsts[b] and round % 2:
+                a, b = b, a
+            firsts[a] += 1
+            firsts[b] -= 1
+            pairings.append(Pairing(round, a, b))
+        seats.insert(1, seats.pop())
+    return pairings
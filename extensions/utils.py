@@ -1,14 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import datetime
+import os
+import pathlib
+import time
+from collections import Counter
 from itertools import zip_longest
-from typing import TYPE_CHECKING, Any, Callable, Sequence, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Sequence,
+    cast,
+)
 
 import aiosqlite
 import config
 import discord
 from discord.ext import commands
 
+from .archive import move_width, unpack_moves
+from .querystats import QueryStats, TimedCursor, timed
+from .ratings import RatingBook
+from .stats import PlayerStats, StatsBook
+
 if TYPE_CHECKING:
     from vesuvius import Vesuvius
 
@@ -139,158 +158,1053 @@ class _TimeZoneInfo(datetime.tzinfo):
 
 tzi = _TimeZoneInfo()
 
+PROGRESS_STEPS = 1000
+"""Virtual machine instructions between checks of the time budget of a query."""
+
+RECOMPUTE_CHUNK = 5000
+"""Matches read at once when ratings or statistics are computed from every
+match."""
+
+LEADERBOARD_UPSERT = (
+    'ON CONFLICT DO UPDATE SET wins = wins + excluded.wins, '
+    'losses = losses + excluded.losses, ties = ties + excluded.ties'
+)
+
 
+@timed
 class Database:
-    def __init__(self, con: aiosqlite.Connection, csr: aiosqlite.Cursor) -> None:
-        self.connection = con
-        self.cursor = csr
+    """The database of the bot, in WAL mode.
+
+    Writes go through one connection, one transaction at a time. Reads use a
+    pool of other connections, opened read-only, each running in its own
+    thread, so they run alongside writes and each other and only see committed
+    data. Every operation uses its own cursor, and is timed in `query_stats`.
+    """
+
+    def __init__(
+        self,
+        connection: aiosqlite.Connection,
+        readers: Sequence[aiosqlite.Connection] = (),
+        *,
+        slow_query: float = 0.1,
+    ) -> None:
+        self.connection = connection
+        self.query_stats = QueryStats(threshold=slow_query)
+        self.readers = list(readers)
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        for reader in self.readers:
+            self._idle.put_nowait(reader)
+        self._write_lock = asyncio.Lock()
+        # bumped for every game when its results change, to invalidate caches
+        self.result_versions: Counter[str] = Counter()
+        self._channels: dict[int, tuple[int, int, int, int]] = {}
+        self._general: list[int] = []
+        self._announcements: list[int] = []
 
     def __str__(self) -> str:
-        return f'{self.connection} {self.cursor}'
+        return f'{self.connection} with {len(self.readers)} readers'
+
+    @classmethod
+    async def connect(
+        cls,
+        path: str | os.PathLike[str],
+        *,
+        readers: int = 4,
+        slow_query: float = 0.1,
+    ) -> Database:
+        """Open the writer and `readers` reader connections of a database.
+        Statements slower than `slow_query` seconds are logged."""
+        connection = await aiosqlite.connect(path)
+        await connection.execute('PRAGMA journal_mode=WAL')
+        await connection.execute('PRAGMA synchronous=NORMAL')
+        await connection.execute('PRAGMA busy_timeout=5000')
+        # opened read-only, unlike `query_only` no statement can undo that
+        uri = f'{pathlib.Path(path).absolute().as_uri()}?mode=ro'
+        pool = []
+        for _ in range(readers):
+            reader = await aiosqlite.connect(uri, uri=True)
+            await reader.execute('PRAGMA busy_timeout=5000')
+            pool.append(reader)
+        return cls(connection, pool, slow_query=slow_query)
+
+    async def close(self) -> None:
+        for reader in self.readers:
+            await reader.close()
+        await self.connection.close()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self) -> AsyncIterator[TimedCursor]:
+        """A cursor of the writer, committed when the block ends and rolled back
+        if it raises."""
+        async with self._write_lock:
+            cursor = TimedCursor(
+                self.connection, await self.connection.cursor(), self.query_stats
+            )
+            try:
+                yield cursor
+            except BaseException:
+                await self.connection.rollback()
+                raise
+            else:
+                await self.connection.commit()
+            finally:
+                await cursor.close()
+
+    @contextlib.asynccontextmanager
+    async def reading(self) -> AsyncIterator[TimedCursor]:
+        """A cursor of an idle reader, or of the writer if there are no
+        readers."""
+        if not self.readers:
+            cursor = TimedCursor(
+                self.connection, await self.connection.cursor(), self.query_stats
+            )
+            try:
+                yield cursor
+            finally:
+                await cursor.close()
+            return
+        reader = await self._idle.get()
+        try:
+            cursor = TimedCursor(reader, await reader.cursor(), self.query_stats)
+            try:
+                yield cursor
+            finally:
+                await cursor.close()
+        finally:
+            self._idle.put_nowait(reader)
+
+    @contextlib.asynccontextmanager
+    async def raw_query(
+        self, sql: str, *, write: bool = False, budget: float = 10.0
+    ) -> AsyncIterator[TimedCursor]:
+        """Execute a statement, and yield its cursor to fetch the rows from.
+
+        Unless `write`, it runs where it cannot change anything: on a reader, or
+        on the writer with `query_only` on if there are no readers, and turned
+        off again after it. It is interrupted with an `sqlite3.OperationalError`
+        once `budget` seconds have passed, fetching the rows included, and a
+        write is then rolled back.
+        """
+        deadline = time.perf_counter() + budget
+        read_only = not write and not self.readers
+        context = self.transaction() if write or read_only else self.reading()
+        async with context as cursor:
+            if read_only:
+                await cursor.execute('PRAGMA query_only=ON')
+            await cursor.connection.set_progress_handler(
+                lambda: time.perf_counter() > deadline, PROGRESS_STEPS
+            )
+            try:
+                await cursor.execute(sql)
+                yield cursor
+            finally:
+                await cursor.connection.set_progress_handler(None, 0)  # type: ignore
+                if read_only:
+                    await cursor.execute('PRAGMA query_only=OFF')
+                elif not write and cursor.connection.in_transaction:
+                    # a refused write leaves a transaction open on the reader,
+                    # which would keep it reading this snapshot
+                    await cursor.connection.rollback()
+
+    async def add_matches(
+        self, matches: Sequence[tuple[str, int, int, bool, int | None, float]]
+    ):
+        """add the game, winner, loser, whether it was a tie, game id and end time
+        of finished games to 'matches' and count them in 'user_games' and
+        'leaderboard', in one transaction. the guild and start time are taken
+        from the archive"""
+        counts = [
+            (game, user, *count, game_id)
+            for game, winner, loser, tie, game_id, _ in matches
+            for user, count in (
+                (winner, (int(not tie), 0, int(tie))),
+                (loser, (0, int(not tie), int(tie))),
+            )
+        ]
+        async with self.transaction() as cursor:
+            await cursor.executemany(
+                'INSERT INTO matches (game, winner, loser, tie, game_id, guild, '
+                'started, ended) VALUES (?1, ?2, ?3, ?4, ?5, '
+                '(SELECT guild FROM games WHERE game_id=?5), '
+                '(SELECT started FROM games WHERE game_id=?5), ?6)',
+                matches,
+            )
+            await cursor.executemany(
+                'INSERT INTO user_games (user_id, game, wins, losses, ties) '
+                'VALUES (?2, ?1, ?3, ?4, ?5) '
+                'ON CONFLICT DO UPDATE SET wins = wins + excluded.wins, '
+                'losses = losses + excluded.losses, ties = ties + excluded.ties',
+                [row[:5] for row in counts],
+            )
+            # every player is counted in the leaderboards of the game and of
+            # all games, globally and in the guild the game was played in
+            scoped = [(name, *row[1:]) for row in counts for name in (row[0], 'all')]
+            await cursor.executemany(
+                'INSERT INTO leaderboard VALUES (0, ?1, ?2, ?3, ?4, ?5) '
+                f'{LEADERBOARD_UPSERT}',
+                [row[:5] for row in scoped],
+            )
+            await cursor.executemany(
+                'INSERT INTO leaderboard SELECT guild, ?1, ?2, ?3, ?4, ?5 FROM games '
+                f'WHERE game_id=?6 AND guild IS NOT NULL {LEADERBOARD_UPSERT}',
+                [row for row in scoped if row[5] is not None],
+            )
+            await self._record_stats(cursor, matches)
+            await self._rate(cursor, matches)
+        self.result_versions.update(
+            name for match in matches for name in (match[0], 'all')
+        )
 
-    async def set_games_winloss(
-        self, winner_id: int, loser_id: int, game: str, tie: bool = False
+    @staticmethod
+    async def _record_stats(
+        cursor: TimedCursor,
+        matches: Sequence[tuple[str, int, int, bool, int | None, float]],
     ):
-        indexdict = {
-            'tictactoe': [1, 2, 3],
-            'connectfour': [4, 5, 6],
-            'reversi': [7, 8, 9],
-            'weiqi': [10, 11, 12],
-            'battleship': [13, 14],
-        }
-        game_rows = indexdict[game]
-        await self.cursor.execute(
-            'INSERT INTO userwins VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(user_id) DO NOTHING',
-            (winner_id, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+        """update the streaks, game lengths and opponents of the players of
+        finished games, after they are counted in 'user_games'"""
+        book = StatsBook()
+        for key in {(user, m[0]) for m in matches for user in (m[1], m[2])}:
+            await cursor.execute(
+                'SELECT streak, best_streak, timed, time, opponents FROM user_games '
+                'WHERE user_id=? AND game=?',
+                key,
+            )
+            book.set(*key, PlayerStats(*await cursor.fetchone()))  # type: ignore
+        for key in {
+            (user, m[0], opponent)
+            for m in matches
+            for user, opponent in ((m[1], m[2]), (m[2], m[1]))
+        }:
+            await cursor.execute(
+                'SELECT games FROM user_opponents '
+                'WHERE user_id=? AND game=? AND opponent=?',
+                key,
+            )
+            row = await cursor.fetchone()
+            if row is not None:
+                book.set_against(*key, row[0])
+        game_ids = [m[4] for m in matches if m[4] is not None]
+        await cursor.execute(
+            'SELECT game_id, started FROM games WHERE started IS NOT NULL AND '
+            f'game_id IN ({", ".join("?" * len(game_ids))})',
+            game_ids,
         )
-        await self.cursor.execute(
-            'INSERT INTO userwins VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(user_id) DO NOTHING',
-            (loser_id, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+        started = dict(await cursor.fetchall())  # type: ignore
+        for game, winner, loser, tie, game_id, ended in matches:
+            length = ended - started[game_id] if game_id in started else None
+            book.play(game, winner, loser, tie, length)
+        await cursor.executemany(
+            'UPDATE user_games SET streak=?3, best_streak=?4, timed=?5, time=?6, '
+            'opponents=?7 WHERE user_id=?1 AND game=?2',
+            list(book),
         )
-        winnerpast = await self.get_user_winloss(winner_id)
-        loserpast = await self.get_user_winloss(loser_id)
-        if not tie:
-            await self.cursor.execute(
-                f'UPDATE userwins SET {game}_wins=? WHERE user_id=?',
-                (winnerpast[game_rows[0]] + 1, winner_id),
-            )
-            await self.cursor.execute(
-                f'UPDATE userwins SET {game}_loss=? WHERE user_id=?',
-                (loserpast[game_rows[1]] + 1, loser_id),
-            )
-            await self.connection.commit()
-        else:
-            await self.cursor.execute(
-                f'UPDATE userwins SET {game}_ties=? WHERE user_id=?',
-                (winnerpast[game_rows[2]] + 1, winner_id),
+        await cursor.executemany(
+            'INSERT OR REPLACE INTO user_opponents VALUES (?, ?, ?, ?)',
+            list(book.against()),
+        )
+
+    @staticmethod
+    async def _fill_stats(cursor: TimedCursor):
+        """compute the streaks, game lengths and opponents of every player from
+        'matches', for when 'user_games' did not have them yet"""
+        book = StatsBook()
+        await cursor.execute(
+            'SELECT game, winner, loser, tie, ended - started FROM matches '
+            'ORDER BY match_id'
+        )
+        while rows := await cursor.fetchmany(RECOMPUTE_CHUNK):
+            for row in rows:
+                book.play(*row)
+        await cursor.executemany(
+            'UPDATE user_games SET streak=?3, best_streak=?4, timed=?5, time=?6, '
+            'opponents=?7 WHERE user_id=?1 AND game=?2',
+            list(book),
+        )
+        await cursor.execute('DELETE FROM user_opponents')
+        await cursor.executemany(
+            'INSERT INTO user_opponents VALUES (?, ?, ?, ?)', list(book.against())
+        )
+
+    @staticmethod
+    async def _rate(
+        cursor: TimedCursor,
+        matches: Sequence[tuple[str, int, int, bool, int | None, float]],
+    ):
+        """update the ratings of the players of finished games"""
+        book = RatingBook()
+        for key in {(user, m[0]) for m in matches for user in (m[1], m[2])}:
+            await cursor.execute(
+                'SELECT rating, games FROM ratings WHERE user_id=? AND game=?', key
             )
-            await self.cursor.execute(
-                f'UPDATE userwins SET {game}_ties=? WHERE user_id=?',
-                (loserpast[game_rows[2]] + 1, loser_id),
+            row = await cursor.fetchone()
+            if row is not None:
+                book.set(*key, *row)
+        for game, winner, loser, tie, _, _ in matches:
+            book.play(game, winner, loser, tie)
+        await cursor.executemany(
+            'INSERT OR REPLACE INTO ratings VALUES (?, ?, ?, ?)', list(book)
+        )
+
+    async def recompute_ratings(self) -> tuple[int, int]:
+        """compute every rating again from 'matches', in the order the games
+        were recorded, and return the number of matches and of ratings. the
+        matches are read in chunks, and results wait until it is done"""
+        book = RatingBook()
+        numof_matches = 0
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'SELECT game, winner, loser, tie FROM matches ORDER BY match_id'
+            )
+            while rows := await cursor.fetchmany(RECOMPUTE_CHUNK):
+                for game, winner, loser, tie in rows:
+                    book.play(game, winner, loser, tie)
+                numof_matches += len(rows)  # type: ignore
+            await cursor.execute('DELETE FROM ratings')
+            await cursor.executemany(
+                'INSERT INTO ratings VALUES (?, ?, ?, ?)', list(book)
             )
-            await self.connection.commit()
+        return numof_matches, len(book)
 
-    async def get_games_winloss(self) -> list[tuple[int, ...]]:
-        await self.cursor.execute('SELECT * FROM userwins')
-        return cast(list[tuple[int, ...]], await self.cursor.fetchall())
+    async def get_games_winloss(self) -> list[tuple[int, str, int, int, int]]:
+        """get the id, game, wins, losses and ties of every player in every game
+        they played"""
+        async with self.reading() as cursor:
+            await cursor.execute('SELECT * FROM user_games')
+            return cast(list[tuple[int, str, int, int, int]], await cursor.fetchall())
 
-    async def get_user_winloss(self, uid: int) -> tuple[int, ...]:
-        await self.cursor.execute('SELECT * FROM userwins WHERE user_id=?', (uid,))
-        return cast(tuple[int, ...], await self.cursor.fetchone())
+    async def get_user_winloss(self, uid: int) -> list[tuple[str, int, int, int]]:
+        """get the game, wins, losses and ties of every game a player played"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT game, wins, losses, ties FROM user_games WHERE user_id=?',
+                (uid,),
+            )
+            return cast(list[tuple[str, int, int, int]], await cursor.fetchall())
+
+    async def get_user_stats(
+        self, uid: int
+    ) -> list[tuple[str, int, int, int, float | None, PlayerStats]]:
+        """get the game, wins, losses, ties, rating and statistics of every game a
+        player played"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT game, wins, losses, ties, rating, streak, best_streak, timed, '
+                'time, opponents FROM user_games LEFT JOIN ratings '
+                'USING (user_id, game) WHERE user_id=? ORDER BY game',
+                (uid,),
+            )
+            return [
+                (*row[:5], PlayerStats(*row[5:])) for row in await cursor.fetchall()
+            ]
 
     async def create_games_table(self):
-        """create the table 'userwins'"""
-        await self.cursor.execute(
-            '''CREATE TABLE IF NOT EXISTS userwins (
-            user_id integer PRIMARY KEY,
-            tictactoe_wins integer,
-            tictactoe_loss integer,
-            tictactoe_ties integer,
-            connectfour_wins integer,
-            connectfour_loss integer,
-            connectfour_ties integer,
-            reversi_wins integer,
-            reversi_loss integer,
-            reversi_ties integer,
-            weiqi_wins integer,
-            weiqi_loss integer,
-            weiqi_ties integer,
-            battleship_wins integer,
-            battleship_loss integer
-            )'''
+        """create the tables 'matches' with the result of every game,
+        'user_games' with the wins, losses, ties and statistics of every player
+        in every game, 'user_opponents' with the games between every two players,
+        and 'leaderboard' with the counts per guild and for all games. the counts
+        of the old 'userwins' table are copied over the first time"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS matches (
+                match_id integer PRIMARY KEY,
+                game text,
+                winner integer,
+                loser integer,
+                tie integer,
+                game_id integer,
+                guild integer,
+                started real,
+                ended real
+                )'''
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS matches_winner ON matches (winner, ended)'
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS matches_loser ON matches (loser, ended)'
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS matches_game ON matches (game, ended)'
+            )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS user_games (
+                user_id integer,
+                game text,
+                wins integer,
+                losses integer,
+                ties integer,
+                streak integer DEFAULT 0,
+                best_streak integer DEFAULT 0,
+                timed integer DEFAULT 0,
+                time real DEFAULT 0,
+                opponents text DEFAULT '',
+                PRIMARY KEY (user_id, game)
+                ) WITHOUT ROWID'''
+            )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS user_opponents (
+                user_id integer,
+                game text,
+                opponent integer,
+                games integer,
+                PRIMARY KEY (user_id, game, opponent)
+                ) WITHOUT ROWID'''
+            )
+            await cursor.execute('SELECT name FROM pragma_table_info(\'user_games\')')
+            if ('streak',) not in await cursor.fetchall():
+                for column in (
+                    'streak integer DEFAULT 0',
+                    'best_streak integer DEFAULT 0',
+                    'timed integer DEFAULT 0',
+                    'time real DEFAULT 0',
+                    'opponents text DEFAULT \'\'',
+                ):
+                    await cursor.execute(f'ALTER TABLE user_games ADD COLUMN {column}')
+                await self._fill_stats(cursor)
+            await cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='userwins'"
+            )
+            if await cursor.fetchone() is not None:
+                await cursor.execute('SELECT 1 FROM user_games LIMIT 1')
+                if await cursor.fetchone() is None:
+                    for game in ('tictactoe', 'connectfour', 'reversi', 'weiqi'):
+                        await cursor.execute(
+                            'INSERT INTO user_games (user_id, game, wins, losses, '
+                            f'ties) SELECT user_id, \'{game}\', '
+                            f'{game}_wins, {game}_loss, {game}_ties FROM userwins'
+                        )
+                    await cursor.execute(
+                        'INSERT INTO user_games (user_id, game, wins, losses, ties) '
+                        'SELECT user_id, \'battleship\', '
+                        'battleship_wins, battleship_loss, 0 FROM userwins'
+                    )
+                    await cursor.execute(
+                        'DELETE FROM user_games WHERE wins + losses + ties = 0'
+                    )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS leaderboard (
+                scope integer,
+                game text,
+                user_id integer,
+                wins integer,
+                losses integer,
+                ties integer,
+                PRIMARY KEY (scope, game, user_id)
+                ) WITHOUT ROWID'''
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS leaderboard_rank '
+                'ON leaderboard (scope, game, wins DESC, losses, user_id)'
+            )
+            await cursor.execute('SELECT 1 FROM leaderboard LIMIT 1')
+            if await cursor.fetchone() is None:
+                await self._fill_leaderboard(cursor)
+
+    @staticmethod
+    async def _fill_leaderboard(cursor: TimedCursor):
+        """count every game played before 'leaderboard' existed. games before
+        'matches' existed only count globally"""
+        await cursor.execute(
+            'INSERT INTO leaderboard SELECT 0, game, user_id, wins, losses, ties '
+            'FROM user_games'
+        )
+        await cursor.execute(
+            'INSERT INTO leaderboard SELECT guild, game, user_id, SUM(wins), '
+            'SUM(losses), SUM(ties) FROM ('
+            'SELECT guild, game, winner AS user_id, NOT tie AS wins, 0 AS losses, '
+            'tie AS ties FROM matches WHERE guild IS NOT NULL UNION ALL '
+            'SELECT guild, game, loser, 0, NOT tie, tie FROM matches '
+            'WHERE guild IS NOT NULL) GROUP BY guild, game, user_id'
         )
-        await self.connection.commit()
+        await cursor.execute(
+            'INSERT INTO leaderboard SELECT scope, \'all\', user_id, SUM(wins), '
+            'SUM(losses), SUM(ties) FROM leaderboard GROUP BY scope, user_id'
+        )
+
+    async def get_leaderboard(
+        self, scope: int, game: str, limit: int = 10
+    ) -> list[tuple[int, int, int, int]]:
+        """get the id, wins, losses and ties of the best players of a game, or of
+        'all' games. `scope` is a guild id, or 0 for every guild"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT user_id, wins, losses, ties FROM leaderboard '
+                'WHERE scope=? AND game=? ORDER BY wins DESC, losses, user_id LIMIT ?',
+                (scope, game, limit),
+            )
+            return cast(list[tuple[int, int, int, int]], await cursor.fetchall())
+
+    async def get_leaderboard_rank(
+        self, scope: int, game: str, user: int
+    ) -> tuple[int, int, int, int] | None:
+        """get the rank, wins, losses and ties of a player in a leaderboard, None
+        if they are not in it"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT wins, losses, ties FROM leaderboard '
+                'WHERE scope=? AND game=? AND user_id=?',
+                (scope, game, user),
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                return None
+            wins, losses, ties = row
+            # three range searches, so only the rows ranked above the player are
+            # visited in the index
+            above = 'SELECT COUNT(*) FROM leaderboard WHERE scope=?1 AND game=?2 AND'
+            await cursor.execute(
+                f'SELECT ({above} wins > ?3) + ({above} wins = ?3 AND losses < ?4) + '
+                f'({above} wins = ?3 AND losses = ?4 AND user_id < ?5)',
+                (scope, game, wins, losses, user),
+            )
+            (above,) = cast(tuple[int], await cursor.fetchone())
+            return above + 1, wins, losses, ties
+
+    async def create_archive_tables(self):
+        """create the tables 'games' with one row per game, 'game_moves' with
+        the packed moves of every game, 'snapshots' with running games, and
+        'correspondence' with the clocks of correspondence games"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS games (
+                game_id integer PRIMARY KEY,
+                game text,
+                length integer,
+                player1 integer,
+                player2 integer,
+                guild integer,
+                channel integer,
+                started real,
+                ended real,
+                numof_moves integer
+                )'''
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS games_player1 ON games (player1, game_id)'
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS games_player2 ON games (player2, game_id)'
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS games_game ON games (game, game_id)'
+            )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS game_moves (
+                game_id integer,
+                batch integer,
+                moves blob,
+                PRIMARY KEY (game_id, batch)
+                ) WITHOUT ROWID'''
+            )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS snapshots (
+                game_id integer PRIMARY KEY,
+                data blob
+                )'''
+            )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS correspondence (
+                game_id integer PRIMARY KEY,
+                per_move real,
+                deadline real,
+                image integer,
+                end_request integer
+                )'''
+            )
+            await cursor.execute(
+                'CREATE INDEX IF NOT EXISTS correspondence_deadline '
+                'ON correspondence (deadline)'
+            )
+
+    async def add_archived_game(
+        self,
+        game: str,
+        length: int,
+        player1: int,
+        player2: int,
+        guild: int | None,
+        channel: int,
+    ) -> int:
+        """add the header row of a game that is starting and return its game id"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO games (game, length, player1, player2, guild, channel, '
+                'started, numof_moves) VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                (game, length, player1, player2, guild, channel, time.time()),
+            )
+            return cast(int, cursor.lastrowid)
+
+    async def add_archived_moves(self, game_id: int, batch: int, moves: bytes):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO game_moves VALUES (?, ?, ?)', (game_id, batch, moves)
+            )
+
+    async def end_archived_game(self, game_id: int, numof_moves: int):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'UPDATE games SET ended=?, numof_moves=? WHERE game_id=?',
+                (time.time(), numof_moves, game_id),
+            )
+            await cursor.execute('DELETE FROM snapshots WHERE game_id=?', (game_id,))
+
+    async def get_archived_progress(self, game_id: int) -> tuple[int, int, int]:
+        """get the board length, number of batches and number of moves written
+        for a game"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT length, COUNT(batch), TOTAL(LENGTH(moves)) FROM games '
+                'LEFT JOIN game_moves USING (game_id) WHERE game_id=?',
+                (game_id,),
+            )
+            length, numof_batches, numof_bytes = cast(
+                tuple[int, int, float], await cursor.fetchone()
+            )
+            return length, numof_batches, int(numof_bytes) // move_width(length)
+
+    async def set_snapshot(self, game_id: int, data: bytes):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO snapshots VALUES (?, ?) '
+                'ON CONFLICT(game_id) DO UPDATE SET data=excluded.data',
+                (game_id, data),
+            )
+
+    async def set_snapshots(self, snapshots: Sequence[tuple[int, bytes]]):
+        """set the snapshots of running games by game id, in one transaction.
+        games that have ended are skipped"""
+        async with self.transaction() as cursor:
+            await cursor.executemany(
+                'INSERT INTO snapshots SELECT game_id, ?2 FROM games '
+                'WHERE game_id=?1 AND ended IS NULL '
+                'ON CONFLICT(game_id) DO UPDATE SET data=excluded.data',
+                snapshots,
+            )
+
+    async def delete_snapshot(self, game_id: int):
+        async with self.transaction() as cursor:
+            await cursor.execute('DELETE FROM snapshots WHERE game_id=?', (game_id,))
+
+    async def get_snapshots(self) -> list[tuple[int, str, bytes]]:
+        """get the game id, game name and snapshot of every running game"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT game_id, game, data FROM snapshots JOIN games USING (game_id)'
+            )
+            return cast(list[tuple[int, str, bytes]], await cursor.fetchall())
+
+    async def add_correspondence(self, game_id: int, per_move: float, image: bool):
+        """make an archived game a correspondence game with `per_move` seconds
+        for every move"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO correspondence VALUES (?, ?, ?, ?, NULL)',
+                (game_id, per_move, time.time() + per_move, image),
+            )
+
+    async def get_correspondence(self, game_id: int) -> tuple[Any, ...] | None:
+        """get the game, length, player1, player2, channel, per_move, deadline,
+        image and end_request of a correspondence game"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT game, length, player1, player2, channel, per_move, deadline, '
+                'image, end_request FROM correspondence JOIN games USING (game_id) '
+                'WHERE game_id=?',
+                (game_id,),
+            )
+            return cast(tuple[Any, ...] | None, await cursor.fetchone())
+
+    async def add_correspondence_move(
+        self, game_id: int, index: int, move: bytes, deadline: float
+    ):
+        """write move number `index` of a correspondence game as its own batch,
+        and move the deadline"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO game_moves VALUES (?, ?, ?)', (game_id, index, move)
+            )
+            await cursor.execute(
+                'UPDATE correspondence SET deadline=?, end_request=NULL WHERE game_id=?',
+                (deadline, game_id),
+            )
+
+    async def set_correspondence_end_request(self, game_id: int, user: int | None):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'UPDATE correspondence SET end_request=? WHERE game_id=?',
+                (user, game_id),
+            )
+
+    async def end_correspondence(self, game_id: int, numof_moves: int):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'DELETE FROM correspondence WHERE game_id=?', (game_id,)
+            )
+            await cursor.execute(
+                'UPDATE games SET ended=?, numof_moves=? WHERE game_id=?',
+                (time.time(), numof_moves, game_id),
+            )
+            await cursor.execute('DELETE FROM snapshots WHERE game_id=?', (game_id,))
+
+    async def get_expired_correspondence(self, now: float) -> list[int]:
+        """get the game ids of correspondence games past their deadline"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT game_id FROM correspondence WHERE deadline<?', (now,)
+            )
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def list_correspondence(self, user: int) -> list[tuple[Any, ...]]:
+        """get the game id, game, player1, player2, number of moves and deadline
+        of the correspondence games of a user"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT game_id, game, player1, player2, '
+                '(SELECT COUNT(*) FROM game_moves m WHERE m.game_id=c.game_id), deadline '
+                'FROM correspondence c JOIN games USING (game_id) '
+                'WHERE player1=? OR player2=? ORDER BY deadline',
+                (user, user),
+            )
+            return cast(list[tuple[Any, ...]], await cursor.fetchall())
+
+    async def get_snapshot(self, game_id: int) -> bytes | None:
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT data FROM snapshots WHERE game_id=?', (game_id,)
+            )
+            row = await cursor.fetchone()
+            return row and row[0]
+
+    async def create_tournament_tables(self):
+        """create the tables 'tournaments' with one row per tournament,
+        'tournament_players' with their players, and 'tournament_pairings' with
+        the pairings and results of every round"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS tournaments (
+                tournament_id integer PRIMARY KEY,
+                guild integer,
+                organizer integer,
+                game text,
+                format text,
+                rounds integer,
+                channels text,
+                created real,
+                started real,
+                ended real
+                )'''
+            )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS tournament_players (
+                tournament_id integer,
+                user_id integer,
+                joined real,
+                withdrawn integer,
+                PRIMARY KEY (tournament_id, user_id)
+                ) WITHOUT ROWID'''
+            )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS tournament_pairings (
+                tournament_id integer,
+                round integer,
+                first integer,
+                second integer,
+                result text,
+                game_id integer,
+                PRIMARY KEY (tournament_id, round, first)
+                ) WITHOUT ROWID'''
+            )
+
+    async def add_tournament(
+        self, guild: int, organizer: int, game: str, format: str, channels: list[int]
+    ) -> int:
+        """add a tournament that players can join and return its id"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO tournaments (guild, organizer, game, format, rounds, '
+                'channels, created) VALUES (?, ?, ?, ?, 0, ?, ?)',
+                (
+                    guild,
+                    organizer,
+                    game,
+                    format,
+                    ','.join(map(str, channels)),
+                    time.time(),
+                ),
+            )
+            return cast(int, cursor.lastrowid)
+
+    async def start_tournament(self, tournament_id: int, rounds: int):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'UPDATE tournaments SET rounds=?, started=? WHERE tournament_id=?',
+                (rounds, time.time(), tournament_id),
+            )
+
+    async def end_tournament(self, tournament_id: int):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'UPDATE tournaments SET ended=? WHERE tournament_id=?',
+                (time.time(), tournament_id),
+            )
+
+    async def get_open_tournaments(self) -> list[tuple[Any, ...]]:
+        """get the id, guild, organizer, game, format, rounds, channels and start
+        time of every tournament that has not ended"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT tournament_id, guild, organizer, game, format, rounds, channels, '
+                'started FROM tournaments WHERE ended IS NULL'
+            )
+            return cast(list[tuple[Any, ...]], await cursor.fetchall())
+
+    async def set_tournament_player(
+        self, tournament_id: int, user: int, withdrawn: bool = False
+    ):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO tournament_players VALUES (?, ?, ?, ?) '
+                'ON CONFLICT DO UPDATE SET withdrawn=excluded.withdrawn',
+                (tournament_id, user, time.time(), withdrawn),
+            )
+
+    async def get_tournament_players(self, tournament_id: int) -> list[tuple[int, int]]:
+        """get the id and whether they withdrew of every player, in the order
+        they joined"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT user_id, withdrawn FROM tournament_players '
+                'WHERE tournament_id=? ORDER BY joined',
+                (tournament_id,),
+            )
+            return cast(list[tuple[int, int]], await cursor.fetchall())
+
+    async def add_tournament_pairings(
+        self,
+        tournament_id: int,
+        pairings: Sequence[tuple[int, int, int | None, str | None]],
+    ):
+        """add the round, first player, second player and result of pairings"""
+        async with self.transaction() as cursor:
+            await cursor.executemany(
+                'INSERT INTO tournament_pairings VALUES (?, ?, ?, ?, ?, NULL)',
+                [(tournament_id, *pairing) for pairing in pairings],
+            )
+
+    async def set_tournament_pairing(
+        self,
+        tournament_id: int,
+        round: int,
+        first: int,
+        result: str | None,
+        game_id: int | None,
+    ):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'UPDATE tournament_pairings SET result=?, game_id=? '
+                'WHERE tournament_id=? AND round=? AND first=?',
+                (result, game_id, tournament_id, round, first),
+            )
+
+    async def get_tournament_pairings(
+        self, tournament_id: int
+    ) -> list[tuple[int, int, int | None, str | None, int | None]]:
+        """get the round, first player, second player, result and game id of
+        every pairing"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT round, first, second, result, game_id FROM tournament_pairings '
+                'WHERE tournament_id=? ORDER BY round',
+                (tournament_id,),
+            )
+            return cast(
+                list[tuple[int, int, int | None, str | None, int | None]],
+                await cursor.fetchall(),
+            )
+
+    async def create_matchmaking_tables(self):
+        """create the tables 'ratings' with the rating and number of rated games
+        of every player in every game, and 'match_queue' with the players
+        waiting to be matched"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS ratings (
+                user_id integer,
+                game text,
+                rating real,
+                games integer,
+                PRIMARY KEY (user_id, game)
+                ) WITHOUT ROWID'''
+            )
+            await cursor.execute('SELECT name FROM pragma_table_info(\'ratings\')')
+            if ('games',) not in await cursor.fetchall():
+                await cursor.execute(
+                    'ALTER TABLE ratings ADD COLUMN games integer DEFAULT 0'
+                )
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS match_queue (
+                user_id integer PRIMARY KEY,
+                guild integer,
+                game text,
+                channel integer,
+                rating real,
+                joined real
+                )'''
+            )
+
+    async def get_rating(self, user: int, game: str) -> float | None:
+        """get the rating of a player in a game, None if they have none"""
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT rating FROM ratings WHERE user_id=? AND game=?', (user, game)
+            )
+            row = await cursor.fetchone()
+            return row and row[0]
+
+    async def add_queued(
+        self,
+        user: int,
+        guild: int,
+        game: str,
+        channel: int,
+        rating: float,
+        joined: float,
+    ):
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT OR REPLACE INTO match_queue VALUES (?, ?, ?, ?, ?, ?)',
+                (user, guild, game, channel, rating, joined),
+            )
+
+    async def delete_queued(self, *users: int):
+        async with self.transaction() as cursor:
+            await cursor.executemany(
+                'DELETE FROM match_queue WHERE user_id=?', [(user,) for user in users]
+            )
+
+    async def get_queued(self) -> list[tuple[int, int, str, int, float, float]]:
+        """get the id, guild, game, channel, rating and time they joined of every
+        player in the queue"""
+        async with self.reading() as cursor:
+            await cursor.execute('SELECT * FROM match_queue')
+            return cast(
+                list[tuple[int, int, str, int, float, float]],
+                await cursor.fetchall(),
+            )
+
+    async def get_archived_game(self, game_id: int) -> tuple[Any, ...] | None:
+        """get the header row of a game"""
+        async with self.reading() as cursor:
+            await cursor.execute('SELECT * FROM games WHERE game_id=?', (game_id,))
+            return cast(tuple[Any, ...] | None, await cursor.fetchone())
+
+    async def get_archived_moves(
+        self, game_id: int, *, ended: bool = False
+    ) -> tuple[str, list[tuple[int, int]]] | None:
+        """get the game name and every move of a game, only if it has ended if
+        `ended`"""
+        header = await self.get_archived_game(game_id)
+        if header is None or (ended and header[8] is None):
+            return None
+        async with self.reading() as cursor:
+            await cursor.execute(
+                'SELECT moves FROM game_moves WHERE game_id=? ORDER BY batch',
+                (game_id,),
+            )
+            data = b''.join([row[0] for row in await cursor.fetchall()])
+        return header[1], unpack_moves(data, header[2])
+
+    async def list_archived_games(
+        self, *, user: int | None = None, game: str | None = None, limit: int = 10
+    ) -> list[tuple[Any, ...]]:
+        """get the header rows of the most recent games of a user and/or game"""
+        if user is None and game is None:
+            query, params = 'SELECT * FROM games', ()
+        elif user is None:
+            query, params = 'SELECT * FROM games WHERE game=?', (game,)
+        else:
+            # two selects so each can use its own player index
+            game_filter = '' if game is None else ' AND game=?'
+            query = (
+                f'SELECT * FROM games WHERE player1=?{game_filter} UNION ALL '
+                f'SELECT * FROM games WHERE player2=?{game_filter}'
+            )
+            params = (user, game, user, game) if game else (user, user)
+        async with self.reading() as cursor:
+            await cursor.execute(
+                f'{query} ORDER BY game_id DESC LIMIT ?', (*params, limit)
+            )
+            return cast(list[tuple[Any, ...]], await cursor.fetchall())
 
     async def get_wotd_yesterday(self) -> tuple[int, str]:
-        await self.cursor.execute('SELECT * FROM wotd ORDER BY day DESC LIMIT 1')
-        return cast(tuple[int, str], await self.cursor.fetchone())
+        async with self.reading() as cursor:
+            await cursor.execute('SELECT * FROM wotd ORDER BY day DESC LIMIT 1')
+            return cast(tuple[int, str], await cursor.fetchone())
 
     async def set_wotd_newday(self, word: str):
-        yesterday = await self.get_wotd_yesterday()
-        await self.cursor.execute(
-            'INSERT INTO wotd VALUES (?, ?)', (yesterday[0] + 1, word)
-        )
-        await self.connection.commit()
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT INTO wotd SELECT MAX(day) + 1, ? FROM wotd', (word,)
+            )
 
     async def create_wotd_table(self):
         """create the table 'wotd' with day, word"""
-        await self.cursor.execute(
-            '''CREATE TABLE IF NOT EXISTS wotd (
-            day integer PRIMARY KEY,
-            word text
-            )'''
-        )
-        await self.cursor.execute(
-            'INSERT INTO wotd VALUES (?, ?) ON CONFLICT DO NOTHING', (0, 'amogus')
-        )
-        await self.connection.commit()
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS wotd (
+                day integer PRIMARY KEY,
+                word text
+                )'''
+            )
+            await cursor.execute(
+                'INSERT INTO wotd VALUES (?, ?) ON CONFLICT DO NOTHING', (0, 'amogus')
+            )
 
     async def create_channels_table(self):
-        await self.cursor.execute(
-            '''CREATE TABLE IF NOT EXISTS channels (
-            guild integer PRIMARY KEY,
-            option integer,
-            general integer,
-            announcements integer
-            )'''
-        )
-        await self.connection.commit()
-
-    async def get_channel(self, guild: int) -> tuple[int, int, int, int]:
-        await self.cursor.execute('SELECT * FROM channels WHERE guild=?', (guild,))
-        return cast(tuple[int, int, int, int], await self.cursor.fetchone())
-
-    async def get_all_channels(self) -> list[tuple[int, int, int, int]]:
-        await self.cursor.execute('SELECT * FROM channels')
-        return cast(list[tuple[int, int, int, int]], await self.cursor.fetchall())
-
-    async def all_general_channels(self) -> list[int]:
-        await self.cursor.execute('SELECT * FROM channels')
-        return [
-            id
-            for id in [
-                row[2]
-                for row in [guild_info for guild_info in await self.cursor.fetchall()]
-            ]
-        ]
+        """create the table 'channels' with the channels of every guild, and
+        load them. they are kept in memory from then on"""
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                '''CREATE TABLE IF NOT EXISTS channels (
+                guild integer PRIMARY KEY,
+                option integer,
+                general integer,
+                announcements integer
+                )'''
+            )
+            await cursor.execute('SELECT * FROM channels')
+            self._set_channels(
+                cast(list[tuple[int, int, int, int]], await cursor.fetchall())
+            )
 
-    async def all_announcement_channels(self) -> list[int]:
-        await self.cursor.execute('SELECT * FROM channels')
-        return [
-            id
-            for id in [
-                row[3]
-                for row in [guild_info for guild_info in await self.cursor.fetchall()]
-            ]
-        ]
+    def get_channel(self, guild: int) -> tuple[int, int, int, int] | None:
+        return self._channels.get(guild)
+
+    def get_all_channels(self) -> list[tuple[int, int, int, int]]:
+        """A copy, so it can be iterated across awaits."""
+        return list(self._channels.values())
+
+    def all_general_channels(self) -> list[int]:
+        return self._general
+
+    def all_announcement_channels(self) -> list[int]:
+        return self._announcements
 
     async def set_channels(
         self, guild: int, option: int, general: int, announcements: int
     ) -> None:
-        await self.cursor.execute(
-            'INSERT OR REPLACE INTO channels VALUES (?, ?, ?, ?)',
-            (guild, option, general, announcements),
-        )
+        async with self.transaction() as cursor:
+            await cursor.execute(
+                'INSERT OR REPLACE INTO channels VALUES (?, ?, ?, ?)',
+                (guild, option, general, announcements),
+            )
+        self._set_channels([(guild, option, general, announcements)])
+
+    def _set_channels(self, rows: Iterable[tuple[int, int, int, int]]) -> None:
+        for row in rows:
+            self._channels[row[0]] = row
+        self._general = [row[2] for row in self._channels.values()]
+        self._announcements = [row[3] for row in self._channels.values()]
 
 
 class ANSIColors:
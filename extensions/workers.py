@@ -0,0 +1,221 @@
+"""Host game boards in worker processes.
+
+Move checking, win checking and rendering of a board run in a worker process
+instead of on the event loop that serves the gateway. The game loop stays in
+the main process and holds a `RemoteBoard`, which forwards every board call to
+the worker over a queue and awaits the reply. Boards are pinned to a worker by
+game id, so the calls of one game run in order in the same process. If a
+worker dies, the calls waiting for it fail with a RuntimeError.
+
+Workers are spawned, so boards are created in them from the module and name
+of their class, and must be constructible without arguments.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import itertools
+import multiprocessing
+import pickle
+import queue
+import threading
+from io import BytesIO
+from typing import Any, Iterable, Literal
+
+import discord
+
+__all__ = ('BoardWorkerPool', 'RemoteBoard')
+
+WORKER_CHECK = 1.0
+"""Seconds between checks that the workers are still running, while there are
+no replies."""
+
+
+def _to_reply(result: Any) -> tuple[str, Any]:
+    if isinstance(result, discord.Embed):
+        return 'embed', result.to_dict()
+    if isinstance(result, list) and all(isinstance(e, discord.Embed) for e in result):
+        return 'embeds', [e.to_dict() for e in result]
+    return 'value', result
+
+
+def _from_reply(kind: str, value: Any) -> Any:
+    if kind == 'embed':
+        return discord.Embed.from_dict(value)
+    if kind == 'embeds':
+        return [discord.Embed.from_dict(e) for e in value]
+    return value
+
+
+def _worker_main(requests: Any, replies: Any) -> None:
+    """Serve board calls until a None request."""
+    loop = asyncio.new_event_loop()
+    boards: dict[int, Any] = {}
+    while (request := requests.get()) is not None:
+        request_id, game_id, op, args = request
+        try:
+            if op == 'new':
+                module, qualname, moves = args
+                board = getattr(importlib.import_module(module), qualname)()
+                for k, (x, y) in enumerate(moves):
+                    value = '1' if k % 2 == 0 else '2'
+                    if loop.run_until_complete(board.is_valid_square(x, y, value)):
+                        loop.run_until_complete(board.set_square(x, y, value))
+                boards[game_id] = board
+                result: Any = board.length
+            elif op == 'close':
+                result = boards.pop(game_id, None) is not None
+            elif op == 'render_png':
+                result = boards[game_id].render_png()
+            else:
+                result = loop.run_until_complete(getattr(boards[game_id], op)(*args))
+            reply = (request_id, True, _to_reply(result))
+        except Exception as e:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(repr(e))
+            reply = (request_id, False, e)
+        replies.put(reply)
+    loop.close()
+
+
+class BoardWorkerPool:
+    """Worker processes that host boards, see `RemoteBoard`."""
+
+    def __init__(self, processes: int) -> None:
+        context = multiprocessing.get_context('spawn')
+        self._replies = context.Queue()
+        self._requests = [context.Queue() for _ in range(processes)]
+        self._workers = [
+            context.Process(
+                target=_worker_main, args=(requests, self._replies), daemon=True
+            )
+            for requests in self._requests
+        ]
+        # loop, future and worker of every request without a reply
+        self._pending: dict[
+            int, tuple[asyncio.AbstractEventLoop, asyncio.Future[Any], int]
+        ] = {}
+        self._ids = itertools.count()
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        self._reader.start()
+
+    async def close(self) -> None:
+        """Stop the workers, dropping every board they host."""
+        for requests in self._requests:
+            requests.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._join)
+
+    def _join(self) -> None:
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._replies.put(None)
+        self._reader.join(timeout=5)
+
+    async def request(self, game_id: int, op: str, *args: Any) -> Any:
+        """Call method `op` of the board of `game_id` in its worker."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Any] = loop.create_future()
+        request_id = next(self._ids)
+        index = game_id % len(self._requests)
+        # added before the check, so the reader fails it if the worker dies
+        # after the check
+        self._pending[request_id] = loop, future, index
+        if not self._workers[index].is_alive():
+            self._pending.pop(request_id, None)
+            raise RuntimeError(f'board worker {index} is not running')
+        self._requests[index].put((request_id, game_id, op, args))
+        return await future
+
+    def _read_replies(self) -> None:
+        """Pass replies from the workers to the event loop, in a thread, and fail
+        the requests of workers that died."""
+        while True:
+            try:
+                reply = self._replies.get(timeout=WORKER_CHECK)
+            except queue.Empty:
+                self._fail_dead()
+                continue
+            if reply is None:
+                break
+            request_id, ok, value = reply
+            pending = self._pending.pop(request_id, None)
+            if pending is not None:
+                loop, future, _ = pending
+                loop.call_soon_threadsafe(self._resolve, future, ok, value)
+            self._fail_dead()
+
+    def _fail_dead(self) -> None:
+        dead = {k for k, worker in enumerate(self._workers) if not worker.is_alive()}
+        if not dead:
+            return
+        # copied, requests are added on the event loop meanwhile
+        for request_id, (loop, future, index) in list(self._pending.items()):
+            if index in dead and self._pending.pop(request_id, None) is not None:
+                error = RuntimeError(f'board worker {index} stopped')
+                loop.call_soon_threadsafe(self._resolve, future, False, error)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future[Any], ok: bool, value: Any) -> None:
+        if future.done():
+            return
+        if ok:
+            future.set_result(_from_reply(*value))
+        else:
+            future.set_exception(value)
+
+
+class RemoteBoard:
+    """Stands in for a board hosted in a `BoardWorkerPool`.
+
+    Has the methods of `BaseBoard` that games call during their input loop.
+    """
+
+    def __init__(self, pool: BoardWorkerPool, game_id: int, length: int) -> None:
+        self.pool = pool
+        self.game_id = game_id
+        self.length = length
+
+    @classmethod
+    async def create(
+        cls,
+        pool: BoardWorkerPool,
+        game_id: int,
+        board_type: type,
+        moves: Iterable[tuple[int, int]] = (),
+    ) -> RemoteBoard:
+        """Make a `board_type` in a worker, and play `moves` on it."""
+        length = await pool.request(
+            game_id, 'new', board_type.__module__, board_type.__qualname__, list(moves)
+        )
+        return cls(pool, game_id, length)
+
+    async def to_emojis(
+        self,
+    ) -> str | tuple[str, ...] | discord.Embed | list[discord.Embed]:
+        return await self.pool.request(self.game_id, 'to_emojis')
+
+    async def to_image(self) -> discord.File:
+        png = await self.pool.request(self.game_id, 'render_png')
+        return discord.File(BytesIO(png), filename='board.png')
+
+    async def is_valid_square(self, x: int, y: int, value: Literal['1', '2']) -> bool:
+        return await self.pool.request(self.game_id, 'is_valid_square', x, y, value)
+
+    async def set_square(self, x: int, y: int, value: Literal['1', '2']) -> None:
+        await self.pool.request(self.game_id, 'set_square', x, y, value)
+
+    async def check_win(self) -> Any:
+        return await self.pool.request(self.game_id, 'check_win')
+
+    async def close(self) -> None:
+        """Drop the board from its worker."""
+        await self.pool.request(self.game_id, 'close')
@@ -0,0 +1,166 @@
+"""Write game results, snapshots and the game log in batches, in the background.
+
+Results of finished games, snapshots of running games and lines of the game log
+are queued, and written a moment later together: every result in one database
+transaction, the latest snapshot of every game in another, and every line with
+one write to the log file. A batch is written once `delay` seconds
+have passed since its first event, or right away once it holds `batch` events.
+If `limit` events are queued, for example because the database is slow, adding
+another waits for the queue to be written first. Events that could not be
+written stay queued, and if the queue is still full after writing, because the
+database or the log file keeps failing, the oldest events are dropped, lines of
+the log before results. Snapshots are not counted, there is one per running
+game at most, and one that could not be written is replaced by the next.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import TYPE_CHECKING, Optional
+
+from aiofiles import open as aopen
+
+if TYPE_CHECKING:
+    from .archive import GameSnapshot
+    from .utils import Database
+
+__all__ = ('WriteBehindQueue',)
+
+
+class WriteBehindQueue:
+    """Results and log lines that wait to be written.
+
+    `high_water` is the most events that were ever queued at once,
+    `flushes` and `flush_time` count the batches written and the seconds spent
+    writing them, and `dropped` counts the events dropped because the queue was
+    full.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        log_path: str | os.PathLike[str],
+        *,
+        batch: int = 100,
+        delay: float = 0.5,
+        limit: int = 10_000,
+    ) -> None:
+        self.database = database
+        self.log_path = log_path
+        self.batch = batch
+        self.delay = delay
+        self.limit = limit
+        self.high_water = 0
+        self.flushes = 0
+        self.flush_time = 0.0
+        self.dropped = 0
+        self._matches: list[tuple[str, int, int, bool, Optional[int], float]] = []
+        self._lines: list[str] = []
+        self._snapshots: dict[int, GameSnapshot] = {}
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        return len(self._matches) + len(self._lines)
+
+    async def add_match(
+        self,
+        game: str,
+        winner_id: int,
+        loser_id: int,
+        tie: bool = False,
+        game_id: Optional[int] = None,
+    ) -> None:
+        """Queue the result of a game, see `Database.add_matches`."""
+        await self._room()
+        self._matches.append((game, winner_id, loser_id, tie, game_id, time.time()))
+        self._queued()
+
+    def save_snapshot(self, game_id: int, snapshot: GameSnapshot) -> None:
+        """Queue the snapshot of a running game, replacing the one queued before.
+        It is packed when it is written."""
+        self._snapshots[game_id] = snapshot
+        self._queued()
+
+    def drop_snapshot(self, game_id: int) -> None:
+        """Forget the queued snapshot of a game, before its snapshot is written or
+        deleted right away."""
+        self._snapshots.pop(game_id, None)
+
+    async def log(self, line: str) -> None:
+        """Queue a line of the game log."""
+        await self._room()
+        self._lines.append(line)
+        self._queued()
+
+    async def flush(self) -> None:
+        """Write everything that is queued."""
+        async with self._lock:
+            matches, self._matches = self._matches, []
+            lines, self._lines = self._lines, []
+            snapshots, self._snapshots = self._snapshots, {}
+            if not matches and not lines and not snapshots:
+                return
+            start = time.perf_counter()
+            if snapshots:
+                # written first, so they wait for the database in the order they
+                # were taken from the queue, before a later `drop_snapshot`
+                try:
+                    await self.database.set_snapshots(
+                        [(game_id, s.pack()) for game_id, s in snapshots.items()]
+                    )
+                except Exception as e:
+                    print(f'CANNOT WRITE {len(snapshots)} snapshots:', e)
+            if matches:
+                try:
+                    await self.database.add_matches(matches)
+                except Exception as e:
+                    print(f'CANNOT WRITE {len(matches)} results, retrying later:', e)
+                    self._matches[:0] = matches
+            if lines:
+                try:
+                    async with aopen(self.log_path, 'a') as f:
+                        await f.write(''.join(lines))
+                except OSError as e:
+                    print(f'CANNOT WRITE {len(lines)} log lines, retrying later:', e)
+                    self._lines[:0] = lines
+            self.flushes += 1
+            self.flush_time += time.perf_counter() - start
+
+    async def close(self) -> None:
+        """Write everything that is queued right away."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _room(self) -> None:
+        if len(self) >= self.limit:
+            await self.flush()
+        excess = len(self) - self.limit + 1
+        if excess > 0:
+            lines = min(excess, len(self._lines))
+            del self._lines[:lines]
+            del self._matches[: excess - lines]
+            self.dropped += excess
+            print(f'DROPPED {excess} events, the write queue is full')
+
+    def _queued(self) -> None:
+        self.high_water = max(self.high_water, len(self))
+        if len(self) >= self.batch:
+            self._full.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        try:
+            await asyncio.wait_for(self._full.wait(), self.delay)
+        except asyncio.TimeoutError:
+            pass
+        # events queued from now on are written by another task
+        self._task = None
+        self._full.clear()
+        await self.flush()
@@ -77,13 +77,12 @@ class GraphFeatures(commands.Cog):
     async def get_point(
         self, ctx: commands.Context[Vesuvius], ptn: int | str
     ) -> tuple[float, float] | None | str:
-        def chkp(m: discord.Message):
-            return m.author == ctx.message.author and m.channel == ctx.channel
-
         await ctx.send(f'point {ptn}:')
         msg = None
         try:
-            msg = await self.bot.wait_for('message', check=chkp, timeout=30)
+            msg = await self.bot.router.wait(
+                ctx.channel.id, (ctx.author.id,), timeout=30
+            )
             if msg.content == 'end':
                 return 'end'
             x, y = re.search(
@@ -224,12 +223,11 @@ class GraphFeatures(commands.Cog):
     async def get_inp(
         self, ctx: commands.Context[Vesuvius]
     ) -> tuple[str, Point | Equation | tuple[Point, float]] | str | None:
-        def chk(m: discord.Message):
-            return m.author == ctx.message.author and m.channel == ctx.channel
-
         msg = None
         try:
-            msg = await self.bot.wait_for('message', check=chk, timeout=30)
+            msg = await self.bot.router.wait(
+                ctx.channel.id, (ctx.author.id,), timeout=30
+            )
             if msg.content == 'end':
                 return 'end'
             return await self.bot.run_in_tpexec(
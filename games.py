@@ -3,20 +3,40 @@ from __future__ import annotations
 import asyncio
 import datetime
 import re
+import time
+from collections import OrderedDict
+from io import BytesIO
 from math import radians
 from random import randint
-from typing import TYPE_CHECKING, Any, Literal, NoReturn, Optional, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Literal,
+    NoReturn,
+    Optional,
+    cast,
+)
 
 import discord
 from aiofiles import open as aopen
 from discord import app_commands, ui
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from extensions import ansicolors as C
+from extensions.archive import GameSnapshot, MoveLog, pack_moves
+from extensions.boardimage import BoardRenderer, BoardStyle
+from extensions.clocks import GameClock, TimerHandle
+from extensions.matchmaking import DEFAULT_RATING, MatchQueue, Waiting
+from extensions.sessions import Session
+from extensions.tournaments import Pairing, Standings, round_robin_schedule
+from extensions.workers import RemoteBoard
 from extensions.utils import NUM_EMOTES, owner_bypass
 from extensions.transformations import AllPoints, Point
 
 if TYPE_CHECKING:
+    from extensions.utils import Database
     from vesuvius import Vesuvius
 
 
@@ -41,8 +61,21 @@ class BaseBoard:
     set_square
 
     check_win
+
+    squares
+
+    render_png
+
+    to_image
     """
 
+    image_style = BoardStyle(
+        (200, 200, 200),
+        (60, 60, 60),
+        {'1': ('stone', (20, 20, 20)), '2': ('stone', (240, 240, 240))},
+    )
+    _renderer: Optional[BoardRenderer] = None
+
     def __init__(
         self,
         p1_emoji: str,
@@ -134,6 +167,29 @@ class BaseBoard:
             .replace('0', self.no_emoji)
         )
 
+    def squares(self) -> list[str]:
+        """Get the occupier of every square, bottom row first."""
+        return [square.occupier for square in self._all_squares]
+
+    def render_png(self) -> bytes:
+        """Render to PNG bytes, only redrawing squares that changed since the last
+        call."""
+        squares = self.squares()
+        if self._renderer is None:
+            self._renderer = BoardRenderer(
+                self.image_style, self.length, len(squares) // self.length
+            )
+        return self._renderer.render(squares)
+
+    async def to_image(self) -> discord.File:
+        """Render to a PNG image.
+
+        This can be used in place of `to_emojis`. Drawing happens in the default
+        executor with `render_png`.
+        """
+        png = await asyncio.get_running_loop().run_in_executor(None, self.render_png)
+        return discord.File(BytesIO(png), filename='board.png')
+
     async def is_valid_square(self, x: int, y: int, value: Literal['1', '2']) -> bool:
         """Check if a player can place a piece in x, y.
 
@@ -163,16 +219,40 @@ class BaseBoard:
         pass
 
 
+async def play_move(board: BaseBoard, x: int, y: int, value: Literal['1', '2']):
+    """Play a move that was already played on another board.
+
+    This checks the move like a game does before setting it, since some boards
+    change in `is_valid_square`.
+    """
+    if await board.is_valid_square(x, y, value):
+        await board.set_square(x, y, value)
+
+
 class PromptMessage:
-    """Represents a message asking players to send input."""
+    """Represents a message asking players to send input.
+
+    `footer` is added to the end of every edit, like the clocks of a game.
+    """
 
     def __init__(self, message: discord.Message) -> None:
         self.message = message
+        self.footer = ''
+        self._content = message.content
 
-    async def update(self, this_turn: Player) -> None:
+    async def _edit(self, content: str) -> None:
+        self._content = content
         self.message = await self.message.edit(
-            content=f'{this_turn.mention} '
-            f"{this_turn.color_name}'s turn! (send coordinates)"
+            content=f'{content}\n{self.footer}' if self.footer else content
+        )
+
+    async def refresh(self) -> None:
+        """Edit the message again with the current footer."""
+        await self._edit(self._content)
+
+    async def update(self, this_turn: Player) -> None:
+        await self._edit(
+            f"{this_turn.mention} {this_turn.color_name}'s turn! (send coordinates)"
         )
 
     async def winner(
@@ -180,84 +260,91 @@ class PromptMessage:
         this_turn: Player,
         *,
         points_ratio: tuple[int, int] = (0, 0),
-        time_is_out: bool = False,
         draw: bool = False,
     ) -> None:
         print(f'call with', this_turn, points_ratio)
         ratio: str = C.E
-        timeout: str = C.B + C.YELLOW
         if points_ratio != (0, 0):
             ratio = (
                 f' {C.CYAN}{points_ratio[0]}{C.YELLOW}:{C.CYAN}{points_ratio[1]}{C.E}'
             )
-        if time_is_out:
-            timeout = f"{C.B}{C.YELLOW} Time's up - "
         winner = f'Winner is {this_turn.color_name}, {this_turn}.'
         if draw:
             winner = 'Draw!'
-        self.message = await self.message.edit(content=f'{timeout}{winner}{ratio}')
+        await self._edit(f'{C.B}{C.YELLOW}{winner}{ratio}')
 
     async def draw(self) -> None:
-        self.message = await self.message.edit(content=f'{C.B}{C.YELLOW}draw!{C.E}')
+        await self._edit(f'{C.B}{C.YELLOW}draw!{C.E}')
 
     async def occupied(self, this_turn: Player) -> None:
-        self.message = await self.message.edit(
-            content=f'{this_turn.mention} '
-            'that spot is already occupied. pick another spot'
+        await self._edit(
+            f'{this_turn.mention} that spot is already occupied. pick another spot'
         )
 
     async def invalid(self, this_turn: Player) -> None:
-        self.message = await self.message.edit(
-            content=f'{this_turn.mention} invalid spot. try another place'
-        )
+        await self._edit(f'{this_turn.mention} invalid spot. try another place')
 
     async def timeout(self, this_turn: Player, not_this_turn: Player) -> None:
-        self.message = await self.message.edit(
-            content=f'{C.B}{C.RED}game ended.{C.YELLOW} '
+        await self._edit(
+            f'{C.B}{C.RED}game ended.{C.YELLOW} '
             f'{not_this_turn} is winner, because {this_turn} took too long.{C.E}'
         )
 
     async def end_request(self, this_turn: Player, not_this_turn: Player) -> None:
-        self.message = await self.message.edit(
-            content=f'{not_this_turn.mention} your opponent wants to end the game now. '
+        await self._edit(
+            f'{not_this_turn.mention} your opponent wants to end the game now. '
             f'respond with "yes" if you agree, or say no to continue'
         )
 
     async def continue_game(self, this_turn: Player) -> None:
-        self.message = await self.message.edit(
-            content=f'{this_turn.mention} '
+        await self._edit(
+            f'{this_turn.mention} '
             'your opponent wants to continue! (send coordinates)'
         )
 
     async def hurry(self, this_turn: Player) -> None:
-        self.message = await self.message.edit(content=f'{this_turn.mention} hurry up!')
+        await self._edit(f'{this_turn.mention} hurry up!')
 
     async def fmt_error(self, this_turn: Player) -> None:
-        self.message = await self.message.edit(
-            content=f'{this_turn.mention} '
-            'off board range or incorrect format. try again'
+        await self._edit(
+            f'{this_turn.mention} off board range or incorrect format. try again'
         )
 
 
 class BoardMessage:
-    """Represents a message with a stringified `BaseBoard`."""
+    """Represents a message with a stringified `BaseBoard`.
+
+    If `image` is True, the board is sent as an image from `BaseBoard.to_image`
+    instead of `BaseBoard.to_emojis`.
+    """
 
     def __init__(
-        self, message: discord.Message | list[discord.Message], board: BaseBoard
+        self,
+        message: discord.Message | list[discord.Message],
+        board: BaseBoard,
+        *,
+        image: bool = False,
     ) -> None:
         self.message: discord.Message | list[discord.Message] = message
         self.board: BaseBoard = board
+        self.image = image
 
     async def update(self) -> None:
+        if self.image:
+            await self.update_message(await self.board.to_image())
+            return
         await self.update_message(await self.board.to_emojis())
 
     async def update_message(
-        self, new: str | tuple[str] | discord.Embed | list[discord.Embed]
+        self, new: str | tuple[str] | discord.Embed | list[discord.Embed] | discord.File
     ) -> None:
         if isinstance(self.message, discord.Message):
             if isinstance(new, str):
                 self.message = await self.message.edit(content=new)
                 return
+            elif isinstance(new, discord.File):
+                self.message = await self.message.edit(attachments=[new])
+                return
             elif isinstance(new, discord.Embed):
                 self.message = await self.message.edit(embed=new)
                 return
@@ -272,6 +359,31 @@ class BoardMessage:
         return
 
 
+async def send_board(
+    destination: discord.abc.Messageable | InteractionContextAdapter,
+    board: BaseBoard,
+    *,
+    image: bool = False,
+) -> BoardMessage:
+    """Send a board to `destination` and make a `BoardMessage` for it.
+
+    The board is sent with `BaseBoard.to_image` if `image` is True, otherwise
+    with `BaseBoard.to_emojis`, as one message per string if it returns a tuple.
+    """
+    if image:
+        return BoardMessage(
+            await destination.send(file=await board.to_image()), board, image=True
+        )
+    as_emojis = await board.to_emojis()
+    if isinstance(as_emojis, tuple):
+        return BoardMessage([await destination.send(part) for part in as_emojis], board)
+    if isinstance(as_emojis, list):
+        return BoardMessage(await destination.send(embeds=as_emojis), board)
+    if isinstance(as_emojis, discord.Embed):
+        return BoardMessage(await destination.send(embed=as_emojis), board)
+    return BoardMessage(await destination.send(as_emojis), board)
+
+
 class Player:
     """Represents a player."""
 
@@ -287,6 +399,10 @@ class Player:
         return self.member.display_name
 
 
+IMAGE_COST = 2
+"""Weight added to the `BaseGame.cpu_cost` of games rendered as images."""
+
+
 class BaseGame:
     """Base class for any game.
 
@@ -294,8 +410,16 @@ class BaseGame:
     -------
     start
 
+    resume
+
+    snapshot
+
+    from_snapshot
+
     _loop_begin
 
+    _loop
+
     _iter_begin
 
     _iter_end
@@ -308,11 +432,17 @@ class BaseGame:
 
     _flush_channel
 
+    _send_board
+
     _check_board_win
 
     _get_coord
     """
 
+    name = ''
+    cpu_cost = 0
+    """Weight of the game in the budget of CPU heavy games."""
+
     def __init__(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
@@ -326,11 +456,22 @@ class BaseGame:
         numof_loops: int,
         input_regex: str,
         input_wait_time: int,
+        *,
+        image: bool = False,
     ) -> None:
-        """Initalize the game."""
+        """Initalize the game.
+
+        If `image` is True, the board is sent as an image instead of emojis.
+        """
         self.winner: Optional[discord.Member] = None
         self.loser: Optional[discord.Member] = None
         self.tie: bool = False
+        self.moves: list[tuple[int, int]] = []
+        self.game_id: Optional[int] = None
+        self.move_log: Optional[MoveLog] = None
+        self.message_ids: list[int] = []
+        """Ids of the messages the game sent and received, in order, that are
+        still in the channel. Moves are deleted as soon as they are read."""
 
         self._ctx = ctx
         self._bot = bot
@@ -344,22 +485,41 @@ class BaseGame:
         self._input_occupied_error = 'occupied'
         self._input_format_error = 'fmt_error'
         self._flush = False
+        self._image = image
 
-        self._player1 = Player(cast(discord.Member, ctx.author))
-        self._player2 = Player(opponent)
+        self.clock: Optional[GameClock] = None
+        self._clock_timer: Optional[TimerHandle] = None
+        # edits of the prompt message that are in flight, kept referenced
+        self._refresh_tasks: set[asyncio.Task[None]] = set()
+        self._seats = ((symbol1, color1), (symbol2, color2))
 
+        players = [Player(cast(discord.Member, ctx.author)), Player(opponent)]
         if randint(0, 1):
-            self._player1, self._player2 = self._player2, self._player1
+            players.reverse()
+        self._seat_players(*players)
 
-        self._player1.number, self._player2.number = '1', '2'
-        self._player1.color_name, self._player2.color_name = symbol1, symbol2
-        self._player1.color, self._player2.color = color1, color2
+    @property
+    def weight(self) -> int:
+        """`cpu_cost`, plus `IMAGE_COST` if the board is rendered as an image."""
+        return self.cpu_cost + (IMAGE_COST if self._image else 0)
+
+    def _seat_players(self, first: Player, second: Player) -> None:
+        """Make `first` player 1, who moves first, and `second` player 2."""
+        self._player1, self._player2 = first, second
+        for player, number, (symbol, color) in zip(
+            (first, second), ('1', '2'), self._seats
+        ):
+            player.number = number  # type: ignore
+            player.color_name = symbol
+            player.color = color
 
     async def start(self) -> None:
         """Start the game.
 
         This sends the prompt message and starts the input loop. When the game
         finishes, the `winner`, `loser`, and `tie` attributes will be set accordingly.
+        Every move that was played is in the `moves` attribute, in order, and is
+        appended to `move_log` if it is set.
 
         In the event of a tie, the `winner` and `loser` attribute names do not matter.
 
@@ -367,6 +527,8 @@ class BaseGame:
         ---------------
         _loop_begin
 
+        _loop
+
         _iter_begin
 
         _get_coord
@@ -383,28 +545,158 @@ class BaseGame:
         """
         if await self._loop_begin():
             return None
+        await self._loop()
+
+    async def resume(self) -> None:
+        """Continue a game made with `from_snapshot`.
+
+        This is `start` without `_loop_begin`, the input loop continues from
+        the turn after the last move.
+        """
+        await self._board_msg.update()
+        await self._loop()
+
+    async def _loop(self) -> None:
         this_turn, next_turn = self._player2, self._player1
-        for _ in range(self._numof_loops):
+        if len(self.moves) % 2:
+            this_turn, next_turn = next_turn, this_turn
+        for _ in range(len(self.moves), self._numof_loops):
             this_turn, next_turn = next_turn, this_turn
+            if self.clock is not None:
+                self.clock.start(int(this_turn.number) - 1)
+                self._prompt_msg.footer = self._clock_footer()
 
             if await self._iter_begin(this_turn, next_turn):
                 return None
 
-            x, y = await self._get_coord(this_turn, next_turn)
+            self._schedule_clock_refresh()
+            try:
+                x, y = await self._get_coord(this_turn, next_turn)
+            finally:
+                if self._clock_timer is not None:
+                    self._clock_timer.cancel()
             if x == 'timeout':
                 await self._timeout(this_turn, next_turn)
                 return None
             if x == 'end':
                 await self._end(this_turn, next_turn)
                 return None
+            if self.clock is not None and not self.clock.stop():
+                await self._prompt_msg.timeout(this_turn, next_turn)
+                await self._timeout(this_turn, next_turn)
+                return None
 
             assert isinstance(x, int) and isinstance(y, int)
             await self._board.set_square(x, y, this_turn.number)
+            self.moves.append((x, y))
+            if self.move_log is not None:
+                await self.move_log.append(x, y)
             if await self._iter_end(this_turn, next_turn):
                 return None
+            if self.move_log is not None:
+                await self.move_log.save_snapshot(self.snapshot())
         await self._loop_end(this_turn, next_turn)
         return None
 
+    def snapshot(self) -> GameSnapshot:
+        """Get the state needed to resume this game with `from_snapshot`."""
+        messages = self._board_msg.message
+        if not isinstance(messages, list):
+            messages = [messages]
+        return GameSnapshot(
+            self.board_length,
+            self._player1.member.id,
+            self._player2.member.id,
+            self._ctx.channel.id,  # type: ignore
+            self._prompt_msg.message.id,
+            [m.id for m in messages],
+            # copied, it may be packed after more moves are played
+            list(self.moves),
+            image=self._image,
+            clocks=self.clock and self.clock.state(),
+        )
+
+    @classmethod
+    async def from_snapshot(
+        cls,
+        bot: commands.Bot,
+        channel: discord.TextChannel | discord.Thread,
+        player1: discord.Member,
+        player2: discord.Member,
+        snapshot: GameSnapshot,
+    ) -> BaseGame:
+        """Rebuild a running game from a snapshot, call `resume` to continue it.
+
+        The board is rebuilt by playing the moves again, and the board and prompt
+        messages are fetched by id, which raises `discord.HTTPException` if
+        they have been deleted.
+        """
+        game = cls(
+            ChannelContextAdapter(channel, player1),  # type: ignore
+            bot,
+            player2,
+            **({'image': True} if snapshot.image else {}),
+        )
+        game._seat_players(Player(player1), Player(player2))
+        for k, (x, y) in enumerate(snapshot.moves):
+            await play_move(game._board, x, y, '1' if k % 2 == 0 else '2')
+        game.moves = list(snapshot.moves)
+
+        messages = [await channel.fetch_message(m) for m in snapshot.board_messages]
+        game._board_msg = BoardMessage(
+            messages[0] if len(messages) == 1 else messages,
+            game._board,
+            image=snapshot.image,
+        )
+        game._prompt_msg = PromptMessage(
+            await channel.fetch_message(snapshot.prompt_message)
+        )
+        game.message_ids = [*snapshot.board_messages, snapshot.prompt_message]
+        if game.clock is not None and snapshot.clocks is not None:
+            game.clock.set_state(snapshot.clocks)
+        return game
+
+    def use_board(self, board: BaseBoard | RemoteBoard) -> None:
+        """Play on `board` from now on, like a `RemoteBoard` with the same moves."""
+        self._board = cast(BaseBoard, board)
+        if self._board_msg is not None:
+            self._board_msg.board = self._board
+
+    @property
+    def board_length(self) -> int:
+        """Width of the board, used to pack moves."""
+        return self._board.length
+
+    def _clock_footer(self) -> str:
+        assert self.clock is not None
+        return (
+            f'{C.B}{self._player1.color}{self._player1.color_name} '
+            f'{self.clock.format(0)}{C.NCLR}  {self._player2.color}'
+            f'{self._player2.color_name} {self.clock.format(1)}{C.E}'
+        )
+
+    def _schedule_clock_refresh(self) -> None:
+        """Update the clocks on the prompt message every
+        `GameClock.refresh_interval` seconds while waiting for a move."""
+        if self.clock is None:
+            return
+        self._clock_timer = self._bot.timers.call_later(  # type: ignore
+            self.clock.refresh_interval(), self._refresh_clock
+        )
+
+    def _refresh_clock(self) -> None:
+        self._prompt_msg.footer = self._clock_footer()
+        task = asyncio.create_task(self._refresh_prompt())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+        self._schedule_clock_refresh()
+
+    async def _refresh_prompt(self) -> None:
+        try:
+            await self._prompt_msg.refresh()
+        except discord.HTTPException as e:
+            print('CANNOT REFRESH clocks:', e)
+
     async def _loop_begin(self) -> bool:
         """Called before the input loop starts.
 
@@ -414,17 +706,15 @@ class BaseGame:
 
         If this method returns True, the game will exit.
         """
-        await self._ctx.send(
+        await self._send(
             f'{C.B}{self._player1.color}{self._player1.color_name}: {self._player1}, '
             f'{self._player2.color}{self._player2.color_name}: {self._player2}{C.E}'
         )
 
-        as_emojis = await self._board.to_emojis()
-        assert isinstance(as_emojis, str)
-        self._board_msg = BoardMessage(await self._ctx.send(as_emojis), self._board)
+        self._board_msg = await self._send_board()
 
         self._prompt_msg = PromptMessage(
-            await self._ctx.send(
+            await self._send(
                 f"{self._player1.mention} {self._player1.color_name}'s turn!"
             )
         )
@@ -503,11 +793,35 @@ class BaseGame:
             return True
         return False
 
+    async def _send_board(self) -> BoardMessage:
+        """Send the board and make a `BoardMessage` for it.
+
+        The board is sent with `BaseBoard.to_image` if the game was started with
+        `image=True`, otherwise with `BaseBoard.to_emojis`, as one message per
+        string if it returns a tuple.
+        """
+        board_msg = await send_board(self._ctx, self._board, image=self._image)
+        messages = board_msg.message
+        self.message_ids.extend(
+            m.id for m in (messages if isinstance(messages, list) else [messages])
+        )
+        return board_msg
+
+    async def _send(self, *args: Any, **kwargs: Any) -> discord.Message:
+        """Send a message in the channel of the game, and record its id."""
+        message = await self._ctx.send(*args, **kwargs)
+        self.message_ids.append(message.id)
+        return message
+
     async def _flush_channel(self) -> None:
-        async for msg in self._prompt_msg.message.channel.history(limit=10):
-            if msg == self._prompt_msg.message:
-                return None
-            await msg.delete()
+        """Queue the messages of the game that came after the prompt message to be
+        deleted. Ids are in the order of the messages, so these are the ids
+        greater than the prompt's."""
+        prompt = self._prompt_msg.message.id
+        self._bot.janitor.delete_ids(  # type: ignore
+            self._ctx.channel, [i for i in self.message_ids if i > prompt]
+        )
+        self.message_ids = [i for i in self.message_ids if i <= prompt]
 
     async def _get_coord(
         self, this_turn: Player, next_turn: Player
@@ -516,41 +830,40 @@ class BaseGame:
 
         This users `self._input_regex` to validate the user message,
         `self._board.is_valid_square` to validate spot availiblity, and
-        waits `self._wait_time` seconds for every input. If the
-        input is not correct or forbidden by the game rules, the prompt message is
-        edited accordingly and will ask for another input.
+        waits `self._wait_time` seconds for every input, or until the player runs
+        out of time if the game has a `clock`. If the input is not correct or
+        forbidden by the game rules, the prompt message is edited accordingly and
+        will ask for another input.
 
         * On timeout, return tuple[Literal['timeout'], None]
         * On end request, return tuple[Literal['end'], None]
         """
-        timeout = end = flush = False
+        timeout = end = False
 
         def check(m: discord.Message):
             if m.content == 'fflush' and m.author in {
                 this_turn.member,
                 next_turn.member,
             }:
+                self.message_ids.append(m.id)
                 self._flush = True
                 return False
             if m.content.startswith('//'):
                 return False
             if end:
-                return m.author == next_turn.member and m.channel == self._ctx.channel
-            return m.author == this_turn.member and m.channel == self._ctx.channel
+                return m.author == next_turn.member
+            return m.author == this_turn.member
 
         while True:
-            if flush:
-                async for msg in self._prompt_msg.message.channel.history(limit=10):
-                    if msg == self._prompt_msg.message:
-                        break
-                    await msg.delete()
-
             message = None
             try:
-                message = await self._bot.wait_for(
-                    'message', check=check, timeout=self._wait_time
+                message = await self._bot.router.wait(
+                    self._ctx.channel.id,
+                    (this_turn.member.id, next_turn.member.id),
+                    check=check,
+                    timeout=self.clock.time_left() if self.clock else self._wait_time,
                 )
-                await message.delete()
+                self._bot.janitor.delete(message)  # type: ignore
                 timeout = False
                 x, y = re.search(self._input_regex, message.content).groups()  # type: ignore
                 x, y = int(x), int(y)
@@ -563,7 +876,7 @@ class BaseGame:
 
                 return x, y
             except asyncio.TimeoutError:
-                if timeout:
+                if timeout or self.clock is not None:
                     await self._prompt_msg.timeout(this_turn, next_turn)
                     return 'timeout', None
                 timeout = True
@@ -616,6 +929,8 @@ class TicTacToeBoard(BaseBoard):
 
 
 class TicTacToeGame(BaseGame):
+    name = 'tictactoe'
+
     def __init__(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
@@ -638,6 +953,12 @@ class TicTacToeGame(BaseGame):
 
 
 class ConnectFourBoard(BaseBoard):
+    image_style = BoardStyle(
+        (30, 80, 200),
+        (20, 50, 140),
+        {'1': ('stone', (250, 210, 40)), '2': ('stone', (220, 40, 40))},
+    )
+
     def __init__(self) -> None:
         self.p1_emoji = '\U0001f7e1'  # 🟡
         self.p2_emoji = '\U0001f534'  # 🔴
@@ -697,6 +1018,8 @@ class ConnectFourBoard(BaseBoard):
 
 
 class ConnectFourGame(BaseGame):
+    name = 'connectfour'
+
     def __init__(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
@@ -718,7 +1041,7 @@ class ConnectFourGame(BaseGame):
         )
 
     async def _loop_begin(self) -> bool:
-        await self._ctx.send(
+        await self._send(
             f'{C.B}{self._player1.color}{self._player1.color_name}: {self._player1}, '
             f'{self._player2.color}{self._player2.color_name}: {self._player2}{C.E}'
         )
@@ -726,16 +1049,16 @@ class ConnectFourGame(BaseGame):
         assert isinstance(as_emojis, tuple)
         board1, board2 = as_emojis
 
-        msg1 = await self._ctx.send(board1)
-        msg2 = await self._ctx.send(board2)
+        msg1 = await self._send(board1)
+        msg2 = await self._send(board2)
         self._board_msg = BoardMessage([msg1, msg2], self._board)
 
-        self._board_msg.message = cast(list[discord.Message], self._board_msg)
+        self._board_msg.message = cast(list[discord.Message], self._board_msg.message)
         for num in NUM_EMOTES[:7]:
             await self._board_msg.message[1].add_reaction(num)
 
         self._prompt_msg = PromptMessage(
-            await self._ctx.send(
+            await self._send(
                 f"{self._player1.mention} {self._player1.color_name}'s turn!"
             )
         )
@@ -778,6 +1101,12 @@ class ConnectFourGame(BaseGame):
 
 
 class ReversiBoard(BaseBoard):
+    image_style = BoardStyle(
+        (40, 140, 60),
+        (20, 80, 30),
+        {'1': ('stone', (20, 20, 20)), '2': ('stone', (240, 240, 240))},
+    )
+
     def __init__(self) -> None:
         super().__init__('\U0001f311', '\U000026aa', '\U0001f7e9', 8)  # 🌑, ⚪, 🟩
         self.rows = [
@@ -867,13 +1196,19 @@ class ReversiBoard(BaseBoard):
 
 
 class ReversiGame(BaseGame):
+    name = 'reversi'
+
     def __init__(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         bot: commands.Bot,
         opponent: discord.Member,
         time: int = 10,
+        *,
+        increment: int = 5,
+        image: bool = False,
     ) -> None:
+        """Each player has `time` minutes, and gains `increment` seconds per move."""
         super().__init__(
             ctx,
             bot,
@@ -886,45 +1221,29 @@ class ReversiGame(BaseGame):
             64,
             r'(?P<x>[1-8])[, ]*(?P<y>[1-8])',
             45,
+            image=image,
         )
         self._input_occupied_error = 'invalid'
 
         self._time = time
-        self._start_time = None
+        self.clock = GameClock(time * 60, increment=increment)
 
     async def _loop_begin(self) -> bool:
-        self._start_time = datetime.datetime.now()
-        await self._ctx.send(
-            f'{C.B}{C.BOLD_GREEN}Time limit: {C.CYAN}{self._time} minutes!\n'
+        assert self.clock is not None
+        await self._send(
+            f'{C.B}{C.BOLD_GREEN}Time limit: {C.CYAN}{self._time} minutes each, '
+            f'+{self.clock.increment} seconds per move!\n'
             f'{self._player1.color}{self._player1.color_name}: {self._player1}, '
             f'{self._player2.color}{self._player2.color_name}: {self._player2}{C.E}'
         )
-        boart1, board2, board3 = cast(
-            tuple[str, str, str], await self._board.to_emojis()
-        )
-        msg1 = await self._ctx.send(boart1)
-        msg2 = await self._ctx.send(board2)
-        msg3 = await self._ctx.send(board3)
-        self._board_msg = BoardMessage([msg1, msg2, msg3], self._board)
+        self._board_msg = await self._send_board()
         self._prompt_msg = PromptMessage(
-            await self._ctx.send(
+            await self._send(
                 f"{self._player1.mention} {self._player1.color_name}'s turn!"
             )
         )
         return False
 
-    async def _iter_begin(self, this_turn: Player, next_turn: Player) -> bool:
-        assert self._start_time is not None
-        delta: datetime.timedelta = datetime.datetime.now() - self._start_time
-        if delta.seconds / 60 > self._time:
-            await self._check_board_win(
-                this_turn, next_turn, force=True, time_is_out=True
-            )
-            return True
-
-        await self._prompt_msg.update(this_turn)
-        return False
-
     async def _loop_end(self, this_turn: Player, next_turn: Player) -> None:
         await self._check_board_win(this_turn, next_turn)
 
@@ -934,7 +1253,6 @@ class ReversiGame(BaseGame):
         next_turn: Player,
         *,
         force: bool = False,
-        time_is_out: bool = False,
     ) -> bool:
         if not force:
             return False
@@ -945,21 +1263,16 @@ class ReversiGame(BaseGame):
                 this_turn,
                 points_ratio=(black, white),
                 draw=True,
-                time_is_out=time_is_out,
             )
             self.winner = this_turn.member
             self.loser = next_turn.member
             self.tie = True
         elif black > white:
-            await self._prompt_msg.winner(
-                self._player1, points_ratio=(black, white), time_is_out=time_is_out
-            )
+            await self._prompt_msg.winner(self._player1, points_ratio=(black, white))
             self.winner = self._player1.member
             self.loser = self._player2.member
         else:
-            await self._prompt_msg.winner(
-                self._player2, points_ratio=(white, black), time_is_out=time_is_out
-            )
+            await self._prompt_msg.winner(self._player2, points_ratio=(white, black))
             self.winner = self._player2.member
             self.loser = self._player1.member
         return True
@@ -1035,6 +1348,18 @@ class WeiqiSquare(Square):
 
 
 class WeiqiBoard(BaseBoard):
+    image_style = BoardStyle(
+        (220, 180, 100),
+        (60, 40, 20),
+        {
+            '1': ('stone', (20, 20, 20)),
+            '2': ('stone', (240, 240, 240)),
+            '\U00002b1b': ('mark', (20, 20, 20)),  # ⬛
+            '\U00002b1c': ('mark', (240, 240, 240)),  # ⬜
+        },
+        intersections=True,
+    )
+
     def __init__(self) -> None:
         self.p1_emoji = '\U0001f311'
         self.p2_emoji = '\U000026aa'
@@ -1070,6 +1395,9 @@ class WeiqiBoard(BaseBoard):
     def __str__(self) -> str:
         raise NotImplementedError
 
+    def squares(self) -> list[str]:
+        return [square.occupier for row in self._rows for square in row]
+
     async def to_emojis(self) -> list[discord.Embed]:
         NUMS = '⒈⒉⒊⒋⒌⒍⒎⒏⒐⒑⒒⒓⒔⒕⒖⒗⒘⒙⒚'
         final_string = ''
@@ -1162,13 +1490,20 @@ class WeiqiBoard(BaseBoard):
 
 
 class WeiqiGame(BaseGame):
+    name = 'weiqi'
+    cpu_cost = 2
+
     def __init__(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         bot: commands.Bot,
         opponent: discord.Member,
         time: int = 20,
+        *,
+        byoyomi: tuple[int, int] = (3, 30),
+        image: bool = False,
     ) -> None:
+        """Each player has `time` minutes, then `byoyomi` periods of seconds."""
         super().__init__(
             ctx,
             bot,
@@ -1181,50 +1516,35 @@ class WeiqiGame(BaseGame):
             500,
             r'(?P<x>1[0-9]|[1-9])[, ]*(?P<y>1[0-9]|[1-9])',
             45,
+            image=image,
         )
 
         self._time = time
-        self._start_time = None
+        periods, period = byoyomi
+        self.clock = GameClock(time * 60, periods=periods, period=period)
 
     async def _loop_begin(self) -> bool:
-        self._start_time = datetime.datetime.now()
-        await self._ctx.send(
-            f'{C.B}{C.BOLD_GREEN}Time limit: {C.CYAN}{self._time} minutes!\n'
+        assert self.clock is not None
+        await self._send(
+            f'{C.B}{C.BOLD_GREEN}Time limit: {C.CYAN}{self._time} minutes each, '
+            f'then {self.clock.periods[0]} periods of {self.clock.period} seconds!\n'
             f'{self._player1.color}{self._player1.color_name}: {self._player1}, '
             f'{self._player2.color}{self._player2.color_name}: {self._player2}{C.E}'
         )
-        self._board_msg = BoardMessage(
-            await self._ctx.send(
-                embeds=cast(list[discord.Embed], await self._board.to_emojis())
-            ),
-            self._board,
-        )
+        self._board_msg = await self._send_board()
         self._prompt_msg = PromptMessage(
-            await self._ctx.send(
+            await self._send(
                 f"{self._player1.mention} {self._player1.color_name}'s turn!"
             )
         )
         return False
 
-    async def _iter_begin(self, this_turn: Player, next_turn: Player) -> bool:
-        assert self._start_time is not None
-        delta: datetime.timedelta = datetime.datetime.now() - self._start_time
-        if delta.seconds / 60 > self._time:
-            await self._check_board_win(
-                this_turn, next_turn, force=True, time_is_out=True
-            )
-            return True
-
-        await self._prompt_msg.update(this_turn)
-        return False
-
     async def _check_board_win(
         self,
         this_turn: Player,
         next_turn: Player,
         *,
         force: bool = False,
-        time_is_out: bool = False,
     ) -> bool:
         if not force:
             return False
@@ -1236,21 +1556,16 @@ class WeiqiGame(BaseGame):
                 this_turn,
                 points_ratio=(black, white),
                 draw=True,
-                time_is_out=time_is_out,
             )
             self.winner = this_turn.member
             self.loser = next_turn.member
             self.tie = True
         elif black > white:
-            await self._prompt_msg.winner(
-                self._player1, points_ratio=(black, white), time_is_out=time_is_out
-            )
+            await self._prompt_msg.winner(self._player1, points_ratio=(black, white))
             self.winner = self._player1.member
             self.loser = self._player2.member
         else:
-            await self._prompt_msg.winner(
-                self._player2, points_ratio=(white, black), time_is_out=time_is_out
-            )
+            await self._prompt_msg.winner(self._player2, points_ratio=(white, black))
             self.winner = self._player2.member
             self.loser = self._player1.member
         return True
@@ -1667,6 +1982,8 @@ class SingleBattleshipBoardAdapter(BaseBoard):
 
 
 class GomokuBoard(BaseBoard):
+    image_style = WeiqiBoard.image_style
+
     def __init__(self) -> None:
         super().__init__('\U0001f311', '\U000026aa', '\U0001f7eb', 19)
         self._rows = [self._all_squares[k - 19 : k] for k in range(19, 361, 19)]
@@ -1712,11 +2029,16 @@ class GomokuBoard(BaseBoard):
 
 
 class GomukuGame(BaseGame):
+    name = 'gomoku'
+    cpu_cost = 1
+
     def __init__(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         bot: commands.Bot,
         opponent: discord.Member,
+        *,
+        image: bool = False,
     ) -> None:
         super().__init__(
             ctx,
@@ -1730,21 +2052,17 @@ class GomukuGame(BaseGame):
             361,
             r'(?P<x>1[0-9]|[1-9])[, ]*(?P<y>1[0-9]|[1-9])',
             30,
+            image=image,
         )
 
     async def _loop_begin(self) -> bool:
-        await self._ctx.send(
+        await self._send(
             f'{C.B}{self._player1.color}{self._player1.color_name}: {self._player1}, '
             f'{self._player2.color}{self._player2.color_name}: {self._player2}{C.E}'
         )
-        self._board_msg = BoardMessage(
-            await self._ctx.send(
-                embeds=cast(list[discord.Embed], await self._board.to_emojis())
-            ),
-            self._board,
-        )
+        self._board_msg = await self._send_board()
         self._prompt_msg = PromptMessage(
-            await self._ctx.send(
+            await self._send(
                 f"{self._player1.mention} {self._player1.color_name}'s turn!"
             )
         )
@@ -1752,6 +2070,9 @@ class GomukuGame(BaseGame):
 
 
 class BattleshipGame(BaseGame):
+    name = 'battleship'
+    board_length = 10  # the boards are only made in _loop_begin
+
     def __init__(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
@@ -1776,7 +2097,7 @@ class BattleshipGame(BaseGame):
         start_view = EphemeralBattleshipStartView(
             self._bot, self._player1, self._player2
         )
-        start_message = await self._ctx.send(
+        start_message = await self._send(
             f'{C.B}{C.BOLD_RED}Red: {C.RED}{self._player1}{C.YELLOW}, '
             f'{C.BOLD_BLUE}Blue: {C.BLUE}{self._player2}{C.E}',
             view=start_view,
@@ -1821,10 +2142,10 @@ class BattleshipGame(BaseGame):
                 for sq in sq_list.allpoints:
                     await board2.initial_set_square(sq.x, sq.y, '0')
             self._board_msg = BoardMessage(
-                await self._ctx.send(embeds=await self._board.to_emojis()), self._board
+                await self._send(embeds=await self._board.to_emojis()), self._board
             )
             self._prompt_msg = PromptMessage(
-                await self._ctx.send(
+                await self._send(
                     f"{self._player1.mention} {self._player1.color_name}'s turn! (send coordinates)"
                 )
             )
@@ -1975,21 +2296,1367 @@ class InteractionContextAdapter:
         return await self.interaction.original_response()
 
 
+REPLAY_BOARDS: dict[str, type[BaseBoard]] = {
+    'tictactoe': TicTacToeBoard,
+    'connectfour': ConnectFourBoard,
+    'reversi': ReversiBoard,
+    'weiqi': WeiqiBoard,
+    'gomoku': GomokuBoard,
+}
+REPLAY_CELL_SIZE = 16
+REPLAY_FRAME_MS = 500
+REPLAY_LAST_FRAME_MS = 4000
+
+
+def render_replay(
+    game: str, moves: list[tuple[int, int]], fmt: Literal['gif', 'webp'] = 'gif'
+) -> bytes:
+    """Render a finished game as an animation with one frame per move.
+
+    This is CPU heavy, run it with `Vesuvius.run_in_ppexec`.
+    """
+    return asyncio.run(_replay_frames(REPLAY_BOARDS[game](), moves, fmt))  # type: ignore
+
+
+async def _replay_frames(
+    board: BaseBoard, moves: list[tuple[int, int]], fmt: Literal['gif', 'webp']
+) -> bytes:
+    squares = board.squares()
+    renderer = BoardRenderer(
+        board.image_style,
+        board.length,
+        len(squares) // board.length,
+        cell=REPLAY_CELL_SIZE,
+    )
+    frames = [renderer.draw(squares).copy()]
+    value: Literal['1', '2'] = '1'
+    for x, y in moves:
+        await play_move(board, x, y, value)
+        # the renderer only pastes the squares this move changed
+        frames.append(renderer.draw(board.squares()).copy())
+        value = '2' if value == '1' else '1'
+
+    buffer = BytesIO()
+    frames[0].save(
+        buffer,
+        fmt,
+        save_all=True,
+        append_images=frames[1:],
+        duration=[REPLAY_FRAME_MS] * (len(frames) - 1) + [REPLAY_LAST_FRAME_MS],
+        loop=0,
+    )
+    return buffer.getvalue()
+
+
+class ChannelContextAdapter:
+    """Adapts a channel to the context interface, for games that are not started
+    by a command, like resumed games."""
+
+    def __init__(
+        self, channel: discord.TextChannel | discord.Thread, author: discord.Member
+    ):
+        self.author = author
+        self.channel = channel
+        self.send = self.channel.send
+
+    async def reply(self, content: str | None = None, **kwargs: Any) -> discord.Message:
+        return await self.channel.send(content, **kwargs)
+
+
+RESUMABLE_GAMES: dict[str, tuple[type[BaseGame], str]] = {
+    'tictactoe': (TicTacToeGame, 'tictactoe'),
+    'connectfour': (ConnectFourGame, 'connectfour'),
+    'reversi': (ReversiGame, 'reversi'),
+    'weiqi': (WeiqiGame, 'weiqi'),
+    'gomoku': (GomukuGame, 'gomoku'),
+}
+"""Games that can be resumed from a snapshot, and the name their results are
+recorded under."""
+
+CORRESPONDENCE_BOARDS: dict[str, type[BaseBoard]] = {
+    'reversi': ReversiBoard,
+    'weiqi': WeiqiBoard,
+    'gomoku': GomokuBoard,
+}
+CORRESPONDENCE_CACHE_SIZE = 64
+
+
+class CorrespondenceGame:
+    """A game where each player has hours or days per move.
+
+    Nothing runs while a correspondence game waits for a move, it is stored in
+    the archive and loaded with `load` when a move comes in. Player 1 moves first
+    and plays '1'.
+    """
+
+    def __init__(
+        self,
+        game_id: int,
+        name: str,
+        player1: int,
+        player2: int,
+        channel: int,
+        per_move: float,
+        deadline: float,
+        image: bool,
+        end_request: Optional[int],
+        board: BaseBoard,
+        moves: list[tuple[int, int]],
+    ) -> None:
+        self.game_id = game_id
+        self.name = name
+        self.player1 = player1
+        self.player2 = player2
+        self.channel = channel
+        self.per_move = per_move
+        self.deadline = deadline
+        self.image = image
+        self.end_request = end_request
+        self.board = board
+        self.moves = moves
+        self.lock = asyncio.Lock()
+        # set under the lock once the game is over, for callers that were
+        # waiting for the lock meanwhile
+        self.ended = False
+
+    @classmethod
+    async def load(
+        cls, database: Database, game_id: int
+    ) -> Optional[CorrespondenceGame]:
+        """Rebuild a correspondence game from the archive by playing its moves."""
+        row = await database.get_correspondence(game_id)
+        archived = await database.get_archived_moves(game_id)
+        if row is None or archived is None:
+            return None
+        name, _, player1, player2, channel, per_move, deadline, image, end_request = row
+        _, moves = archived
+        board = await cls.build_board(name, moves)
+        return cls(
+            game_id,
+            name,
+            player1,
+            player2,
+            channel,
+            per_move,
+            deadline,
+            bool(image),
+            end_request,
+            board,
+            moves,
+        )
+
+    @staticmethod
+    async def build_board(name: str, moves: list[tuple[int, int]]) -> BaseBoard:
+        board = CORRESPONDENCE_BOARDS[name]()
+        for k, (x, y) in enumerate(moves):
+            await play_move(board, x, y, '1' if k % 2 == 0 else '2')
+        return board
+
+    @property
+    def to_move(self) -> int:
+        """Id of the player whose turn it is."""
+        return self.player2 if len(self.moves) % 2 else self.player1
+
+    @property
+    def waiting(self) -> int:
+        return self.player1 if len(self.moves) % 2 else self.player2
+
+    @property
+    def value(self) -> Literal['1', '2']:
+        return '2' if len(self.moves) % 2 else '1'
+
+    async def play(self, database: Database, x: int, y: int) -> bool:
+        """Play a move for the player whose turn it is and store it.
+
+        Returns False if the move is not allowed. The game only changes once the
+        move is stored, so it still matches the archive if that fails.
+        """
+        if not await self.board.is_valid_square(x, y, self.value):
+            return False
+        deadline = time.time() + self.per_move
+        try:
+            await database.add_correspondence_move(
+                self.game_id,
+                len(self.moves),
+                pack_moves([(x, y)], self.board.length),
+                deadline,
+            )
+        except BaseException:
+            # some boards change in is_valid_square
+            self.board = await self.build_board(self.name, self.moves)
+            raise
+        await self.board.set_square(x, y, self.value)
+        self.moves.append((x, y))
+        self.deadline = deadline
+        self.end_request = None
+        return True
+
+    async def result(self) -> Optional[tuple[int, int, bool]]:
+        """Winner, loser and whether it is a tie, if the game is over.
+
+        Gomoku is over when a player has five in a row, and every game is over
+        when the board is full.
+        """
+        if self.name == 'gomoku' and await self.board.check_win() != '0':
+            return self.waiting, self.to_move, False
+        if '0' not in self.board.squares():
+            return await self.score()
+        return None
+
+    async def score(self) -> tuple[int, int, bool]:
+        """Winner, loser and whether it is a tie, by counting the board."""
+        if self.name == 'gomoku':
+            return self.player1, self.player2, True
+        black, white = cast(tuple[int, int], await self.board.check_win())
+        if black >= white:
+            return self.player1, self.player2, black == white
+        return self.player2, self.player1, False
+
+
+LEADERBOARD_LENGTH = 10
+"""Players shown in a leaderboard."""
+
+TOURNAMENT_CONCURRENCY = 16
+"""Games of one tournament that are played at once."""
+TOURNAMENT_NO_SHOW = 300
+"""Seconds to wait for a player who is in another game before they forfeit."""
+TOURNAMENT_STANDINGS_LINES = 30
+
+
+class Tournament:
+    """A Swiss or round-robin tournament, and the task that plays it.
+
+    The games of a round are played at the same time, at most `concurrency` at
+    once, each in the channel of the tournament with the fewest games. Swiss
+    rounds are paired once the round before is over. Round-robin pairings are
+    known from the start, so each of their games starts as soon as both players
+    have finished their earlier rounds instead of waiting for the whole round.
+    """
+
+    def __init__(
+        self,
+        features: GameFeatures,
+        tournament_id: int,
+        guild: discord.Guild,
+        organizer: int,
+        game: str,
+        format: str,
+        channels: list[discord.TextChannel | discord.Thread],
+        standings: Standings,
+        *,
+        rounds: int = 0,
+        concurrency: int = TOURNAMENT_CONCURRENCY,
+    ) -> None:
+        self.features = features
+        self.bot = features.bot
+        self.tournament_id = tournament_id
+        self.guild = guild
+        self.organizer = organizer
+        self.game = game
+        self.format = format
+        self.channels = channels
+        self.standings = standings
+        self.rounds = rounds
+        self.task: Optional[asyncio.Task[None]] = None
+        # games run apart from the task, so cancelling it does not stop them
+        self.games: set[asyncio.Task[None]] = set()
+
+        self._slots = asyncio.Semaphore(concurrency)
+        self._results = asyncio.Condition()
+        self._load = {channel.id: 0 for channel in channels}
+
+    @classmethod
+    async def load(
+        cls, features: GameFeatures, row: tuple[Any, ...]
+    ) -> Optional[Tournament]:
+        """Rebuild a tournament and its standings from the database."""
+        tournament_id, guild_id, organizer, game, format, rounds, channel_ids, _ = row
+        guild = features.bot.get_guild(guild_id)
+        channels = [
+            channel
+            for channel in map(
+                features.bot.get_channel, map(int, channel_ids.split(','))
+            )
+            if isinstance(channel, (discord.TextChannel, discord.Thread))
+        ]
+        if guild is None or not channels:
+            return None
+        standings = Standings()
+        database = features.bot.database
+        for user, withdrawn in await database.get_tournament_players(tournament_id):
+            standings.add_player(user)
+            if withdrawn:
+                standings.withdraw(user)
+        for pairing in await database.get_tournament_pairings(tournament_id):
+            standings.add_pairing(Pairing(*pairing))
+        return cls(
+            features,
+            tournament_id,
+            guild,
+            organizer,
+            game,
+            format,
+            channels,
+            standings,
+            rounds=rounds,
+        )
+
+    @property
+    def started(self) -> bool:
+        return self.rounds > 0
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+        self.task.add_done_callback(self._stopped)
+
+    def _stopped(self, task: asyncio.Task[None]) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f'TOURNAMENT {self.tournament_id} STOPPED:', repr(task.exception()))
+
+    def cancel(self, *, games: bool = False) -> list[asyncio.Task[None]]:
+        """Stop pairing players. The games that are being played go on, as games
+        outside the tournament, unless `games` is True. Returns the tasks that
+        were cancelled."""
+        tasks = [self.task] if self.task is not None else []
+        if games:
+            tasks.extend(self.games)
+        for task in tasks:
+            task.cancel()
+        return tasks
+
+    async def run(self) -> None:
+        """Play every round, then post the final standings."""
+        if self.format == 'roundrobin':
+            if not self.standings.pairings:
+                await self._add_pairings(round_robin_schedule(self.standings.active))
+            await asyncio.gather(
+                *(self._play(p) for p in self.standings.pairings if p.result is None)
+            )
+        else:
+            for round in range(1, self.rounds + 1):
+                pairings = self.standings.in_round(round)
+                if not pairings:
+                    pairings = self.standings.pair_swiss(round)
+                    await self._add_pairings(pairings)
+                    await self._announce_round(round, pairings)
+                await asyncio.gather(
+                    *(self._play(p) for p in pairings if p.result is None)
+                )
+        await self.bot.database.end_tournament(self.tournament_id)
+        self.features.tournaments.pop(self.tournament_id, None)
+        await self.channels[0].send(
+            self.standings_message(
+                f'tournament {self.tournament_id} is over! final standings:'
+            )
+        )
+
+    def name_of(self, player: int) -> str:
+        member = self.guild.get_member(player)
+        return member.display_name if member else str(player)
+
+    def standings_message(self, title: str) -> str:
+        lines = []
+        for k, player in enumerate(
+            self.standings.ranking()[:TOURNAMENT_STANDINGS_LINES], 1
+        ):
+            withdrawn = ' (withdrawn)' if player in self.standings.withdrawn else ''
+            lines.append(
+                f'{C.WHITE}{k:>3}. {C.CYAN}{self.name_of(player)[:20]:<20}'
+                f'{C.YELLOW}{self.standings.score(player):>5g}'
+                f'{C.NCLR}{self.standings.buchholz(player):>6g}{withdrawn}'
+            )
+        return f'{C.B}{C.BOLD_GREEN}{title}\n' + '\n'.join(lines) + C.E
+
+    async def _announce_round(self, round: int, pairings: list[Pairing]) -> None:
+        lines = [
+            f'{C.CYAN}{self.name_of(p.first)} {C.YELLOW}vs{C.CYAN} '
+            + (self.name_of(p.second) if p.second is not None else 'bye')
+            for p in pairings
+        ]
+        header = f'{C.B}{C.BOLD_GREEN}round {round} of tournament {self.tournament_id}:'
+        # stay below the message length limit
+        for k in range(0, len(lines), 30):
+            await self.channels[0].send(
+                header + '\n' + '\n'.join(lines[k : k + 30]) + C.E
+            )
+
+    async def _add_pairings(self, pairings: list[Pairing]) -> None:
+        for pairing in pairings:
+            self.standings.add_pairing(pairing)
+        await self.bot.database.add_tournament_pairings(
+            self.tournament_id,
+            [(p.round, p.first, p.second, p.result) for p in pairings],
+        )
+
+    async def _play(self, pairing: Pairing) -> None:
+        """Play a pairing once both players are free, and record the result.
+
+        Players that have withdrawn forfeit, and both players lose if the game
+        cannot be played.
+        """
+        async with self._results:
+            await self._results.wait_for(lambda: self.standings.ready(pairing))
+        withdrawn = [p in self.standings.withdrawn for p in pairing.players]
+        game_id = None
+        if all(withdrawn):
+            result = '0'
+        elif any(withdrawn):
+            result = '2' if withdrawn[0] else '1'
+        else:
+            async with self._slots:
+                channel = min(self.channels, key=lambda c: self._load[c.id])
+                self._load[channel.id] += 1
+                try:
+                    result, game_id = await self._play_game(pairing, channel)
+                except Exception as e:
+                    print(
+                        f'CANNOT PLAY round {pairing.round} of tournament '
+                        f'{self.tournament_id}:',
+                        repr(e),
+                    )
+                    result, game_id = '0', pairing.game_id
+                finally:
+                    self._load[channel.id] -= 1
+        self.standings.record(pairing, result)
+        await self.bot.database.set_tournament_pairing(
+            self.tournament_id, pairing.round, pairing.first, result, game_id
+        )
+        async with self._results:
+            self._results.notify_all()
+
+    async def _play_game(
+        self, pairing: Pairing, channel: discord.TextChannel | discord.Thread
+    ) -> tuple[str, Optional[int]]:
+        """Play the game of a pairing, resuming it if it was running when the bot
+        stopped. Returns the result and the game id."""
+        game_type, result_name = RESUMABLE_GAMES[self.game]
+        game: Optional[BaseGame] = None
+        if pairing.game_id is not None:
+            data = await self.bot.database.get_snapshot(pairing.game_id)
+            try:
+                if data is not None:
+                    game, _ = await self.features.restore_game(
+                        pairing.game_id, self.game, data
+                    )
+            except (discord.HTTPException, KeyError, ValueError) as e:
+                print(f'CANNOT RESUME game {pairing.game_id}:', e)
+                await self.bot.database.delete_snapshot(pairing.game_id)
+        resumed = game is not None
+        if game is None:
+            members: list[discord.Member] = []
+            for player in pairing.players:
+                try:
+                    members.append(
+                        self.guild.get_member(player)
+                        or await self.guild.fetch_member(player)
+                    )
+                except discord.NotFound:
+                    # left the server
+                    return ('2' if player == pairing.first else '1'), None
+            first, second = members
+            game = game_type(ChannelContextAdapter(channel, first), self.bot, second)
+            game._seat_players(Player(first), Player(second))
+
+        session = await self._reserve(game, pairing)
+        if isinstance(session, str):
+            return session, None
+        await game._ctx.send(
+            f'{C.B}{C.BOLD_GREEN}tournament {self.tournament_id}, round '
+            f'{pairing.round}: {C.CYAN}{game._player1} {C.YELLOW}vs{C.CYAN} '
+            f'{game._player2}{C.E} {game._player1.mention} {game._player2.mention}'
+        )
+
+        async def on_start(game: BaseGame) -> None:
+            pairing.game_id = game.game_id
+            await self.bot.database.set_tournament_pairing(
+                self.tournament_id, pairing.round, pairing.first, None, game.game_id
+            )
+
+        task = asyncio.create_task(
+            self.features.play_session(
+                session, game, result_name, resumed=resumed, on_start=on_start
+            )
+        )
+        self.games.add(task)
+        task.add_done_callback(self.games.discard)
+        await asyncio.shield(task)
+        if game.winner is None:
+            return '0', game.game_id
+        if game.tie:
+            return '=', game.game_id
+        return ('1' if game.winner.id == pairing.first else '2'), game.game_id
+
+    async def _reserve(self, game: BaseGame, pairing: Pairing) -> Session | str:
+        """Reserve a session for the players of a pairing, waiting for those in
+        other games. Returns the result of the pairing instead if they do not
+        finish them in time."""
+        deadline = time.monotonic() + TOURNAMENT_NO_SHOW
+        while True:
+            session = self.bot.sessions.reserve(
+                pairing.players,
+                game=game.name,
+                guild_id=self.guild.id,
+                channel_id=game._ctx.channel.id,
+            )
+            if session is not None:
+                return session
+            if time.monotonic() > deadline:
+                busy = [p in self.bot.sessions for p in pairing.players]
+                return '0' if all(busy) else '2' if busy[0] else '1'
+            await asyncio.sleep(15)
+
+
 class GameFeatures(commands.GroupCog, name='play'):
     def __init__(self, bot: Vesuvius) -> None:
         self.bot = bot
-        self.ingame: list[int] = []
+        self.replay_tasks: dict[tuple[int, str], asyncio.Task[bool]] = {}
+        self.running: dict[int, tuple[BaseGame, asyncio.Task[Any]]] = {}
+        self.resume_task: Optional[asyncio.Task[None]] = None
+        self.correspondence: OrderedDict[int, CorrespondenceGame] = OrderedDict()
+        self.tournaments: dict[int, Tournament] = {}
+        self.queues: dict[tuple[int, str], MatchQueue] = {}
+        self.match_tasks: set[asyncio.Task[None]] = set()
+        self.resumed_tasks: set[asyncio.Task[None]] = set()
+        # players that `queue` is adding, until they are in a queue
+        self.joining: set[int] = set()
+        # rendered top of every leaderboard, and rank lines of the players that
+        # asked, with the result version they were rendered at
+        self.leaderboards: dict[tuple[int, str], tuple[int, str, dict[int, str]]] = {}
         super().__init__()
 
+    async def cog_load(self) -> None:
+        self.resume_task = asyncio.create_task(self.resume_games())
+        self.expire_correspondence.start()
+        self.sweep_queues.start()
+
+    async def cog_unload(self) -> None:
+        """Stop every game that can be resumed, keeping their snapshots so they
+        continue when the cog is loaded again."""
+        if self.resume_task is not None:
+            self.resume_task.cancel()
+        self.expire_correspondence.cancel()
+        self.sweep_queues.cancel()
+        tournaments = [
+            task for t in self.tournaments.values() for task in t.cancel(games=True)
+        ]
+        await asyncio.gather(*tournaments, return_exceptions=True)
+        tasks = [
+            task for game, task in self.running.values() if game.name in RESUMABLE_GAMES
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def resume_games(self) -> None:
+        """Resume every game that has a snapshot, and every tournament that has
+        not ended. Games of tournaments are resumed by their tournament."""
+        await self.bot.wait_until_ready()
+        for (
+            user,
+            guild,
+            game,
+            channel,
+            rating,
+            joined,
+        ) in await self.bot.database.get_queued():
+            self.enqueue(guild, game, Waiting(user, rating, joined, channel))
+        for row in await self.bot.database.get_open_tournaments():
+            tournament = await Tournament.load(self, row)
+            if tournament is None:
+                print(f'CANNOT RESUME tournament {row[0]}: no guild or channels')
+                continue
+            self.tournaments[tournament.tournament_id] = tournament
+        tournament_games = {
+            p.game_id
+            for tournament in self.tournaments.values()
+            for p in tournament.standings.pairings
+            if p.result is None
+        }
+        for game_id, name, data in await self.bot.database.get_snapshots():
+            if game_id in self.running or game_id in tournament_games:
+                continue
+            try:
+                game, result_name = await self.restore_game(game_id, name, data)
+            except (discord.HTTPException, KeyError, ValueError) as e:
+                print(f'CANNOT RESUME game {game_id}:', e)
+                await self.bot.database.delete_snapshot(game_id)
+                continue
+            session = self.bot.sessions.reserve(
+                (game._player1.member.id, game._player2.member.id),
+                game=name,
+                guild_id=game._ctx.channel.guild.id,
+                channel_id=game._ctx.channel.id,
+            )
+            if session is None:
+                print(f'CANNOT RESUME game {game_id}: players are in another game')
+                continue
+            task = asyncio.create_task(
+                self.play_session(session, game, result_name, resumed=True),
+                name=f'{name} {game_id}',
+            )
+            self.resumed_tasks.add(task)
+            task.add_done_callback(self.resumed_done)
+            print(f'RESUMED {name} {game_id}')
+        for tournament in self.tournaments.values():
+            if tournament.started:
+                tournament.start()
+                print(f'RESUMED tournament {tournament.tournament_id}')
+
+    def resumed_done(self, task: asyncio.Task[None]) -> None:
+        self.resumed_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f'RESUMED GAME {task.get_name()} FAILED:', repr(task.exception()))
+
+    async def restore_game(
+        self, game_id: int, name: str, data: bytes
+    ) -> tuple[BaseGame, str]:
+        game_type, result_name = RESUMABLE_GAMES[name]
+        snapshot = GameSnapshot.unpack(data)
+        channel = self.bot.get_channel(snapshot.channel)
+        if not isinstance(channel, (discord.TextChannel, discord.Thread)):
+            raise KeyError(f'no channel {snapshot.channel}')
+        player1, player2 = [
+            channel.guild.get_member(m) or await channel.guild.fetch_member(m)
+            for m in (snapshot.player1, snapshot.player2)
+        ]
+        game = await game_type.from_snapshot(
+            self.bot, channel, player1, player2, snapshot
+        )
+        game.game_id = game_id
+        return game, result_name
+
     @commands.command(name='ingames')
     @commands.dynamic_cooldown(owner_bypass(180), commands.BucketType.user)
     @commands.guild_only()
     async def ingames(self, ctx: commands.Context[Vesuvius], clear: str = ''):
-        await ctx.send(f'```py\n{self.ingame}```')
+        assert ctx.guild
+        sessions = sorted(
+            self.bot.sessions.in_guild(ctx.guild.id), key=lambda s: s.started
+        )
+        lines = [
+            f'{C.PINK}{s.game:<12}{C.CYAN}'
+            + ' vs '.join(str(ctx.guild.get_member(p) or p) for p in s.players)
+            + f' in #{getattr(self.bot.get_channel(s.channel_id), "name", s.channel_id)}'
+            for s in sessions[:20]
+        ]
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}{len(sessions)} games in this server, '
+            f'{len(self.bot.sessions)} in total.\n' + '\n'.join(lines) + C.E
+        )
         if clear == 'clear':
-            self.ingame.clear()
+            self.bot.sessions.clear()
             await ctx.send(f'{C.B}{C.GREEN}cleared!{C.E}')
 
+    @commands.command(name='replay')
+    @commands.dynamic_cooldown(owner_bypass(30), commands.BucketType.user)
+    async def replay(
+        self,
+        ctx: commands.Context[Vesuvius],
+        game_id: int,
+        fmt: Literal['gif', 'webp'] = 'gif',
+    ):
+        """watch a finished game again. usage: `replay game_id [gif, webp]"""
+        path = self.bot.files['replays'] / f'{game_id}.{fmt}'
+        if not path.exists():
+            if (game_id, fmt) not in self.replay_tasks:
+                self.replay_tasks[game_id, fmt] = asyncio.create_task(
+                    self.make_replay(game_id, fmt)
+                )
+            try:
+                if not await self.replay_tasks[game_id, fmt]:
+                    await ctx.send(
+                        f'{C.B}{C.RED}no finished game with id {game_id}.{C.E}'
+                    )
+                    return
+            finally:
+                self.replay_tasks.pop((game_id, fmt), None)
+        await ctx.send(file=discord.File(path, filename=f'replay-{game_id}.{fmt}'))
+
+    @commands.command(name='history')
+    @commands.dynamic_cooldown(owner_bypass(30), commands.BucketType.user)
+    async def history(
+        self,
+        ctx: commands.Context[Vesuvius],
+        member: Optional[discord.Member] = None,
+        game: Optional[str] = None,
+    ):
+        """list recent games of a user. usage: `history [member] [game]"""
+        member = member or cast(discord.Member, ctx.author)
+        rows = await self.bot.database.list_archived_games(user=member.id, game=game)
+        if not rows:
+            await ctx.send(f'{C.B}{C.YELLOW}no games found.{C.E}')
+            return
+        lines = []
+        for game_id, name, _, player1, player2, _, _, started, _, numof_moves in rows:
+            opponent_id = player2 if player1 == member.id else player1
+            opponent = ctx.guild and ctx.guild.get_member(opponent_id)
+            lines.append(
+                f'{C.WHITE}{game_id:>6} {C.PINK}{name:<12}{C.CYAN}'
+                f'vs {opponent or opponent_id}, {numof_moves} moves, '
+                f'{datetime.datetime.fromtimestamp(started).strftime("%m/%d %H:%M")}'
+            )
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}recent games of {member.display_name}:\n'
+            + '\n'.join(lines)
+            + C.E
+        )
+
+    @commands.command(name='leaderboard', aliases=['lb'])
+    async def leaderboard(
+        self,
+        ctx: commands.Context[Vesuvius],
+        game: Literal[
+            'all',
+            'tictactoe',
+            'connectfour',
+            'reversi',
+            'weiqi',
+            'gomoku',
+            'battleship',
+        ] = 'all',
+        scope: Literal['server', 'global'] = 'server',
+    ):
+        """show the players with the most wins in a game, in this server or
+        everywhere. usage: `leaderboard [game] [server, global]"""
+        guild = ctx.guild if scope == 'server' else None
+        key = (guild.id if guild else 0, game)
+        version = self.bot.database.result_versions[game]
+        cached = self.leaderboards.get(key)
+        if cached is None or cached[0] != version:
+            rows = await self.bot.database.get_leaderboard(*key, LEADERBOARD_LENGTH)
+            lines = [
+                f'{C.WHITE}{k:>3}. {C.CYAN}{self.name_of(user, guild)[:20]:<20}'
+                f'{C.GREEN}{wins:>5}{C.RED}{losses:>5}{C.YELLOW}{ties:>5}'
+                for k, (user, wins, losses, ties) in enumerate(rows, 1)
+            ]
+            where = guild.name if guild else 'everywhere'
+            top = (
+                f'{C.B}{C.BOLD_GREEN}{game} leaderboard, {where}:\n'
+                f'{C.NCLR}{"":<25}{"wins":>5}{"loss":>5}{"ties":>5}\n'
+                + ('\n'.join(lines) or f'{C.CYAN}nobody has played yet.')
+            )
+            cached = self.leaderboards[key] = (version, top, {})
+        _, top, ranks = cached
+        if ctx.author.id not in ranks:
+            rank = await self.bot.database.get_leaderboard_rank(*key, ctx.author.id)
+            ranks[ctx.author.id] = (
+                f'\n{C.PINK}you are #{rank[0]} with {rank[1]} wins.'
+                if rank is not None and rank[0] > LEADERBOARD_LENGTH
+                else ''
+            )
+        await ctx.send(top + ranks[ctx.author.id] + C.E)
+
+    def name_of(self, user: int, guild: Optional[discord.Guild]) -> str:
+        member = (guild and guild.get_member(user)) or self.bot.get_user(user)
+        return member.display_name if member else str(user)
+
+    @commands.command(name='stats')
+    @commands.dynamic_cooldown(owner_bypass(10), commands.BucketType.user)
+    async def stats(
+        self,
+        ctx: commands.Context[Vesuvius],
+        member: Optional[discord.Member] = None,
+    ):
+        """show the win rate, streaks, game length and most played opponents of a
+        user in every game. usage: `stats [member]"""
+        member = member or cast(discord.Member, ctx.author)
+        rows = await self.bot.database.get_user_stats(member.id)
+        if not rows:
+            await ctx.send(f'{C.B}{C.YELLOW}{member.display_name} has not played.{C.E}')
+            return
+        lines = []
+        for game, wins, losses, ties, rating, stats in rows:
+            played = wins + losses + ties
+            lines.append(
+                f'{C.PINK}{game:<12}{C.WHITE}{played} played, '
+                f'{C.GREEN}{100 * wins / played:.0f}% won '
+                f'{C.NCLR}({wins}-{losses}-{ties})'
+                + (f'{C.CYAN}, rating {rating:.0f}' if rating is not None else '')
+            )
+            streak = (
+                f'{stats.streak} won' if stats.streak >= 0 else f'{-stats.streak} lost'
+            )
+            details = f'{C.CYAN}  streak {streak}, best {stats.best_streak}'
+            if stats.average_time is not None:
+                minutes, seconds = divmod(round(stats.average_time), 60)
+                details += f', {minutes}m {seconds:02}s a game'
+            lines.append(details)
+            if stats.opponents:
+                lines.append(
+                    f'{C.CYAN}  most played: '
+                    + ', '.join(
+                        f'{self.name_of(user, ctx.guild)} {games}'
+                        for user, games in stats.opponents
+                    )
+                )
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}stats of {member.display_name}:\n'
+            + '\n'.join(lines)
+            + C.E
+        )
+
+    @commands.command(name='correspondence')
+    @commands.dynamic_cooldown(owner_bypass(10), commands.BucketType.user)
+    @commands.guild_only()
+    async def correspondence_cmd(
+        self,
+        ctx: commands.Context[Vesuvius],
+        opponent: Optional[discord.Member] = None,
+        game: Literal['reversi', 'weiqi', 'gomoku'] = 'weiqi',
+        hours: int = 24,
+        render: Literal['emoji', 'image'] = 'emoji',
+    ):
+        """start a game with hours per move, or list your correspondence games.
+        usage: `correspondence [opponent] [reversi, weiqi, gomoku] [hours] [render]"""
+        if opponent is None:
+            await self.list_correspondence(ctx)
+            return
+        if not 1 <= hours <= 24 * 14:
+            await ctx.send(f'{C.B}{C.RED}hours must be between 1 and 336.{C.E}')
+            return
+        session = await self.wait_confirm(ctx, opponent, f'correspondence {game}')
+        if session is None:
+            return
+        # the players are only busy while they accept
+        session.release()
+
+        player1, player2 = ctx.author.id, opponent.id
+        if randint(0, 1):
+            player1, player2 = player2, player1
+        board = CORRESPONDENCE_BOARDS[game]()
+        game_id = await self.bot.database.add_archived_game(
+            game, board.length, player1, player2, ctx.guild.id, ctx.channel.id  # type: ignore
+        )
+        await self.bot.database.add_correspondence(
+            game_id, hours * 3600, render == 'image'
+        )
+        loaded = await CorrespondenceGame.load(self.bot.database, game_id)
+        assert loaded is not None
+        self.cache_correspondence(loaded)
+        await send_board(ctx, loaded.board, image=loaded.image)
+        await ctx.send(
+            f'<@{player1}> you play first in correspondence game {game_id}, '
+            f'you have {hours} hours per move. send `move {game_id} x y`'
+        )
+
+    @commands.command(name='move')
+    async def move_cmd(
+        self, ctx: commands.Context[Vesuvius], game_id: int, x: int, y: int
+    ):
+        """play a move in a correspondence game. usage: `move game_id x y"""
+        game = await self.load_correspondence(game_id)
+        if game is None or ctx.author.id not in (game.player1, game.player2):
+            await ctx.send(f'{C.B}{C.RED}no correspondence game {game_id}.{C.E}')
+            return
+        async with game.lock:
+            if game.ended:
+                await ctx.send(
+                    f'{C.B}{C.RED}correspondence game {game_id} is over.{C.E}'
+                )
+                return
+            if ctx.author.id != game.to_move:
+                await ctx.send(f'{C.B}{C.RED}it is not your turn.{C.E}')
+                return
+            length = game.board.length
+            if not (1 <= x <= length and 1 <= y <= length):
+                await ctx.send(f'{C.B}{C.RED}off board range.{C.E}')
+                return
+            if not await game.play(self.bot.database, x, y):
+                await ctx.send(f'{C.B}{C.RED}invalid spot. try another place.{C.E}')
+                return
+            await send_board(ctx, game.board, image=game.image)
+            if (result := await game.result()) is not None:
+                await self.end_correspondence(game, *result)
+                return
+        await ctx.send(
+            f'<@{game.to_move}> your move in correspondence game {game_id}, '
+            f'<t:{int(game.deadline)}:R>. send `move {game_id} x y`'
+        )
+
+    @commands.command(name='resign')
+    async def resign_cmd(self, ctx: commands.Context[Vesuvius], game_id: int):
+        """resign a correspondence game. usage: `resign game_id"""
+        game = await self.load_correspondence(game_id)
+        if game is None or ctx.author.id not in (game.player1, game.player2):
+            await ctx.send(f'{C.B}{C.RED}no correspondence game {game_id}.{C.E}')
+            return
+        async with game.lock:
+            if game.ended:
+                await ctx.send(
+                    f'{C.B}{C.RED}correspondence game {game_id} is over.{C.E}'
+                )
+                return
+            winner = game.player2 if ctx.author.id == game.player1 else game.player1
+            await self.end_correspondence(game, winner, ctx.author.id, False)
+
+    @commands.command(name='endgame')
+    async def endgame_cmd(self, ctx: commands.Context[Vesuvius], game_id: int):
+        """ask to end a correspondence game and count the board, or agree to it.
+        usage: `endgame game_id"""
+        game = await self.load_correspondence(game_id)
+        if game is None or ctx.author.id not in (game.player1, game.player2):
+            await ctx.send(f'{C.B}{C.RED}no correspondence game {game_id}.{C.E}')
+            return
+        async with game.lock:
+            if game.ended:
+                await ctx.send(
+                    f'{C.B}{C.RED}correspondence game {game_id} is over.{C.E}'
+                )
+                return
+            if game.end_request not in (None, ctx.author.id):
+                await self.end_correspondence(game, *await game.score())
+                return
+            game.end_request = ctx.author.id
+            await self.bot.database.set_correspondence_end_request(
+                game_id, ctx.author.id
+            )
+        opponent = game.player2 if ctx.author.id == game.player1 else game.player1
+        await ctx.send(
+            f'<@{opponent}> your opponent wants to end correspondence game '
+            f'{game_id} now. send `endgame {game_id}` if you agree'
+        )
+
+    async def list_correspondence(self, ctx: commands.Context[Vesuvius]):
+        rows = await self.bot.database.list_correspondence(ctx.author.id)
+        if not rows:
+            await ctx.send(f'{C.B}{C.YELLOW}no correspondence games.{C.E}')
+            return
+        lines = []
+        for game_id, name, player1, player2, numof_moves, deadline in rows:
+            to_move = player2 if numof_moves % 2 else player1
+            opponent_id = player2 if player1 == ctx.author.id else player1
+            opponent = ctx.guild and ctx.guild.get_member(opponent_id)
+            turn = 'your move' if to_move == ctx.author.id else 'their move'
+            lines.append(
+                f'{C.WHITE}{game_id:>6} {C.PINK}{name:<8}{C.CYAN}'
+                f'vs {opponent or opponent_id}, {turn}, {numof_moves} moves, due '
+                f'{datetime.datetime.fromtimestamp(deadline).strftime("%m/%d %H:%M")}'
+            )
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}correspondence games:\n' + '\n'.join(lines) + C.E
+        )
+
+    def cache_correspondence(self, game: CorrespondenceGame) -> None:
+        self.correspondence[game.game_id] = game
+        self.correspondence.move_to_end(game.game_id)
+        while len(self.correspondence) > CORRESPONDENCE_CACHE_SIZE:
+            self.correspondence.popitem(last=False)
+
+    async def load_correspondence(self, game_id: int) -> Optional[CorrespondenceGame]:
+        """Get a correspondence game from the cache of recently played games, or
+        from the archive."""
+        game = self.correspondence.get(game_id)
+        if game is None:
+            game = await CorrespondenceGame.load(self.bot.database, game_id)
+            if game is None:
+                return None
+        self.cache_correspondence(game)
+        return game
+
+    async def end_correspondence(
+        self, game: CorrespondenceGame, winner: int, loser: int, tie: bool
+    ) -> None:
+        """Record the result of a correspondence game. Call it holding the lock of
+        the game, which must not have ended yet."""
+        game.ended = True
+        self.correspondence.pop(game.game_id, None)
+        await self.bot.database.end_correspondence(game.game_id, len(game.moves))
+        await self.bot.writer.add_match(
+            RESUMABLE_GAMES[game.name][1], winner, loser, tie, game.game_id
+        )
+        channel = self.bot.get_channel(game.channel)
+        if isinstance(channel, discord.abc.Messageable):
+            result = 'draw!' if tie else f'winner is <@{winner}>'
+            await channel.send(
+                f'correspondence game {game.game_id} is over, {result}. '
+                f'watch it again with `replay {game.game_id}`'
+            )
+
+    @tasks.loop(minutes=5)
+    async def expire_correspondence(self):
+        """End the correspondence games of players who ran out of time."""
+        for game_id in await self.bot.database.get_expired_correspondence(time.time()):
+            game = await self.load_correspondence(game_id)
+            if game is not None:
+                async with game.lock:
+                    if not game.ended:
+                        await self.end_correspondence(
+                            game, game.waiting, game.to_move, False
+                        )
+
+    @expire_correspondence.before_loop
+    async def before_expire_correspondence(self):
+        await self.bot.wait_until_ready()
+
+    @commands.command(name='tournament')
+    @commands.guild_only()
+    async def tournament_cmd(
+        self,
+        ctx: commands.Context[Vesuvius],
+        game: Optional[
+            Literal['tictactoe', 'connectfour', 'reversi', 'weiqi', 'gomoku']
+        ] = None,
+        format: Literal['swiss', 'roundrobin'] = 'swiss',
+        channels: commands.Greedy[discord.TextChannel] = None,  # type: ignore
+    ):
+        """create a tournament that is played in the given channels, or list the
+        tournaments of this server.
+        usage: `tournament [game] [swiss, roundrobin] [channels...]"""
+        assert ctx.guild
+        if game is None:
+            lines = [
+                f'{C.WHITE}{t.tournament_id:>5} {C.PINK}{t.game:<12}{C.CYAN}'
+                f'{t.format}, {len(t.standings)} players, '
+                + (f'round {t.standings.round}/{t.rounds}' if t.started else 'open')
+                for t in self.tournaments.values()
+                if t.guild.id == ctx.guild.id
+            ]
+            await ctx.send(
+                f'{C.B}{C.BOLD_GREEN}{len(lines)} tournaments in this server.\n'
+                + '\n'.join(lines)
+                + C.E
+            )
+            return
+        channels = channels or [ctx.channel]
+        tournament_id = await self.bot.database.add_tournament(
+            ctx.guild.id, ctx.author.id, game, format, [c.id for c in channels]
+        )
+        self.tournaments[tournament_id] = Tournament(
+            self,
+            tournament_id,
+            ctx.guild,
+            ctx.author.id,
+            game,
+            format,
+            channels,
+            Standings(),
+        )
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}created {format} {game} tournament {C.WHITE}'
+            f'{tournament_id}{C.BOLD_GREEN}. join with `tournament-join '
+            f'{tournament_id}`, the organizer starts it with `tournament-start '
+            f'{tournament_id}`{C.E}'
+        )
+
+    @commands.command(name='tournament-join')
+    @commands.guild_only()
+    async def tournament_join(
+        self,
+        ctx: commands.Context[Vesuvius],
+        tournament_id: int,
+        members: commands.Greedy[discord.Member] = None,  # type: ignore
+    ):
+        """join a tournament, or have the organizer register members for it.
+        usage: `tournament-join id [members...]"""
+        tournament = await self.get_tournament(
+            ctx, tournament_id, organizer=bool(members)
+        )
+        if tournament is None:
+            return
+        if tournament.started:
+            await ctx.send(f'{C.B}{C.RED}the tournament has already started.{C.E}')
+            return
+        joined = []
+        for member in members or [cast(discord.Member, ctx.author)]:
+            if member.bot:
+                continue
+            tournament.standings.add_player(member.id)
+            await self.bot.database.set_tournament_player(tournament_id, member.id)
+            joined.append(member.display_name)
+        await ctx.send(
+            f'{C.B}{C.GREEN}{", ".join(joined) or "nobody"} joined tournament '
+            f'{tournament_id}, {len(tournament.standings.active)} players.{C.E}'
+        )
+
+    @commands.command(name='tournament-leave')
+    @commands.guild_only()
+    async def tournament_leave(
+        self,
+        ctx: commands.Context[Vesuvius],
+        tournament_id: int,
+        member: Optional[discord.Member] = None,
+    ):
+        """withdraw from a tournament, or have the organizer withdraw a member.
+        games that are not played yet are lost. usage: `tournament-leave id [member]"""
+        tournament = await self.get_tournament(
+            ctx, tournament_id, organizer=member is not None
+        )
+        if tournament is None:
+            return
+        member = member or cast(discord.Member, ctx.author)
+        if member.id not in tournament.standings:
+            await ctx.send(f'{C.B}{C.RED}{member.display_name} is not playing.{C.E}')
+            return
+        tournament.standings.withdraw(member.id)
+        await self.bot.database.set_tournament_player(
+            tournament_id, member.id, withdrawn=True
+        )
+        await ctx.send(
+            f'{C.B}{C.YELLOW}{member.display_name} withdrew from tournament '
+            f'{tournament_id}.{C.E}'
+        )
+
+    @commands.command(name='tournament-start')
+    @commands.guild_only()
+    async def tournament_start(
+        self, ctx: commands.Context[Vesuvius], tournament_id: int, rounds: int = 0
+    ):
+        """start a tournament. swiss tournaments play enough rounds to find a
+        winner by default. usage: `tournament-start id [rounds]"""
+        tournament = await self.get_tournament(ctx, tournament_id, organizer=True)
+        if tournament is None:
+            return
+        players = len(tournament.standings.active)
+        if tournament.started or players < 2:
+            await ctx.send(
+                f'{C.B}{C.RED}the tournament has already started, or has fewer '
+                f'than 2 players.{C.E}'
+            )
+            return
+        if tournament.format == 'roundrobin':
+            rounds = players - 1 + players % 2
+        else:
+            rounds = rounds or tournament.standings.swiss_rounds()
+        tournament.rounds = rounds
+        await self.bot.database.start_tournament(tournament_id, rounds)
+        tournament.start()
+        await ctx.send(
+            f'{C.B}{C.BOLD_GREEN}tournament {tournament_id} has started with '
+            f'{players} players and {rounds} rounds!{C.E}'
+        )
+
+    @commands.command(name='tournament-cancel')
+    @commands.guild_only()
+    async def tournament_cancel(
+        self, ctx: commands.Context[Vesuvius], tournament_id: int
+    ):
+        """stop a tournament. games that are running are played to the end, but do
+        not count for it. usage: `tournament-cancel id"""
+        tournament = await self.get_tournament(ctx, tournament_id, organizer=True)
+        if tournament is None:
+            return
+        tournament.cancel()
+        del self.tournaments[tournament_id]
+        await self.bot.database.end_tournament(tournament_id)
+        await ctx.send(f'{C.B}{C.YELLOW}tournament {tournament_id} is cancelled.{C.E}')
+
+    @commands.command(name='standings')
+    @commands.guild_only()
+    async def standings_cmd(self, ctx: commands.Context[Vesuvius], tournament_id: int):
+        """show the standings of a tournament. usage: `standings id"""
+        tournament = await self.get_tournament(ctx, tournament_id)
+        if tournament is None:
+            return
+        await ctx.send(
+            tournament.standings_message(
+                f'standings of tournament {tournament_id}, round '
+                f'{tournament.standings.round}/{tournament.rounds}:'
+            )
+        )
+
+    async def get_tournament(
+        self,
+        ctx: commands.Context[Vesuvius],
+        tournament_id: int,
+        *,
+        organizer: bool = False,
+    ) -> Optional[Tournament]:
+        """Get a tournament of the guild, and check that the author is its
+        organizer or can manage the guild if `organizer` is True."""
+        tournament = self.tournaments.get(tournament_id)
+        if tournament is None or tournament.guild.id != getattr(ctx.guild, 'id', None):
+            await ctx.send(f'{C.B}{C.RED}no tournament {tournament_id}.{C.E}')
+            return None
+        if (
+            organizer
+            and ctx.author.id != tournament.organizer
+            and not cast(discord.Member, ctx.author).guild_permissions.manage_guild
+        ):
+            await ctx.send(f'{C.B}{C.RED}only the organizer can do that.{C.E}')
+            return None
+        return tournament
+
+    @commands.command(name='queue')
+    @commands.guild_only()
+    async def queue_cmd(
+        self,
+        ctx: commands.Context[Vesuvius],
+        game: Optional[
+            Literal['tictactoe', 'connectfour', 'reversi', 'weiqi', 'gomoku']
+        ] = None,
+    ):
+        """wait for an opponent with a rating close to yours, or see how many
+        players are waiting for each game. usage: `queue [game]"""
+        assert ctx.guild
+        if game is None:
+            lines = [
+                f'{C.PINK}{name:<12}{C.WHITE}{len(queue)}{C.CYAN} waiting'
+                for (guild, name), queue in self.queues.items()
+                if guild == ctx.guild.id and queue
+            ]
+            await ctx.send(
+                f'{C.B}{C.BOLD_GREEN}players waiting in this server:\n'
+                + ('\n'.join(lines) or f'{C.CYAN}nobody')
+                + C.E
+            )
+            return
+        if ctx.author.id in self.bot.sessions:
+            await ctx.send(f'{C.B}{C.RED}you are already in another game.{C.E}')
+            return
+        if ctx.author.id in self.joining or any(
+            ctx.author.id in queue for queue in self.queues.values()
+        ):
+            await ctx.send(
+                f'{C.B}{C.RED}you are already waiting for a game, leave with '
+                f'`queue-leave` first.{C.E}'
+            )
+            return
+        self.joining.add(ctx.author.id)
+        try:
+            rating = await self.bot.database.get_rating(ctx.author.id, game)
+            waiting = Waiting(
+                ctx.author.id,
+                DEFAULT_RATING if rating is None else rating,
+                time.time(),
+                ctx.channel.id,
+            )
+            await self.bot.database.add_queued(
+                waiting.user,
+                ctx.guild.id,
+                game,
+                waiting.channel,
+                waiting.rating,
+                waiting.joined,
+            )
+            matched = self.enqueue(ctx.guild.id, game, waiting)
+        finally:
+            self.joining.discard(ctx.author.id)
+        if not matched:
+            await ctx.send(
+                f'{C.B}{C.CYAN}waiting for an opponent for {C.PINK}{game}{C.CYAN} '
+                f'with a rating near {C.WHITE}{waiting.rating:.0f}{C.CYAN}, '
+                f'{len(self.queues[ctx.guild.id, game])} waiting.{C.E}'
+            )
+
+    @commands.command(name='queue-leave')
+    @commands.guild_only()
+    async def queue_leave(self, ctx: commands.Context[Vesuvius]):
+        """stop waiting for an opponent. usage: `queue-leave"""
+        for queue in self.queues.values():
+            if queue.remove(ctx.author.id) is not None:
+                await self.bot.database.delete_queued(ctx.author.id)
+                await ctx.send(f'{C.B}{C.YELLOW}you left the queue.{C.E}')
+                return
+        await ctx.send(f'{C.B}{C.RED}you are not waiting for a game.{C.E}')
+
+    def enqueue(self, guild: int, game: str, waiting: Waiting) -> bool:
+        """Add a player to the queue of a game, and start their game if they are
+        matched right away. Returns whether they were."""
+        queue = self.queues.setdefault((guild, game), MatchQueue())
+        match = queue.add(waiting, time.time())
+        if match is not None:
+            self.start_match(guild, game, *match)
+        return match is not None
+
+    def start_match(
+        self, guild: int, game: str, first: Waiting, second: Waiting
+    ) -> None:
+        task = asyncio.create_task(self.play_match(guild, game, first, second))
+        self.match_tasks.add(task)
+        task.add_done_callback(self.match_tasks.discard)
+
+    async def play_match(
+        self, guild_id: int, game: str, first: Waiting, second: Waiting
+    ) -> None:
+        """Play a game between two matched players, in the channel of the one
+        who waited longer. A player who left the server or started another game
+        in the meantime is dropped from the queue, and the other queued again."""
+        await self.bot.database.delete_queued(first.user, second.user)
+        guild = self.bot.get_guild(guild_id)
+        channel = self.bot.get_channel(first.channel)
+        if guild is None or not isinstance(
+            channel, (discord.TextChannel, discord.Thread)
+        ):
+            return
+        members: list[discord.Member] = []
+        for waiting in (first, second):
+            member = guild.get_member(waiting.user)
+            if member is None or waiting.user in self.bot.sessions:
+                await self.requeue(
+                    guild_id, game, second if waiting is first else first
+                )
+                return
+            members.append(member)
+
+        game_type, result_name = RESUMABLE_GAMES[game]
+        player1, player2 = members
+        session = self.bot.sessions.reserve(
+            (player1.id, player2.id),
+            game=game,
+            guild_id=guild_id,
+            channel_id=channel.id,
+        )
+        if session is None:
+            for waiting in (first, second):
+                if waiting.user not in self.bot.sessions:
+                    await self.requeue(guild_id, game, waiting)
+            return
+        await channel.send(
+            f'{C.B}{C.BOLD_GREEN}matched {C.CYAN}{player1.display_name} '
+            f'{C.WHITE}({first.rating:.0f}){C.YELLOW} vs {C.CYAN}'
+            f'{player2.display_name} {C.WHITE}({second.rating:.0f}){C.BOLD_GREEN} '
+            f'for {game}!{C.E} {player1.mention} {player2.mention}'
+        )
+        await self.play_session(
+            session,
+            game_type(ChannelContextAdapter(channel, player1), self.bot, player2),
+            result_name,
+        )
+
+    async def requeue(self, guild_id: int, game: str, waiting: Waiting) -> None:
+        """Queue a matched player again, unless they joined a queue meanwhile."""
+        if waiting.user in self.joining or any(
+            waiting.user in queue for queue in self.queues.values()
+        ):
+            return
+        await self.bot.database.add_queued(
+            waiting.user,
+            guild_id,
+            game,
+            waiting.channel,
+            waiting.rating,
+            waiting.joined,
+        )
+        self.enqueue(guild_id, game, waiting)
+
+    @tasks.loop(seconds=10)
+    async def sweep_queues(self):
+        """Match the players whose search windows have widened enough."""
+        now = time.time()
+        for (guild, game), queue in self.queues.items():
+            for first, second in queue.sweep(now):
+                self.start_match(guild, game, first, second)
+
+    @sweep_queues.before_loop
+    async def before_sweep_queues(self):
+        await self.bot.wait_until_ready()
+
+    async def make_replay(self, game_id: int, fmt: Literal['gif', 'webp']) -> bool:
+        """Render a replay into the replays directory.
+
+        Returns False if there is no game with the id, or it has not ended. Those
+        are not rendered, so the replays directory only has finished games.
+        """
+        archived = await self.bot.database.get_archived_moves(game_id, ended=True)
+        if archived is None or archived[0] not in REPLAY_BOARDS:
+            return False
+        game, moves = archived
+        data = await self.bot.run_in_ppexec(render_replay, game, moves, fmt)
+        self.bot.files['replays'].mkdir(parents=True, exist_ok=True)
+        async with aopen(self.bot.files['replays'] / f'{game_id}.{fmt}', 'wb') as f:
+            await f.write(data)
+        return True
+
     @commands.hybrid_command(name='tic-tac-toe', with_app_command=False)
     async def tictactoe_cmd(
         self, ctx: commands.Context[Vesuvius], opponent: discord.Member
@@ -2009,14 +3676,12 @@ class GameFeatures(commands.GroupCog, name='play'):
         opponent: discord.Member,
         /,
     ):
-        if not await self.wait_confirm(ctx, opponent, 'Tic-Tac-Toe'):
+        session = await self.wait_confirm(ctx, opponent, 'Tic-Tac-Toe')
+        if session is None:
             return
 
         game = TicTacToeGame(ctx, self.bot, opponent)
-        await game.start()
-
-        assert game.winner and game.loser
-        await self.done_playing('tictactoe', game.winner, game.loser, game.tie)
+        await self.play_session(session, game, 'tictactoe')
 
     @commands.hybrid_command(name='connect-four', with_app_command=False)
     async def connectfour_cmd(
@@ -2037,95 +3702,117 @@ class GameFeatures(commands.GroupCog, name='play'):
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         opponent: discord.Member,
     ):
-        if not await self.wait_confirm(ctx, opponent, 'Connect-Four'):
+        session = await self.wait_confirm(ctx, opponent, 'Connect-Four')
+        if session is None:
             return
 
         game = ConnectFourGame(ctx, self.bot, opponent)
-        await game.start()
-
-        assert game.winner and game.loser
-        await self.done_playing('connectfour', game.winner, game.loser, game.tie)
+        await self.play_session(session, game, 'connectfour')
 
     @commands.hybrid_command(name='reversi', with_app_command=False)
     async def reversi_cmd(
-        self, ctx: commands.Context[Vesuvius], opponent: discord.Member
+        self,
+        ctx: commands.Context[Vesuvius],
+        opponent: discord.Member,
+        render: Literal['emoji', 'image'] = 'emoji',
     ):
-        await self._reversi(ctx, opponent)
+        await self._reversi(ctx, opponent, image=render == 'image')
 
     @app_commands.command(name='reversi')
     async def reversi_inter(
-        self, interaction: discord.Interaction, opponent: discord.Member
+        self,
+        interaction: discord.Interaction,
+        opponent: discord.Member,
+        render: Literal['emoji', 'image'] = 'emoji',
     ):
         """Play reversi with another user."""
-        await self._reversi(InteractionContextAdapter(interaction), opponent)
+        await self._reversi(
+            InteractionContextAdapter(interaction), opponent, image=render == 'image'
+        )
 
     async def _reversi(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         opponent: discord.Member,
+        *,
+        image: bool = False,
     ):
-        if not await self.wait_confirm(ctx, opponent, 'Reversi'):
+        session = await self.wait_confirm(ctx, opponent, 'Reversi')
+        if session is None:
             return
 
-        game = ReversiGame(ctx, self.bot, opponent)
-        await game.start()
-
-        assert game.winner and game.loser
-        await self.done_playing('reversi', game.winner, game.loser, game.tie)
+        game = ReversiGame(ctx, self.bot, opponent, image=image)
+        await self.play_session(session, game, 'reversi')
 
     @commands.hybrid_command(name='weiqi', with_app_command=False)
     async def weiqi_cmd(
-        self, ctx: commands.Context[Vesuvius], opponent: discord.Member
+        self,
+        ctx: commands.Context[Vesuvius],
+        opponent: discord.Member,
+        render: Literal['emoji', 'image'] = 'emoji',
     ):
-        await self._weiqi(ctx, opponent)
+        await self._weiqi(ctx, opponent, image=render == 'image')
 
     @app_commands.command(name='weiqi')
     async def weiqi_inter(
-        self, interaction: discord.Interaction, opponent: discord.Member
+        self,
+        interaction: discord.Interaction,
+        opponent: discord.Member,
+        render: Literal['emoji', 'image'] = 'emoji',
     ):
         """Play go with another user."""
-        await self._weiqi(InteractionContextAdapter(interaction), opponent)
+        await self._weiqi(
+            InteractionContextAdapter(interaction), opponent, image=render == 'image'
+        )
 
     async def _weiqi(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         opponent: discord.Member,
+        *,
+        image: bool = False,
     ):
-        if not await self.wait_confirm(ctx, opponent, 'Weiqi'):
+        session = await self.wait_confirm(ctx, opponent, 'Weiqi')
+        if session is None:
             return
 
-        game = WeiqiGame(ctx, self.bot, opponent)
-        await game.start()
-
-        assert game.winner and game.loser
-        await self.done_playing('weiqi', game.winner, game.loser, game.tie)
+        game = WeiqiGame(ctx, self.bot, opponent, image=image)
+        await self.play_session(session, game, 'weiqi')
 
     @commands.hybrid_command(name='gomoku', with_app_command=False)
     async def gomoku_cmd(
-        self, ctx: commands.Context[Vesuvius], opponent: discord.Member
+        self,
+        ctx: commands.Context[Vesuvius],
+        opponent: discord.Member,
+        render: Literal['emoji', 'image'] = 'emoji',
     ):
-        await self._gomoku(ctx, opponent)
+        await self._gomoku(ctx, opponent, image=render == 'image')
 
     @app_commands.command(name='gomoku')
     async def gomoku_inter(
-        self, interaction: discord.Interaction, opponent: discord.Member
+        self,
+        interaction: discord.Interaction,
+        opponent: discord.Member,
+        render: Literal['emoji', 'image'] = 'emoji',
     ):
         """Play gomoku with another user."""
-        await self._gomoku(InteractionContextAdapter(interaction), opponent)
+        await self._gomoku(
+            InteractionContextAdapter(interaction), opponent, image=render == 'image'
+        )
 
     async def _gomoku(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         opponent: discord.Member,
+        *,
+        image: bool = False,
     ):
-        if not await self.wait_confirm(ctx, opponent, 'Gomoku'):
+        session = await self.wait_confirm(ctx, opponent, 'Gomoku')
+        if session is None:
             return
 
-        game = GomukuGame(ctx, self.bot, opponent)
-        await game.start()
-
-        assert game.winner and game.loser
-        await self.done_playing('connectfour', game.winner, game.loser, game.tie)
+        game = GomukuGame(ctx, self.bot, opponent, image=image)
+        await self.play_session(session, game, 'gomoku')
 
     @commands.hybrid_command(name='battleship', with_app_command=False)
     async def battleship_cmd(
@@ -2145,43 +3832,67 @@ class GameFeatures(commands.GroupCog, name='play'):
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         opponent: discord.Member,
     ):
-        if not await self.wait_confirm(ctx, opponent, 'Battleship'):
+        session = await self.wait_confirm(ctx, opponent, 'Battleship')
+        if session is None:
             return
 
         game = BattleshipGame(ctx, self.bot, opponent)
-        await game.start()
-
-        assert game.winner and game.loser
-        await self.done_playing('battleship', game.winner, game.loser, game.tie)
+        await self.play_session(session, game, 'battleship')
 
     async def wait_confirm(
         self,
         ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
         opp: discord.Member,
         game: str,
-    ) -> bool:
-        """wait for confirmation that the opp wants to play game"""
-        print(ctx)
-        if ctx.author.id in self.ingame:
+    ) -> Optional[Session]:
+        """wait for confirmation that the opp wants to play game, returning the
+        session of the players if they do"""
+        if ctx.author.id in self.bot.sessions:
             await ctx.send(f'{C.B}{C.RED}you are already in another game.{C.E}')
-            return False
+            return None
 
-        if opp.id in self.ingame:
+        if opp.id in self.bot.sessions:
             await ctx.send(
                 f'{C.B}{C.RED}{opp.display_name} is already in another game. '
                 f'wait for it to finish or try another person!{C.E}'
             )
-            return False
+            return None
 
         if opp.id == ctx.author.id:
             await ctx.send(f'{C.B}{C.RED}you cannot challenge yourself.{C.E}')
-            return False
+            return None
 
         if opp.id == cast(discord.User, self.bot.user).id:
             await ctx.send(f'{C.B}{C.RED}no.{C.E}')
-            return False
+            return None
 
-        self.ingame.append(ctx.author.id)
+        session = self.bot.sessions.reserve(
+            (ctx.author.id,),
+            game=game,
+            guild_id=getattr(getattr(ctx.channel, 'guild', None), 'id', None),
+            channel_id=ctx.channel.id,
+        )
+        if session is None:
+            await ctx.send(f'{C.B}{C.RED}you are already in another game.{C.E}')
+            return None
+        try:
+            status = await self._invite(ctx, opp, game, session)
+        except BaseException:
+            session.release()
+            raise
+        if status != 'accepted':
+            session.release()
+            return None
+        return session
+
+    async def _invite(
+        self,
+        ctx: commands.Context[Vesuvius] | InteractionContextAdapter,
+        opp: discord.Member,
+        game: str,
+        session: Session,
+    ) -> str:
+        """send the invitation and log the answer to it"""
         invitation = await ctx.reply(
             f'{ctx.author.display_name} has challenged {opp.display_name} '
             f'to a match of {game}! {opp.mention}, do you accept? '
@@ -2207,42 +3918,143 @@ class GameFeatures(commands.GroupCog, name='play'):
                 f'{C.B}{C.RED}command timed out. it seems that {opp.display_name} '
                 f'does not want to play rn. try someone else!{C.E}'
             )
-            self.ingame.remove(ctx.author.id)
             status = 'ignored'
         if reaction:
             if str(reaction.emoji) == '❎':
                 await invitation.reply(
                     f'{opp.display_name} did not accept the challenge.'
                 )
-                self.ingame.remove(ctx.author.id)
                 status = 'rejected'
+            elif not session.add(opp.id):
+                await invitation.reply(
+                    f'{opp.display_name} has joined another game in the meantime.'
+                )
+                status = 'busy'
             elif str(reaction.emoji) == '✅':
                 await invitation.reply(
                     f'{opp.display_name} has accepted the challenge!'
                 )
-                self.ingame.append(opp.id)
                 status = 'accepted'
 
         now = datetime.datetime.now().strftime("%m/%d, %H:%M:%S")
-        async with aopen(self.bot.files['game_log'], 'a') as gl:
-            await gl.write(
-                f'{now} | {ctx.author.display_name}{game:>16} {opp.display_name:>17},{status:>18}\n'
+        await self.bot.writer.log(
+            f'{now} | {ctx.author.display_name}{game:>16} {opp.display_name:>17},{status:>18}\n'
+        )
+        return status
+
+    async def play(
+        self,
+        game: BaseGame,
+        result_name: str,
+        *,
+        resumed: bool = False,
+        on_start: Optional[Callable[[BaseGame], Awaitable[None]]] = None,
+    ) -> None:
+        """Run a game that has been accepted and record the result.
+
+        The game gets a game id and its moves are archived while it runs.
+        If the game is cancelled or raises, it is left unfinished in the archive
+        and its snapshot is kept, so it can be resumed. With `resumed`, a game
+        from `restore_game` is continued.
+        `on_start` is called with the game once it has a game id.
+        """
+        if resumed:
+            assert game.game_id is not None
+            game.move_log = await MoveLog.resume(
+                self.bot.database, game.game_id, game.moves, writer=self.bot.writer
+            )
+        else:
+            channel = game._ctx.channel
+            guild = getattr(channel, 'guild', None)
+            game.game_id = await self.bot.database.add_archived_game(
+                game.name,
+                game.board_length,
+                game._player1.member.id,
+                game._player2.member.id,
+                guild.id if guild else None,
+                channel.id,
+            )
+            game.move_log = MoveLog(
+                self.bot.database,
+                game.game_id,
+                game.board_length,
+                writer=self.bot.writer,
             )
-        if status in {'ignored', 'rejected'}:
-            return False
-        return True
 
-    async def done_playing(
+        session = self.bot.sessions.get(game._player1.member.id)
+        if session is not None:
+            session.game_id = game.game_id
+        if on_start is not None:
+            await on_start(game)
+        if self.bot.board_workers is not None and game.name in RESUMABLE_GAMES:
+            game.use_board(
+                await RemoteBoard.create(
+                    self.bot.board_workers,
+                    game.game_id,
+                    type(game._board),
+                    game.moves,
+                )
+            )
+        self.running[game.game_id] = (
+            game,
+            cast(asyncio.Task[Any], asyncio.current_task()),
+        )
+        ended = False
+        try:
+            await (game.resume() if resumed else game.start())
+            ended = True
+        except asyncio.CancelledError:
+            if game._prompt_msg is not None:
+                # written now, the game may be resumed right after a reload
+                await game.move_log.save_snapshot(game.snapshot(), wait=True)
+            raise
+        except Exception as e:
+            print(f'GAME {game.game_id} FAILED, keeping its snapshot:', repr(e))
+            raise
+        finally:
+            del self.running[game.game_id]
+            await game.move_log.close(ended=ended)
+            if isinstance(game._board, RemoteBoard):
+                await game._board.close()
+        await self.done_playing(result_name, game)
+
+    async def play_session(
         self,
-        game: str,
-        p1: discord.Member | discord.User,
-        p2: discord.Member | discord.User,
-        tie: bool = False,
-    ):
+        session: Session,
+        game: BaseGame,
+        result_name: str,
+        *,
+        resumed: bool = False,
+        on_start: Optional[Callable[[BaseGame], Awaitable[None]]] = None,
+    ) -> None:
+        """Play a game once it is admitted, releasing the session of its players
+        when it stops. Resumed games are admitted right away."""
+
+        async def on_queued(position: int, wait: float) -> None:
+            await game._ctx.send(
+                f'{C.B}{C.YELLOW}all boards are busy. you are {C.WHITE}#{position}'
+                f'{C.YELLOW} in the queue, the estimated wait is '
+                f'{C.WHITE}{round(wait / 60) or 1}{C.YELLOW} minutes.{C.E}'
+            )
+
+        with session:
+            session.game = game.name
+            if not await self.bot.sessions.admit(
+                session, game.weight, on_queued=on_queued, force=resumed
+            ):
+                return
+            await self.play(game, result_name, resumed=resumed, on_start=on_start)
+
+    async def done_playing(self, game: str, played: BaseGame):
+        assert played.winner and played.loser
+        p1, p2 = played.winner, played.loser
         print('done', p1, p2)
-        self.ingame.remove(p1.id)
-        self.ingame.remove(p2.id)
-        await self.bot.database.set_games_winloss(p1.id, p2.id, game, tie)
+        await self.bot.writer.add_match(game, p1.id, p2.id, played.tie, played.game_id)
+        if played.name in REPLAY_BOARDS and played.moves:
+            await played._ctx.send(
+                f'{C.B}{C.CYAN}game id: {C.WHITE}{played.game_id}{C.CYAN}, '
+                f'watch it again with `replay {played.game_id}{C.E}'
+            )
 
 
 async def setup(bot: Vesuvius):
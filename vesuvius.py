@@ -2,16 +2,24 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from functools import partial
 from typing import Callable, Literal, ParamSpec, TypeVar
 
-import aiosqlite
 import discord
 from discord.ext import commands
 
 import config
+from extensions.clocks import TimerScheduler
+from extensions.janitor import MessageJanitor
+from extensions.maintenance import DatabaseMaintenance
+from extensions.router import InputRouter
+from extensions.sessions import SessionRegistry
 from extensions.utils import Database
+from extensions.workers import BoardWorkerPool
+from extensions.writebehind import WriteBehindQueue
 
 
 async def main():
@@ -29,6 +37,15 @@ async def main():
         await bot.start(config.token)
 
 
+DEFAULT_GAME_LIMITS = {
+    'total': 200,
+    'per_guild': 25,
+    'per_game': {'weiqi': 40, 'gomoku': 60},
+    'heavy_budget': 80,
+}
+"""Used when `config.game_limits` is not set, see `SessionRegistry`."""
+
+
 class Vesuvius(commands.Bot):
     def __init__(self, *, logger: logging.Logger) -> None:
         self.logger = logger
@@ -45,11 +62,29 @@ class Vesuvius(commands.Bot):
 
         self.start_time = datetime.now()
         self.files = config.files_dict.copy()
+        self.files.setdefault('replays', self.files['database'].parent / 'replays')
+        self.files.setdefault(
+            'backup', self.files['database'].with_suffix('.backup.db')
+        )
         self.last_reload: Literal[
             'all', 'commands', 'events', 'features', 'games', 'testing'
         ] = 'all'
 
         self.database: Database = None  # type: ignore
+        self.writer: WriteBehindQueue = None  # type: ignore
+        self.maintenance: DatabaseMaintenance = None  # type: ignore
+        self.timers = TimerScheduler()
+        self.router = InputRouter(self.timers)
+        self.janitor = MessageJanitor()
+        self.sessions = SessionRegistry(
+            **getattr(config, 'game_limits', DEFAULT_GAME_LIMITS)
+        )
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=2, mp_context=multiprocessing.get_context('spawn')
+        )
+        # boards of games are hosted in this many processes, 0 keeps them here
+        board_workers = getattr(config, 'board_workers', 0)
+        self.board_workers = BoardWorkerPool(board_workers) if board_workers else None
 
     _P = ParamSpec('_P')
     _R = TypeVar('_R')
@@ -59,8 +94,22 @@ class Vesuvius(commands.Bot):
     ) -> _R:
         return await self.loop.run_in_executor(None, partial(func, *args, **kwargs))
 
+    async def run_in_ppexec(
+        self, func: Callable[_P, _R], *args: _P.args, **kwargs: _P.kwargs
+    ) -> _R:
+        """Run a CPU heavy function in the process pool.
+
+        `func` and its arguments must be picklable, so `func` has to be a module
+        level function.
+        """
+        return await self.loop.run_in_executor(
+            self.process_pool, partial(func, *args, **kwargs)
+        )
+
     async def setup_hook(self) -> None:
         await super().setup_hook()
+        if self.board_workers is not None:
+            self.board_workers.start()
         await self.load_extension('commands')
         await self.load_extension('events')
         await self.load_extension('features')
@@ -68,11 +117,54 @@ class Vesuvius(commands.Bot):
         await self.load_extension('testing')
 
     async def start(self, token: str, *, reconnect: bool = True) -> None:
-        async with aiosqlite.connect(self.files['database']) as conn:
-            self.database = Database(conn, await conn.cursor())
+        # reader connections, next to the one that writes, and the seconds a
+        # statement may take before it is logged as slow
+        self.database = await Database.connect(
+            self.files['database'],
+            readers=getattr(config, 'database_readers', 4),
+            slow_query=getattr(config, 'slow_query', 0.1),
+        )
+        try:
             await self.database.create_channels_table()
+            await self.database.create_games_table()
+            await self.database.create_archive_tables()
+            await self.database.create_tournament_tables()
+            await self.database.create_matchmaking_tables()
+            self.writer = WriteBehindQueue(
+                self.database,
+                self.files['game_log'],
+                **getattr(config, 'write_behind', {}),
+            )
+            # vacuums wait until no game is being played or written
+            self.maintenance = DatabaseMaintenance(
+                self.database,
+                self.files['database'],
+                self.files['backup'],
+                quiet=lambda: not len(self.sessions) and not len(self.writer),
+                **getattr(config, 'maintenance', {}),
+            )
+            self.maintenance.start()
             print("DATABASE connected with", self.database)
             await super().start(token, reconnect=reconnect)
+        finally:
+            # runs however start ends, so queued results are written here,
+            # while the database is still open
+            if self.maintenance is not None:
+                await self.maintenance.close()
+            if self.writer is not None:
+                await self.writer.close()
+            await self.database.close()
+
+    async def close(self) -> None:
+        await self.janitor.close()
+        await super().close()
+        self.process_pool.shutdown(cancel_futures=True)
+        if self.board_workers is not None:
+            await self.board_workers.close()
+
+    async def on_message(self, message: discord.Message) -> None:
+        self.router.dispatch(message)
+        await self.process_commands(message)
 
     async def on_ready(self) -> None:
         print(f'LOGGED ON: as {self.user}')